@@ -0,0 +1,134 @@
+"""
+Micro-batching Scheduler - Group concurrent inference requests
+Collects single images into batches of up to N items or T milliseconds,
+runs one forward pass and hands each caller its own result
+"""
+
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds for the batch-size histogram
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+_STOP = object()
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching scheduler
+
+    Args:
+        batch_fn: Callable taking a list of items and returning a list of
+                  results in the same order
+        max_batch_size: Maximum number of items per batch (N)
+        max_wait_ms: Maximum time the first item of a batch waits for
+                     more items to arrive (T)
+        name: Metric name prefix
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 name: str = "inference"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._thread = None
+
+        self._batch_sizes = metrics.histogram(f"{name}.batch_size", BATCH_SIZE_BUCKETS)
+        self._queue_wait = metrics.histogram(f"{name}.queue_wait_ms")
+        self._batch_latency = metrics.histogram(f"{name}.batch_latency_ms")
+
+    def start(self):
+        """Start the background batching thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Micro-batcher '{self.name}' started "
+            f"(max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait * 1000:g})"
+        )
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the batching thread after draining queued items"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, item) -> Future:
+        """
+        Queue a single item for batched processing
+
+        Args:
+            item: Item passed to batch_fn as part of a list
+
+        Returns:
+            Future resolving to this item's result
+        """
+        if self._thread is None:
+            self.start()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _collect(self, first) -> list:
+        """Gather items until the batch is full or the wait budget is spent"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                # Re-queue the sentinel so the loop exits after this batch
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            # Claim each future; callers that gave up (e.g. a client disconnect
+            # cancelling the wrapped future) are dropped. Claimed futures can no
+            # longer be cancelled, so setting their result cannot race a cancel.
+            batch = [entry for entry in self._collect(first) if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, submitted in batch:
+                self._queue_wait.observe((started - submitted) * 1000)
+            self._batch_sizes.observe(len(batch))
+
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"Batch function returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                logger.error(f"Error in batched inference: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                self._batch_latency.observe((time.perf_counter() - started) * 1000)
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
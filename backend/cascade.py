@@ -0,0 +1,130 @@
+"""
+Cascade Inference - Cheap classifier first, full model only on low confidence
+A small model answers confident cases; uncertain images escalate to the full CNN
+"""
+
+import threading
+import time
+import logging
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+def parse_class_thresholds(value: str, classes) -> dict:
+    """
+    Parse "Healthy:0.9,Maize Common Rust:0.85" into {class_index: threshold}
+    """
+    thresholds = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, threshold = item.rpartition(":")
+        if name not in classes:
+            logger.warning(f"Ignoring cascade threshold for unknown class: {name}")
+            continue
+        thresholds[classes.index(name)] = float(threshold)
+    return thresholds
+
+class Cascade:
+    """
+    Two-stage classifier
+
+    Args:
+        registry: ModelRegistry holding the fast model
+        fast_name: Registry name of the fast model
+        threshold: Minimum fast-model confidence to accept its answer
+        class_thresholds: Per-class overrides {class_index: threshold}
+    """
+
+    def __init__(self, registry, fast_name: str, threshold: float, class_thresholds: dict = None):
+        self.registry = registry
+        self.fast_name = fast_name
+        self.threshold = float(threshold)
+        self.class_thresholds = dict(class_thresholds or {})
+
+        self._lock = threading.Lock()
+        self._images = 0
+        self._escalated = 0
+        self._fast_ms = 0.0
+        self._full_ms = 0.0
+        self._full_images = 0
+
+        self._fast_latency = metrics.histogram("cascade.fast_latency_ms")
+        self._full_latency = metrics.histogram("cascade.full_latency_ms")
+        metrics.register("cascade", self)
+
+    def fast_model(self, handle):
+        """Fast model to put in front of handle, or None when the cascade does not apply"""
+        if handle is None or handle.name == self.fast_name:
+            return None
+        fast = self.registry.active(self.fast_name)
+        return fast if fast is not None and fast is not handle else None
+
+    def accepts(self, probabilities: np.ndarray) -> np.ndarray:
+        """Boolean mask of rows where the fast model is confident enough"""
+        top = probabilities.argmax(axis=1)
+        confidence = probabilities[np.arange(len(top)), top]
+        thresholds = np.array([self.class_thresholds.get(int(c), self.threshold) for c in top])
+        return confidence >= thresholds
+
+    def predict(self, fast, full, images: np.ndarray, full_predict=None):
+        """
+        Score a batch through the cascade
+
+        Args:
+            fast: Handle of the fast model
+            full: Handle of the full model
+            images: Preprocessed batch (N, H, W, 3)
+            full_predict: Function scoring the escalated rows (default
+                          full.backend.predict), called at most once, e.g. to
+                          explain them in the same pass
+
+        Returns:
+            Tuple of (probabilities, list of serving ModelHandles per row)
+        """
+        started = time.perf_counter()
+        probabilities = np.array(fast.backend.predict(images), dtype=np.float32)
+        fast_ms = (time.perf_counter() - started) * 1000
+        self._fast_latency.observe(fast_ms)
+
+        accepted = self.accepts(probabilities)
+        served_by = [fast if ok else full for ok in accepted]
+        escalate = np.flatnonzero(~accepted)
+
+        full_ms = 0.0
+        if len(escalate):
+            started = time.perf_counter()
+            probabilities[escalate] = (full_predict or full.backend.predict)(images[escalate])
+            full_ms = (time.perf_counter() - started) * 1000
+            self._full_latency.observe(full_ms)
+
+        with self._lock:
+            self._images += len(images)
+            self._escalated += len(escalate)
+            self._fast_ms += fast_ms
+            self._full_ms += full_ms
+            self._full_images += len(escalate)
+
+        return probabilities, served_by
+
+    def snapshot(self) -> dict:
+        """Per-stage hit rates, latency and estimated compute saved"""
+        with self._lock:
+            images, escalated = self._images, self._escalated
+            fast_ms, full_ms, full_images = self._fast_ms, self._full_ms, self._full_images
+
+        fast_per_image = fast_ms / images if images else 0.0
+        full_per_image = full_ms / full_images if full_images else 0.0
+        snapshot = {
+            "images": images,
+            "fast_hit_rate": round((images - escalated) / images, 4) if images else 0.0,
+            "escalation_rate": round(escalated / images, 4) if images else 0.0,
+            "fast_ms_per_image": round(fast_per_image, 3),
+            "full_ms_per_image": round(full_per_image, 3)
+        }
+        if images and full_per_image:
+            # Compute actually spent versus running the full model on everything
+            spent = images * fast_per_image + escalated * full_per_image
+            snapshot["estimated_compute_saved"] = round(1 - spent / (images * full_per_image), 4)
+        return snapshot
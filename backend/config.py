@@ -21,6 +21,39 @@ MODEL_PATH.mkdir(parents=True, exist_ok=True)
 DATABASE_PATH = BACKEND_DIR / "database.db"
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
+# Database connection pool
+# Up to DB_POOL_SIZE connections are kept open and shared between threads.
+# DB_JOURNAL_MODE "WAL" lets readers run alongside a writer (synchronous=NORMAL
+# is then durable across application crashes); DB_MMAP_SIZE bytes of the file
+# are memory-mapped, DB_CACHE_SIZE_KB is the page cache per connection,
+# DB_BUSY_TIMEOUT seconds are spent waiting on a locked database and
+# DB_STATEMENT_CACHE prepared statements are reused per connection
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 ** 2)))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "128"))
+
+# Write-behind prediction log
+# With WRITE_BEHIND, predictions are buffered and inserted in one transaction
+# every WRITE_BEHIND_MAX_ROWS rows or WRITE_BEHIND_MAX_WAIT_MS milliseconds;
+# once WRITE_BEHIND_QUEUE_SIZE rows are waiting, requests write synchronously
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "64"))
+WRITE_BEHIND_MAX_WAIT_MS = float(os.getenv("WRITE_BEHIND_MAX_WAIT_MS", "50"))
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "1024"))
+
+# Recommendation cache
+# Recommendations are served from memory. Every RECOMMENDATION_CHECK_INTERVAL
+# seconds a lookup checks whether another process changed them (PRAGMA
+# data_version, then the version counter) and reloads if so
+RECOMMENDATION_CHECK_INTERVAL = float(os.getenv("RECOMMENDATION_CHECK_INTERVAL", "1"))
+
+# Prediction export (/api/export and backend/export.py)
+# Rows are read and written EXPORT_CHUNK_SIZE at a time
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
 # Model configuration
 MODEL_INPUT_SIZE = 224
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
@@ -44,3 +77,108 @@ API_PORT = 8000
 
 # Confidence threshold for predictions
 CONFIDENCE_THRESHOLD = 0.5
+
+# Inference micro-batching configuration
+# Concurrent requests are grouped into batches of up to BATCH_MAX_SIZE images,
+# waiting at most BATCH_MAX_WAIT_MS for a batch to fill
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# Worker pool configuration
+# CPU-bound stages (preprocessing, Grad-CAM) run in a "thread" or "process" pool;
+# blocking file and database I/O runs in a separate thread pool
+WORKER_POOL_KIND = os.getenv("WORKER_POOL_KIND", "thread")
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", str(os.cpu_count() or 2)))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "64"))
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "4"))
+
+# Bulk prediction configuration
+BULK_MAX_IMAGES = int(os.getenv("BULK_MAX_IMAGES", "500"))
+
+# Keep a copy of each uploaded original in UPLOAD_FOLDER (written after the response)
+SAVE_UPLOADS = os.getenv("SAVE_UPLOADS", "true").lower() in ("1", "true", "yes")
+
+# Prediction cache configuration
+# Repeated uploads of the same image (same model version) skip inference.
+# PREDICTION_CACHE_SIZE=0 disables the cache; PREDICTION_CACHE_PERSIST keeps
+# entries in a SQLite file across restarts
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_PERSIST = os.getenv("PREDICTION_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+PREDICTION_CACHE_PATH = BACKEND_DIR / "prediction_cache.db"
+PREDICTION_CACHE_DISK_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+# Inference backend configuration
+# MODEL_BACKEND: "auto" (ONNX, then TFLite, Keras, PyTorch), "onnx", "tflite", "keras" or "torch"
+# MODEL_FILE: explicit model file, overrides the directory search
+# INFERENCE_THREADS: intra-op threads for ONNX Runtime/TFLite (0 = runtime default)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "auto")
+MODEL_FILE = os.getenv("MODEL_FILE", "")
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))
+
+# Cascade inference configuration
+# A small, cheap model answers first; images where its confidence is below
+# CONFIDENCE_THRESHOLD (or the per-class threshold) escalate to the full model.
+# CASCADE_MODEL_FILE: fast model file (keep it outside the top level of the
+#                     models directory so it is not picked as the full model)
+# CASCADE_CLASS_THRESHOLDS: per-class overrides, e.g. "Healthy:0.9,Maize Common Rust:0.85"
+CASCADE_MODEL_FILE = os.getenv("CASCADE_MODEL_FILE", "")
+CASCADE_CLASS_THRESHOLDS = os.getenv("CASCADE_CLASS_THRESHOLDS", "")
+
+# Tiled inference configuration (/api/predict/tiled)
+# Large images are scored as overlapping MODEL_INPUT_SIZE windows.
+# TILE_OVERLAP: fraction of each window shared with its neighbour
+# TILE_MAX_PIXELS: largest image decoded for tiling. It is held as 3 bytes per
+#                  pixel, so the default of 24 MP costs about 72 MB per tiled
+#                  request in a worker. Larger JPEGs are decoded at 1/2, 1/4
+#                  or 1/8 scale to fit; larger PNG/WebP images are rejected
+# TILE_MAX_FILE_SIZE: upload limit for tiled requests (bytes)
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.25"))
+TILE_MAX_PIXELS = int(os.getenv("TILE_MAX_PIXELS", "24000000"))
+TILE_MAX_FILE_SIZE = int(os.getenv("TILE_MAX_FILE_SIZE", str(50 * 1024 * 1024)))
+
+# Deferred heatmap rendering
+# With HEATMAP_DEFERRED, /api/predict returns the diagnosis immediately plus a
+# heatmap job ID; HEATMAP_WORKERS threads render jobs, at most
+# HEATMAP_QUEUE_SIZE more wait, and a job fails after HEATMAP_JOB_TIMEOUT seconds
+HEATMAP_DEFERRED = os.getenv("HEATMAP_DEFERRED", "true").lower() in ("1", "true", "yes")
+HEATMAP_WORKERS = int(os.getenv("HEATMAP_WORKERS", "2"))
+HEATMAP_QUEUE_SIZE = int(os.getenv("HEATMAP_QUEUE_SIZE", "64"))
+HEATMAP_JOB_TIMEOUT = float(os.getenv("HEATMAP_JOB_TIMEOUT", "30"))
+
+# Heatmap storage
+# "grid" keeps the raw heatmap as a small uint8 grid (at most HEATMAP_GRID_SIZE
+# per side) plus a JPEG preview of the leaf (long side HEATMAP_PREVIEW_SIZE) in
+# the database, and /api/heatmap/{id} renders the overlay on request; the last
+# HEATMAP_RENDER_CACHE_SIZE rendered images are kept in memory. Renders run on
+# HEATMAP_RENDER_WORKERS threads of their own with at most
+# HEATMAP_RENDER_QUEUE_SIZE more waiting. "file" writes a PNG overlay per
+# prediction to static/heatmaps as before
+HEATMAP_STORAGE = os.getenv("HEATMAP_STORAGE", "grid").lower()
+HEATMAP_GRID_SIZE = int(os.getenv("HEATMAP_GRID_SIZE", "14"))
+HEATMAP_PREVIEW_SIZE = int(os.getenv("HEATMAP_PREVIEW_SIZE", "512"))
+HEATMAP_RENDER_CACHE_SIZE = int(os.getenv("HEATMAP_RENDER_CACHE_SIZE", "256"))
+HEATMAP_RENDER_WORKERS = int(os.getenv("HEATMAP_RENDER_WORKERS", "2"))
+HEATMAP_RENDER_QUEUE_SIZE = int(os.getenv("HEATMAP_RENDER_QUEUE_SIZE", "16"))
+
+# Heatmap explanation mode: "auto" (CAM when the model ends in global average
+# pooling + dense, otherwise Grad-CAM), "gradcam", "cam" or "none"
+EXPLANATION_MODE = os.getenv("EXPLANATION_MODE", "auto")
+
+# Prediction vectors
+# Every logged prediction keeps its full probability vector (float16). With
+# STORE_EMBEDDINGS it also keeps the penultimate-layer embedding (the pooled
+# last feature maps) for models that expose them (see convert_model.py)
+STORE_EMBEDDINGS = os.getenv("STORE_EMBEDDINGS", "false").lower() in ("1", "true", "yes")
+
+# Storage retention
+# Every JANITOR_INTERVAL seconds (0 disables the janitor) files in
+# static/uploads and static/heatmaps, and heatmap grids in the database, older
+# than *_MAX_AGE_DAYS are deleted, then the oldest until at most *_MAX_FILES
+# entries and *_MAX_BYTES bytes remain. 0 means no limit
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "3600"))
+UPLOAD_MAX_AGE_DAYS = float(os.getenv("UPLOAD_MAX_AGE_DAYS", "30"))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "100000"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 ** 3)))
+HEATMAP_MAX_AGE_DAYS = float(os.getenv("HEATMAP_MAX_AGE_DAYS", "30"))
+HEATMAP_MAX_FILES = int(os.getenv("HEATMAP_MAX_FILES", "100000"))
+HEATMAP_MAX_BYTES = int(os.getenv("HEATMAP_MAX_BYTES", str(2 * 1024 ** 3)))
@@ -0,0 +1,286 @@
+"""
+Model Conversion - Export the Keras model to ONNX / TFLite with INT8 quantization
+Writes the converted model next to the original and an accuracy-delta report
+
+Usage:
+    python backend/convert_model.py --format tflite --quantize int8 \\
+        --calibration-dir data/calibration --eval-dir data/validation
+
+Requirements (conversion machine only, not serving workers):
+    tensorflow, plus tf2onnx and onnxruntime for --format onnx
+
+The evaluation directory may contain images directly, or one sub-directory per
+disease class (named as in DISEASE_CLASSES) to also report accuracy.
+"""
+
+import argparse
+import json
+import sys
+import time
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from config import MODEL_PATH, MODEL_INPUT_SIZE, DISEASE_CLASSES, ALLOWED_EXTENSIONS
+from inference_backends import KerasBackend, load_backend, find_model_file, cam_sidecar_path
+from model_loader import preprocess_images
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# DATA LOADING
+# ============================================
+
+def _list_images(directory, limit: int):
+    """Return up to limit (path, label) pairs; label is None for unlabelled images"""
+    if not directory:
+        return []
+    directory = Path(directory)
+    items = []
+    for path in sorted(directory.rglob("*")):
+        if path.suffix.lower().lstrip(".") not in ALLOWED_EXTENSIONS:
+            continue
+        label = path.parent.name if path.parent != directory else None
+        items.append((path, DISEASE_CLASSES.index(label) if label in DISEASE_CLASSES else None))
+        if len(items) >= limit:
+            break
+    return items
+
+def _load_batch(items) -> np.ndarray:
+    if not items:
+        return np.empty((0, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3), dtype=np.float32)
+    return preprocess_images(str(path) for path, _ in items)
+
+def _synthetic_batch(count: int) -> np.ndarray:
+    """Random inputs, used only when no sample images are available"""
+    rng = np.random.default_rng(0)
+    return rng.random((count, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3), dtype=np.float32)
+
+# ============================================
+# CONVERTERS
+# ============================================
+
+def with_cam_features(keras_model):
+    """
+    Add the feature maps feeding global average pooling as a second output, so
+    ONNX/TFLite models can produce gradient-free CAM heatmaps
+
+    Returns:
+        Tuple of (export model, dense weights (channels, classes)), or
+        (keras_model, None) if the model has no GAP -> Dense head
+    """
+    import tensorflow as tf
+    from gradcam import find_cam_layers
+
+    head = find_cam_layers(keras_model)
+    if head is None:
+        return keras_model, None
+    pooling, dense = head
+    export_model = tf.keras.models.Model(keras_model.inputs, [keras_model.output, pooling.input])
+    return export_model, np.asarray(dense.get_weights()[0], dtype=np.float32)
+
+def write_cam_sidecar(output_path: Path, weights: np.ndarray) -> Path:
+    """Save the dense weights the serving backend needs for CAM"""
+    sidecar = cam_sidecar_path(output_path)
+    with open(sidecar, "wb") as f:
+        np.savez(f, weights=weights)
+    return sidecar
+
+def convert_tflite(keras_model, output_path: Path, quantize: str, calibration: np.ndarray):
+    """
+    Convert to TFLite
+
+    quantize:
+        "none"    - float32
+        "dynamic" - int8 weights, float activations
+        "int8"    - int8 weights and activations (needs calibration images),
+                    float32 input/output so the serving code is unchanged
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantize in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "int8":
+        def representative_dataset():
+            for image in calibration:
+                yield [image[np.newaxis, ...]]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    output_path.write_bytes(converter.convert())
+    return output_path
+
+def convert_onnx(keras_model, output_path: Path, quantize: str, calibration: np.ndarray,
+                 opset: int = 13):
+    """
+    Convert to ONNX, optionally quantizing with ONNX Runtime
+
+    quantize:
+        "none"    - float32
+        "dynamic" - dynamic int8 quantization of weights
+        "int8"    - static QDQ int8 quantization calibrated on sample images
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3), tf.float32, name="input"),)
+    float_path = output_path if quantize == "none" else output_path.with_suffix(".float.onnx")
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=opset, output_path=str(float_path))
+
+    if quantize == "none":
+        return output_path
+
+    from onnxruntime import quantization
+
+    if quantize == "dynamic":
+        quantization.quantize_dynamic(str(float_path), str(output_path),
+                                      weight_type=quantization.QuantType.QInt8)
+    else:
+        class _CalibrationReader(quantization.CalibrationDataReader):
+            def __init__(self, images):
+                self._images = iter(images)
+
+            def get_next(self):
+                image = next(self._images, None)
+                return None if image is None else {"input": image[np.newaxis, ...]}
+
+        quantization.quantize_static(
+            str(float_path), str(output_path), _CalibrationReader(calibration),
+            quant_format=quantization.QuantFormat.QDQ,
+            activation_type=quantization.QuantType.QInt8,
+            weight_type=quantization.QuantType.QInt8,
+            per_channel=True
+        )
+
+    float_path.unlink(missing_ok=True)
+    return output_path
+
+# ============================================
+# ACCURACY-DELTA REPORT
+# ============================================
+
+def _timed_predict(backend, images: np.ndarray, batch_size: int):
+    outputs = []
+    started = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        outputs.append(backend.predict(images[start:start + batch_size]))
+    elapsed = time.perf_counter() - started
+    return np.concatenate(outputs), elapsed * 1000 / max(1, len(images))
+
+def accuracy_report(reference, candidate, images: np.ndarray, labels, batch_size: int = 8) -> dict:
+    """
+    Compare a converted model against the original
+
+    Returns:
+        Dictionary with top-1 agreement, probability deltas, per-image latency,
+        file sizes and (when labels are known) accuracy of both models
+    """
+    # Warm up both runtimes so one-time setup is not counted as latency
+    reference.predict(images[:1])
+    candidate.predict(images[:1])
+
+    ref_probs, ref_ms = _timed_predict(reference, images, batch_size)
+    new_probs, new_ms = _timed_predict(candidate, images, batch_size)
+
+    ref_top1 = ref_probs.argmax(axis=1)
+    new_top1 = new_probs.argmax(axis=1)
+    delta = np.abs(ref_probs - new_probs)
+
+    report = {
+        "images": int(len(images)),
+        "top1_agreement": float((ref_top1 == new_top1).mean()),
+        "mean_abs_prob_delta": float(delta.mean()),
+        "max_abs_prob_delta": float(delta.max()),
+        "reference": {
+            "file": str(reference.model_path),
+            "size_bytes": reference.model_path.stat().st_size,
+            "ms_per_image": round(ref_ms, 3)
+        },
+        "candidate": {
+            "file": str(candidate.model_path),
+            "size_bytes": candidate.model_path.stat().st_size,
+            "ms_per_image": round(new_ms, 3)
+        }
+    }
+
+    known = np.array([label is not None for label in labels], dtype=bool)
+    if known.any():
+        truth = np.array([label for label in labels if label is not None])
+        report["reference"]["accuracy"] = float((ref_top1[known] == truth).mean())
+        report["candidate"]["accuracy"] = float((new_top1[known] == truth).mean())
+        report["accuracy_delta"] = report["candidate"]["accuracy"] - report["reference"]["accuracy"]
+
+    return report
+
+# ============================================
+# CLI
+# ============================================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert the Keras model to ONNX/TFLite for CPU serving")
+    parser.add_argument("--model", help="Keras .h5/.keras model (default: first one in backend/models)")
+    parser.add_argument("--format", choices=["onnx", "tflite", "both"], default="tflite")
+    parser.add_argument("--quantize", choices=["none", "dynamic", "int8"], default="int8")
+    parser.add_argument("--calibration-dir", help="Sample images for INT8 calibration")
+    parser.add_argument("--eval-dir", help="Images for the accuracy-delta report (default: calibration dir)")
+    parser.add_argument("--limit", type=int, default=200, help="Maximum images per directory")
+    parser.add_argument("--output-dir", default=str(MODEL_PATH))
+    parser.add_argument("--no-cam", action="store_true",
+                        help="Do not export the feature output used for gradient-free CAM")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    model_path = Path(args.model) if args.model else find_model_file(MODEL_PATH, "keras")
+    if model_path is None or not model_path.exists():
+        logger.error("No Keras model found to convert")
+        return 1
+
+    calibration_items = _list_images(args.calibration_dir, args.limit)
+    eval_items = _list_images(args.eval_dir, args.limit) or calibration_items
+
+    if args.quantize == "int8" and not calibration_items:
+        logger.warning("No calibration images given; calibrating INT8 ranges on random inputs")
+    calibration = _load_batch(calibration_items) if calibration_items else _synthetic_batch(32)
+
+    if eval_items:
+        eval_images, labels = _load_batch(eval_items), [label for _, label in eval_items]
+    else:
+        logger.warning("No evaluation images given; report compares outputs on random inputs")
+        eval_images, labels = _synthetic_batch(32), [None] * 32
+
+    reference = KerasBackend(model_path)
+    export_model, cam_weights = reference.keras_model, None
+    if not args.no_cam:
+        export_model, cam_weights = with_cam_features(reference.keras_model)
+        if cam_weights is None:
+            logger.info("Model has no global average pooling head; exporting without CAM support")
+    suffix = "" if args.quantize == "none" else f"_{args.quantize}"
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    formats = ["onnx", "tflite"] if args.format == "both" else [args.format]
+    reports = {}
+    for fmt in formats:
+        output_path = output_dir / f"{model_path.stem}{suffix}.{fmt}"
+        logger.info(f"Converting {model_path.name} -> {output_path.name}")
+        if fmt == "onnx":
+            convert_onnx(export_model, output_path, args.quantize, calibration)
+        else:
+            convert_tflite(export_model, output_path, args.quantize, calibration)
+        if cam_weights is not None:
+            logger.info(f"CAM weights written to {write_cam_sidecar(output_path, cam_weights)}")
+
+        report = accuracy_report(reference, load_backend(output_path), eval_images, labels)
+        report_path = output_path.with_name(output_path.name + ".report.json")
+        report_path.write_text(json.dumps(report, indent=2))
+        reports[fmt] = report
+        logger.info(f"Report written to {report_path}")
+
+    print(json.dumps(reports, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,14 +3,197 @@ Database Management - SQLite
 Stores prediction history and disease recommendations
 """
 
+import base64
+import json
+import os
+import queue
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from types import MappingProxyType
 import logging
-from config import DATABASE_PATH, DISEASE_CLASSES
+import numpy as np
+import metrics
+from config import (
+    DATABASE_PATH, DISEASE_CLASSES, DB_POOL_SIZE, DB_JOURNAL_MODE, DB_MMAP_SIZE,
+    DB_CACHE_SIZE_KB, DB_BUSY_TIMEOUT, DB_STATEMENT_CACHE, RECOMMENDATION_CHECK_INTERVAL
+)
 
 logger = logging.getLogger(__name__)
 
+# ============================================
+# CONNECTION POOL
+# ============================================
+
+class ConnectionPool:
+    """
+    Thread-safe pool of open SQLite connections
+
+    Connections are created lazily up to size and handed out most recently
+    used first, so a lightly loaded server keeps reusing one warm connection
+    (page cache, mmap and prepared statements). When all are in use, acquire
+    waits for one to be released.
+
+    Args:
+        path: Database file
+        size: Maximum number of open connections
+        timeout: Seconds to wait for a locked database or a free connection
+    """
+
+    def __init__(self, path, size: int = DB_POOL_SIZE, timeout: float = DB_BUSY_TIMEOUT):
+        self.path = str(path)
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,   # Handed between threads, never shared at once
+            cached_statements=DB_STATEMENT_CACHE
+        )
+        cursor = conn.cursor()
+        if DB_JOURNAL_MODE:
+            cursor.execute(f'PRAGMA journal_mode = {DB_JOURNAL_MODE}')
+        cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.execute(f'PRAGMA mmap_size = {int(DB_MMAP_SIZE)}')
+        cursor.execute(f'PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}')
+        cursor.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        cursor.close()
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take a connection from the pool, opening one if below size"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No database connection free after {self.timeout:g}s (pool size {self.size})"
+            )
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection; an unfinished transaction is rolled back"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """Close idle connections; busy ones are closed when released"""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def init_pool(path=DATABASE_PATH, size: int = DB_POOL_SIZE) -> ConnectionPool:
+    """
+    (Re)create the connection pool, closing the previous one
+
+    Args:
+        path: Database file
+        size: Maximum number of open connections
+
+    Returns:
+        The new pool
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = ConnectionPool(path, size)
+        _pool_pid = os.getpid()
+        return _pool
+
+def close_pool():
+    """Close all pooled connections (called at shutdown)"""
+    global _pool
+    recommendation_cache.close()
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+def _get_pool() -> ConnectionPool:
+    global _pool, _pool_pid
+    pool = _pool
+    if pool is not None and _pool_pid == os.getpid():
+        return pool
+    # Connections must not cross a fork: a child process opens its own
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(DATABASE_PATH)
+            _pool_pid = os.getpid()
+        return _pool
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled connection for one unit of work
+
+    The transaction is committed when the block finishes and rolled back if
+    it raises; the connection then goes back to the pool.
+    """
+    pool = _get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+        if conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
+
 # ============================================
 # DATABASE INITIALIZATION
 # ============================================
@@ -18,44 +201,216 @@ logger = logging.getLogger(__name__)
 def init_db():
     """Initialize database with required tables"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            # Create predictions table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS predictions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    image_name TEXT NOT NULL,
+                    disease TEXT NOT NULL,
+                    confidence REAL NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    model_version TEXT
+                )
+            ''')
+            
+            # Databases created before model versioning lack the column
+            _ensure_column(cursor, "predictions", "model_version", "TEXT")
+            _ensure_column(cursor, "predictions", "heatmap_id", "TEXT")
+            _ensure_column(cursor, "predictions", "upload_sha256", "TEXT")
+            _ensure_column(cursor, "predictions", "probabilities", "BLOB")
+            _ensure_column(cursor, "predictions", "embedding", "BLOB")
+            
+            # Newest-first history pages, overall and per disease (keyset on timestamp, id)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions(timestamp, id)')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_predictions_disease_timestamp ON predictions(disease, timestamp, id)'
+            )
+            
+            # Create heatmaps table (compact grids rendered on request)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS heatmaps (
+                    id TEXT PRIMARY KEY,
+                    grid BLOB NOT NULL,
+                    grid_rows INTEGER NOT NULL,
+                    grid_cols INTEGER NOT NULL,
+                    preview BLOB NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_heatmaps_created_at ON heatmaps(created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_predictions_heatmap_id ON predictions(heatmap_id)')
+            
+            # Create uploads table (content-addressed originals, one file per distinct image)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS uploads (
+                    sha256 TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL DEFAULT 1,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    last_used DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_uploads_last_used ON uploads(last_used)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_predictions_upload_sha256 ON predictions(upload_sha256)')
+            
+            # Create recommendations table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recommendations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    disease_name TEXT UNIQUE NOT NULL,
+                    cause TEXT NOT NULL,
+                    pesticide TEXT NOT NULL,
+                    fertilizer TEXT NOT NULL,
+                    prevention TEXT NOT NULL
+                )
+            ''')
+            
+            # Version counter bumped by every change to recommendations, so each
+            # process can tell when its in-memory copy is stale
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('recommendations_version', 0)")
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS recommendations_version_{event.lower()}
+                    AFTER {event} ON recommendations
+                    BEGIN
+                        UPDATE meta SET value = value + 1 WHERE key = 'recommendations_version';
+                    END
+                ''')
+            
+            conn.commit()
+            logger.info("Database tables created/verified")
+            
+            # Initialize default recommendations
+            _initialize_recommendations(conn)
+            
+            # Rollups behind get_statistics
+            _initialize_statistics(conn)
+        
+        recommendation_cache.refresh()
+    
+    except Exception as e:
+        logger.error(f"Error initializing database: {e}")
+        raise
+
+def _ensure_column(cursor, table: str, column: str, definition: str):
+    """Add a column to an existing table if it is missing"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        logger.info(f"Added column {table}.{column}")
+
+# Periods kept in prediction_stats, with the strftime format of their bucket keys
+STATS_PERIODS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d",
+    "total": None
+}
+
+def _stats_upsert(row: str, sign: str) -> str:
+    """Trigger statement adding (sign "+") or removing (sign "-") row from every rollup period"""
+    values = ",\n".join(
+        f"('{period}', " + (f"IFNULL(strftime('{fmt}', {row}.timestamp), '')" if fmt else "''")
+        + f", {row}.disease, {sign}1, {sign}{row}.confidence)"
+        for period, fmt in STATS_PERIODS.items()
+    )
+    return f'''
+        INSERT INTO prediction_stats (period, bucket, disease, count, confidence_sum)
+        VALUES {values}
+        ON CONFLICT(period, bucket, disease) DO UPDATE SET
+            count = count + excluded.count,
+            confidence_sum = confidence_sum + excluded.confidence_sum;
+    '''
+
+def _initialize_statistics(conn):
+    """
+    Create the prediction_stats rollups and the triggers that keep them in step
+    with predictions; a new rollup table is backfilled from existing rows
+    """
+    cursor = conn.cursor()
+    conn.commit()
+    
+    # Backfill and trigger creation in one write transaction, so no insert
+    # from another process is counted twice or missed
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prediction_stats'")
+        exists = cursor.fetchone() is not None
         
-        # Create predictions table
+        # Per-disease count and confidence sum per hour, per day and overall
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS predictions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                image_name TEXT NOT NULL,
+            CREATE TABLE IF NOT EXISTS prediction_stats (
+                period TEXT NOT NULL,
+                bucket TEXT NOT NULL,
                 disease TEXT NOT NULL,
-                confidence REAL NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
+                count INTEGER NOT NULL,
+                confidence_sum REAL NOT NULL,
+                PRIMARY KEY (period, bucket, disease)
+            ) WITHOUT ROWID
         ''')
         
-        # Create recommendations table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS recommendations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                disease_name TEXT UNIQUE NOT NULL,
-                cause TEXT NOT NULL,
-                pesticide TEXT NOT NULL,
-                fertilizer TEXT NOT NULL,
-                prevention TEXT NOT NULL
-            )
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS prediction_stats_insert
+            AFTER INSERT ON predictions
+            BEGIN
+                {_stats_upsert("NEW", "+")}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS prediction_stats_delete
+            AFTER DELETE ON predictions
+            BEGIN
+                {_stats_upsert("OLD", "-")}
+                DELETE FROM prediction_stats WHERE disease = OLD.disease AND count <= 0;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS prediction_stats_update
+            AFTER UPDATE OF disease, confidence, timestamp ON predictions
+            BEGIN
+                {_stats_upsert("OLD", "-")}
+                {_stats_upsert("NEW", "+")}
+                DELETE FROM prediction_stats WHERE disease = OLD.disease AND count <= 0;
+            END
         ''')
         
+        if not exists:
+            _rebuild_statistics(cursor)
         conn.commit()
-        logger.info("Database tables created/verified")
-        
-        # Initialize default recommendations
-        _initialize_recommendations(conn)
-        
-        conn.close()
-    
-    except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+    except Exception:
+        conn.rollback()
         raise
 
+def _rebuild_statistics(cursor):
+    """Recompute every rollup from the predictions table"""
+    cursor.execute('DELETE FROM prediction_stats')
+    for period, fmt in STATS_PERIODS.items():
+        bucket = f"IFNULL(strftime('{fmt}', timestamp), '')" if fmt else "''"
+        cursor.execute(f'''
+            INSERT INTO prediction_stats (period, bucket, disease, count, confidence_sum)
+            SELECT '{period}', {bucket}, disease, COUNT(*), SUM(confidence)
+            FROM predictions
+            GROUP BY 2, 3
+        ''')
+    cursor.execute("SELECT count FROM prediction_stats WHERE period = 'total'")
+    total = sum(row[0] for row in cursor.fetchall())
+    logger.info(f"Built prediction statistics from {total} predictions")
+
+def rebuild_statistics():
+    """Recompute the prediction_stats rollups (repair after manual edits)"""
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        _rebuild_statistics(conn.cursor())
+
 def _initialize_recommendations(conn):
     """Initialize comprehensive disease recommendations with detailed solutions"""
     
@@ -144,7 +499,28 @@ def _initialize_recommendations(conn):
 # PREDICTION OPERATIONS
 # ============================================
 
-def save_prediction(image_name: str, disease: str, confidence: float):
+# Probability vectors and embeddings are stored as packed little-endian float16
+VECTOR_DTYPE = np.dtype("<f2")
+
+def pack_probabilities(all_predictions: dict) -> bytes:
+    """Pack {disease: probability} into a float16 BLOB in DISEASE_CLASSES order"""
+    if not all_predictions:
+        return None
+    return np.array([all_predictions.get(name, 0.0) for name in DISEASE_CLASSES], dtype=VECTOR_DTYPE).tobytes()
+
+def pack_embedding(vector) -> bytes:
+    """Pack an embedding vector into a float16 BLOB"""
+    if vector is None:
+        return None
+    return np.asarray(vector, dtype=np.float32).ravel().astype(VECTOR_DTYPE).tobytes()
+
+def unpack_vector(blob: bytes) -> np.ndarray:
+    """Inverse of pack_probabilities/pack_embedding (float32 array)"""
+    return np.frombuffer(blob, dtype=VECTOR_DTYPE).astype(np.float32)
+
+def save_prediction(image_name: str, disease: str, confidence: float, model_version: str = None,
+                    heatmap_id: str = None, upload_sha256: str = None,
+                    probabilities: bytes = None, embedding: bytes = None):
     """
     Save prediction to database
     
@@ -152,47 +528,143 @@ def save_prediction(image_name: str, disease: str, confidence: float):
         image_name: Name of uploaded image
         disease: Predicted disease name
         confidence: Confidence score (0-1)
+        model_version: Version of the model that served the prediction
+        heatmap_id: ID of the stored heatmap grid, if any
+        upload_sha256: Content hash of the stored upload, if any
+        probabilities: Class probabilities from pack_probabilities, if any
+        embedding: Penultimate-layer embedding from pack_embedding, if any
     """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO predictions (image_name, disease, confidence)
-            VALUES (?, ?, ?)
-        ''', (image_name, disease, confidence))
-        
-        conn.commit()
-        conn.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO predictions (image_name, disease, confidence, model_version, heatmap_id, upload_sha256,
+                                         probabilities, embedding)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (image_name, disease, confidence, model_version, heatmap_id, upload_sha256, probabilities, embedding))
+            
+            conn.commit()
         logger.info(f"Saved prediction: {disease} ({confidence:.2%})")
     
     except Exception as e:
         logger.error(f"Error saving prediction: {e}")
         raise
 
-def get_prediction_history(limit: int = 10):
+def describe_prediction(record) -> str:
+    """Short label for a save_predictions record in logs (leaves out the vector blobs)"""
+    image_name, disease = record[0], record[1]
+    heatmap_id = record[4] if len(record) > 4 else None
+    return f"image={image_name} disease={disease} heatmap_id={heatmap_id}"
+
+def save_predictions(records):
+    """
+    Save many predictions in a single transaction
+    
+    Args:
+        records: Iterable of (image_name, disease, confidence, model_version[, heatmap_id[, upload_sha256
+                 [, probabilities[, embedding]]]]) tuples, in save_prediction's argument order
+    """
+    records = [tuple(record) + (None,) * (8 - len(record)) for record in records]
+    if not records:
+        return
+    
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.executemany('''
+                INSERT INTO predictions (image_name, disease, confidence, model_version, heatmap_id, upload_sha256,
+                                         probabilities, embedding)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', records)
+            
+            conn.commit()
+        logger.info(f"Saved {len(records)} predictions")
+    
+    except Exception as e:
+        logger.error(f"Error saving predictions: {e}")
+        raise
+
+# Stored timestamps are SQLite CURRENT_TIMESTAMP text (UTC)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def encode_cursor(timestamp: str, prediction_id: int) -> str:
+    """Opaque page token for the position after the given prediction"""
+    raw = json.dumps([timestamp, prediction_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> tuple:
+    """
+    Inverse of encode_cursor
+    
+    Raises:
+        ValueError: If the token is malformed
     """
-    Get recent predictions from database
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        timestamp, prediction_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(timestamp, str) or not isinstance(prediction_id, int):
+        raise ValueError("Invalid cursor")
+    return timestamp, prediction_id
+
+def get_prediction_history(limit: int = 10, after: tuple = None, disease: str = None,
+                           min_confidence: float = None, max_confidence: float = None,
+                           start: datetime = None, end: datetime = None):
+    """
+    Get predictions from database, newest first
+    
+    Pages are keyset-based: pass the (timestamp, id) of the last prediction of
+    the previous page as after, so deep pages cost the same as the first.
     
     Args:
-        limit: Number of recent predictions to retrieve
+        limit: Number of predictions to retrieve
+        after: (timestamp, id) to continue after (see decode_cursor)
+        disease: Only this disease
+        min_confidence: Only predictions with at least this confidence
+        max_confidence: Only predictions with at most this confidence
+        start: Only predictions at or after this UTC time
+        end: Only predictions before this UTC time
     
     Returns:
         List of predictions
     """
+    conditions = ['timestamp IS NOT NULL']
+    params = []
+    if after is not None:
+        conditions.append('(timestamp, id) < (?, ?)')
+        params.extend(after)
+    if disease is not None:
+        conditions.append('disease = ?')
+        params.append(disease)
+    if min_confidence is not None:
+        conditions.append('confidence >= ?')
+        params.append(min_confidence)
+    if max_confidence is not None:
+        conditions.append('confidence <= ?')
+        params.append(max_confidence)
+    if start is not None:
+        conditions.append('timestamp >= ?')
+        params.append(start.strftime(TIMESTAMP_FORMAT))
+    if end is not None:
+        conditions.append('timestamp < ?')
+        params.append(end.strftime(TIMESTAMP_FORMAT))
+    
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, image_name, disease, confidence, timestamp
-            FROM predictions
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (limit,))
-        
-        predictions = cursor.fetchall()
-        conn.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT id, image_name, disease, confidence, timestamp, model_version, heatmap_id
+                FROM predictions
+                WHERE {' AND '.join(conditions)}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', params + [limit])
+            
+            predictions = cursor.fetchall()
         
         return [
             {
@@ -200,48 +672,266 @@ def get_prediction_history(limit: int = 10):
                 "image_name": p[1],
                 "disease": p[2],
                 "confidence": p[3],
-                "timestamp": p[4]
+                "timestamp": p[4],
+                "model_version": p[5],
+                "heatmap_id": p[6]
             }
             for p in predictions
         ]
     
     except Exception as e:
         logger.error(f"Error retrieving predictions: {e}")
-        return []
+        raise
 
-def get_statistics():
-    """Get prediction statistics"""
-    try:
-        conn = sqlite3.connect(DATABASE_PATH)
+def load_prediction_vectors(start: datetime = None, end: datetime = None, disease: str = None,
+                            model_version: str = None, embeddings: bool = False,
+                            dtype=np.float32) -> dict:
+    """
+    Load the stored probability vectors (and embeddings) of a time range into
+    NumPy matrices, oldest first. BLOBs are concatenated and decoded in one
+    np.frombuffer call per matrix instead of per row
+    
+    Args:
+        start: Only predictions at or after this UTC time
+        end: Only predictions before this UTC time
+        disease: Only predictions of this disease
+        model_version: Only predictions served by this model version
+        embeddings: Also load embeddings; their width is that of the newest
+                    matching embedding, rows without one (or of another
+                    width) are NaN
+        dtype: dtype of the returned matrices
+    
+    Returns:
+        Dictionary with "ids" (N,), "timestamps" (N,) datetime64[s],
+        "classes" (column names), "probabilities" (N, classes) and
+        "embeddings" (N, width) or None
+    """
+    width = len(DISEASE_CLASSES) * VECTOR_DTYPE.itemsize
+    conditions = ['timestamp IS NOT NULL', 'length(probabilities) = ?']
+    params = [width]
+    if start is not None:
+        conditions.append('timestamp >= ?')
+        params.append(start.strftime(TIMESTAMP_FORMAT))
+    if end is not None:
+        conditions.append('timestamp < ?')
+        params.append(end.strftime(TIMESTAMP_FORMAT))
+    if disease is not None:
+        conditions.append('disease = ?')
+        params.append(disease)
+    if model_version is not None:
+        conditions.append('model_version = ?')
+        params.append(model_version)
+    where = ' AND '.join(conditions)
+    
+    with connection() as conn:
         cursor = conn.cursor()
         
-        # Total predictions
-        cursor.execute('SELECT COUNT(*) FROM predictions')
-        total_predictions = cursor.fetchone()[0]
+        embedding_sql = 'NULL'
+        embedding_params = []
+        embedding_width = 0
+        if embeddings:
+            cursor.execute(f'''
+                SELECT length(embedding) FROM predictions
+                WHERE {where} AND embedding IS NOT NULL
+                ORDER BY timestamp DESC, id DESC LIMIT 1
+            ''', params)
+            row = cursor.fetchone()
+            embedding_width = row[0] if row else 0
+            if embedding_width:
+                # Rows without a usable embedding get NaNs, so the matrix stays rectangular
+                missing = np.full(embedding_width // VECTOR_DTYPE.itemsize, np.nan, dtype=VECTOR_DTYPE).tobytes()
+                embedding_sql = 'CASE WHEN length(embedding) = ? THEN embedding ELSE ? END'
+                embedding_params = [embedding_width, missing]
         
-        # Disease distribution
-        cursor.execute('''
-            SELECT disease, COUNT(*) as count
+        cursor.execute(f'''
+            SELECT id, CAST(strftime('%s', timestamp) AS INTEGER), probabilities, {embedding_sql}
             FROM predictions
-            GROUP BY disease
-            ORDER BY count DESC
-        ''')
-        disease_distribution = cursor.fetchall()
-        
-        # Average confidence by disease
-        cursor.execute('''
-            SELECT disease, AVG(confidence) as avg_confidence
+            WHERE {where}
+            ORDER BY timestamp, id
+        ''', embedding_params + params)
+        rows = cursor.fetchall()
+    
+    ids, seconds, probabilities, vectors = zip(*rows) if rows else ((), (), (), ())
+    
+    def matrix(blobs, row_bytes):
+        values = np.frombuffer(b"".join(blobs), dtype=VECTOR_DTYPE)
+        return values.reshape(len(blobs), row_bytes // VECTOR_DTYPE.itemsize).astype(dtype)
+    
+    return {
+        "ids": np.array(ids, dtype=np.int64),
+        "timestamps": np.array(seconds, dtype=np.int64).astype("datetime64[s]"),
+        "classes": list(DISEASE_CLASSES),
+        "probabilities": matrix(probabilities, width),
+        "embeddings": matrix(vectors, embedding_width) if embedding_width else None
+    }
+
+def read_prediction_rows(after_id: int = 0, start: datetime = None, end: datetime = None,
+                         limit: int = 1000) -> list:
+    """
+    One chunk of predictions in id order, for exports
+    
+    Each call is its own short read, so a long export never holds a read
+    transaction open (or a pooled connection) between chunks.
+    
+    Args:
+        after_id: Return predictions with a larger id (resume point)
+        start: Only predictions at or after this UTC time
+        end: Only predictions before this UTC time
+        limit: Maximum number of rows
+    
+    Returns:
+        List of (id, timestamp, image_name, disease, confidence, model_version,
+        heatmap_id, upload_sha256, probabilities) tuples
+    """
+    conditions = ['id > ?']
+    params = [after_id]
+    if start is not None:
+        conditions.append('timestamp >= ?')
+        params.append(start.strftime(TIMESTAMP_FORMAT))
+    if end is not None:
+        conditions.append('timestamp < ?')
+        params.append(end.strftime(TIMESTAMP_FORMAT))
+    
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, timestamp, image_name, disease, confidence, model_version,
+                   heatmap_id, upload_sha256, probabilities
             FROM predictions
-            GROUP BY disease
-        ''')
-        avg_confidence = cursor.fetchall()
-        
-        conn.close()
+            WHERE {' AND '.join(conditions)}
+            ORDER BY id
+            LIMIT ?
+        ''', params + [limit])
+        return cursor.fetchall()
+
+def first_prediction_id(start: datetime):
+    """
+    Id of the first prediction at or after a UTC time, or None if there is none
+    
+    Ids are assigned in insertion order and timestamps default to the insert
+    time, so ids increase with time. Exports seed their id-ordered scan from
+    this id instead of walking the primary key from the first row. The lookup
+    is one seek on the (timestamp, id) index.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id FROM predictions
+            WHERE timestamp >= ?
+            ORDER BY timestamp, id
+            LIMIT 1
+        ''', (start.strftime(TIMESTAMP_FORMAT),))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+def estimate_prediction_count(disease: str = None, start: datetime = None, end: datetime = None) -> int:
+    """
+    Number of predictions of a disease in a time window, from the statistics
+    rollups instead of a scan (the window is widened to whole hours)
+    """
+    stats = get_statistics(start, end)
+    if disease is not None:
+        return stats.get("disease_distribution", {}).get(disease, 0)
+    return stats.get("total_predictions", 0)
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parse an ISO 8601 date or date-time; aware times are converted to UTC
+    (the timezone of stored timestamps)
+    
+    Raises:
+        ValueError: If value is not ISO 8601
+    """
+    value = value.strip()
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _floor(moment: datetime, period: str) -> datetime:
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if period == "day" else moment
+
+def _ceil(moment: datetime, period: str) -> datetime:
+    floored = _floor(moment, period)
+    if floored == moment:
+        return moment
+    return floored + (timedelta(days=1) if period == "day" else timedelta(hours=1))
+
+def _bucket_ranges(start: datetime = None, end: datetime = None) -> list:
+    """
+    Cover [start, end) with as few rollup buckets as possible: whole days from
+    the daily rollup and the partial days at either end from the hourly one.
+    start is rounded down and end up to whole hours
+    
+    Returns:
+        List of (period, first bucket or None, end bucket or None)
+    """
+    start = _floor(start, "hour") if start else None
+    end = _ceil(end, "hour") if end else None
+    first_day = _ceil(start, "day") if start else None
+    last_day = _floor(end, "day") if end else None
+    
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        return [("hour", start, end)]
+    
+    ranges = [("day", first_day, last_day)]
+    if start is not None and start < first_day:
+        ranges.append(("hour", start, first_day))
+    if end is not None and last_day < end:
+        ranges.append(("hour", last_day, end))
+    return ranges
+
+def get_statistics(start: datetime = None, end: datetime = None):
+    """
+    Get prediction statistics from the rollup tables (cost independent of
+    the number of predictions)
+    
+    Args:
+        start: Only count predictions at or after this UTC time (rounded down to the hour)
+        end: Only count predictions before this UTC time (rounded up to the hour)
+    
+    Returns:
+        Dictionary with total_predictions, disease_distribution and avg_confidence
+    """
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            if start is None and end is None:
+                cursor.execute('''
+                    SELECT disease, count, confidence_sum
+                    FROM prediction_stats
+                    WHERE period = 'total'
+                ''')
+            else:
+                queries = []
+                params = []
+                for period, first, stop in _bucket_ranges(start, end):
+                    fmt = STATS_PERIODS[period]
+                    query = 'SELECT disease, count, confidence_sum FROM prediction_stats WHERE period = ?'
+                    params.append(period)
+                    if first is not None:
+                        query += ' AND bucket >= ?'
+                        params.append(first.strftime(fmt))
+                    if stop is not None:
+                        query += ' AND bucket < ?'
+                        params.append(stop.strftime(fmt))
+                    queries.append(query)
+                cursor.execute(f'''
+                    SELECT disease, SUM(count), SUM(confidence_sum)
+                    FROM ({' UNION ALL '.join(queries)})
+                    GROUP BY disease
+                ''', params)
+            rows = [row for row in cursor.fetchall() if row[1] > 0]
         
+        rows.sort(key=lambda row: row[1], reverse=True)
         return {
-            "total_predictions": total_predictions,
-            "disease_distribution": {d[0]: d[1] for d in disease_distribution},
-            "avg_confidence": {d[0]: d[1] for d in avg_confidence}
+            "total_predictions": sum(row[1] for row in rows),
+            "disease_distribution": {d[0]: d[1] for d in rows},
+            "avg_confidence": {d[0]: d[2] / d[1] for d in rows}
         }
     
     except Exception as e:
@@ -249,61 +939,380 @@ def get_statistics():
         return {}
 
 # ============================================
-# RECOMMENDATION OPERATIONS
+# HEATMAP OPERATIONS
 # ============================================
 
-def get_recommendations(disease_name: str) -> dict:
+def save_heatmap_record(heatmap_id: str, grid: bytes, grid_rows: int, grid_cols: int, preview: bytes):
     """
-    Get agronomic recommendations for a disease
+    Save a compact heatmap
     
     Args:
-        disease_name: Name of the disease
+        heatmap_id: Heatmap ID
+        grid: uint8 heatmap grid bytes (grid_rows x grid_cols)
+        preview: Encoded preview of the original image
+    """
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT OR REPLACE INTO heatmaps (id, grid, grid_rows, grid_cols, preview)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (heatmap_id, grid, grid_rows, grid_cols, preview))
+            
+            conn.commit()
+    
+    except Exception as e:
+        logger.error(f"Error saving heatmap: {e}")
+        raise
+
+def get_heatmap_record(heatmap_id: str):
+    """
+    Get a compact heatmap
     
     Returns:
-        Dictionary with recommendations
+        Dictionary with grid, grid_rows, grid_cols and preview, or None if unknown
     """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT cause, pesticide, fertilizer, prevention
-            FROM recommendations
-            WHERE disease_name = ?
-        ''', (disease_name,))
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT grid, grid_rows, grid_cols, preview
+                FROM heatmaps
+                WHERE id = ?
+            ''', (heatmap_id,))
+            
+            result = cursor.fetchone()
         
-        result = cursor.fetchone()
-        conn.close()
+        if result is None:
+            return None
+        return {
+            "grid": result[0],
+            "grid_rows": result[1],
+            "grid_cols": result[2],
+            "preview": result[3]
+        }
+    
+    except Exception as e:
+        logger.error(f"Error retrieving heatmap: {e}")
+        return None
+
+def heatmap_exists(heatmap_id: str) -> bool:
+    """True if a compact heatmap with this ID is stored"""
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT 1 FROM heatmaps WHERE id = ?', (heatmap_id,))
+            found = cursor.fetchone() is not None
         
-        if result:
-            return {
-                "cause": result[0],
-                "pesticide": result[1],
-                "fertilizer": result[2],
-                "prevention": result[3]
-            }
+        return found
+    
+    except Exception as e:
+        logger.error(f"Error checking heatmap: {e}")
+        return False
+
+def _over_quota(cursor, table: str, columns: str, size_sql: str, time_column: str,
+                max_age_days: float, max_rows: int, max_bytes: int):
+    """
+    Split a table's rows by age, count and byte quotas, keeping the newest
+    (0 means no limit)
+    
+    Returns:
+        Tuple of (doomed rows as tuples of columns, bytes in doomed rows, rows kept, bytes kept)
+    """
+    cursor.execute(f'''
+        SELECT {columns}, size, {time_column} < datetime('now', ?) AS expired,
+               ROW_NUMBER() OVER newest AS position,
+               SUM(size) OVER newest AS running
+        FROM (SELECT rowid AS seq, {columns}, {time_column}, {size_sql} AS size FROM {table})
+        WINDOW newest AS (ORDER BY {time_column} DESC, seq DESC)
+    ''', (f"-{max_age_days} days",))
+    
+    width = len(columns.split(","))
+    doomed = []
+    reclaimed = kept = kept_bytes = 0
+    for row in cursor.fetchall():
+        size, expired, position, running = row[width:]
+        if (max_age_days and expired) or (max_rows and position > max_rows) or (max_bytes and running > max_bytes):
+            doomed.append(row[:width])
+            reclaimed += size
         else:
-            logger.warning(f"Recommendations not found for: {disease_name}")
-            return {
-                "cause": "Unknown disease",
-                "pesticide": "Consult an agricultural expert",
-                "fertilizer": "Maintain balanced NPK fertilizer",
-                "prevention": "Regular monitoring recommended"
-            }
+            kept += 1
+            kept_bytes += size
+    return doomed, reclaimed, kept, kept_bytes
+
+def prune_heatmaps(max_age_days: float = 0, max_rows: int = 0, max_bytes: int = 0):
+    """
+    Delete stored heatmaps beyond the quotas, oldest first (0 means no limit),
+    and clear the heatmap_id of predictions that referenced them
+    
+    Returns:
+        Tuple of (deleted heatmap IDs, bytes reclaimed, rows kept, bytes kept)
+    """
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            doomed, reclaimed, kept, kept_bytes = _over_quota(
+                cursor, "heatmaps", "id", "length(grid) + length(preview)", "created_at",
+                max_age_days, max_rows, max_bytes
+            )
+            
+            if doomed:
+                cursor.executemany('UPDATE predictions SET heatmap_id = NULL WHERE heatmap_id = ?', doomed)
+                cursor.executemany('DELETE FROM heatmaps WHERE id = ?', doomed)
+                conn.commit()
+        
+        return [row[0] for row in doomed], reclaimed, kept, kept_bytes
     
     except Exception as e:
-        logger.error(f"Error retrieving recommendations: {e}")
+        logger.error(f"Error pruning heatmaps: {e}")
+        raise
+
+# ============================================
+# UPLOAD OPERATIONS
+# ============================================
+
+def add_upload_reference(sha256: str, path: str, size: int) -> int:
+    """
+    Record a reference to a content-addressed upload, creating its row on first use
+    
+    Args:
+        sha256: Content hash of the image bytes
+        path: Path of the stored file, relative to the project root
+        size: File size in bytes
+    
+    Returns:
+        Reference count after this reference
+    """
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO uploads (sha256, path, size) VALUES (?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET
+                    refcount = refcount + 1,
+                    last_used = CURRENT_TIMESTAMP
+            ''', (sha256, path, size))
+            cursor.execute('SELECT refcount FROM uploads WHERE sha256 = ?', (sha256,))
+            refcount = cursor.fetchone()[0]
+            
+            conn.commit()
+        return refcount
+    
+    except Exception as e:
+        logger.error(f"Error saving upload reference: {e}")
+        raise
+
+def get_upload(sha256: str):
+    """
+    Get a stored upload
+    
+    Returns:
+        Dictionary with sha256, path, size, refcount, created_at and last_used, or None
+    """
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT sha256, path, size, refcount, created_at, last_used
+                FROM uploads
+                WHERE sha256 = ?
+            ''', (sha256,))
+            
+            result = cursor.fetchone()
+        
+        if result is None:
+            return None
+        return {
+            "sha256": result[0],
+            "path": result[1],
+            "size": result[2],
+            "refcount": result[3],
+            "created_at": result[4],
+            "last_used": result[5]
+        }
+    
+    except Exception as e:
+        logger.error(f"Error retrieving upload: {e}")
+        return None
+
+def prune_uploads(max_age_days: float = 0, max_rows: int = 0, max_bytes: int = 0):
+    """
+    Delete upload rows beyond the quotas, least recently used first (0 means
+    no limit), and clear the upload_sha256 of predictions that referenced them
+    
+    Returns:
+        Tuple of (paths of the deleted uploads, bytes reclaimed, rows kept, bytes kept)
+    """
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            doomed, reclaimed, kept, kept_bytes = _over_quota(
+                cursor, "uploads", "sha256, path", "size", "last_used",
+                max_age_days, max_rows, max_bytes
+            )
+            
+            if doomed:
+                hashes = [(row[0],) for row in doomed]
+                cursor.executemany('UPDATE predictions SET upload_sha256 = NULL WHERE upload_sha256 = ?', hashes)
+                cursor.executemany('DELETE FROM uploads WHERE sha256 = ?', hashes)
+                conn.commit()
+        
+        return [row[1] for row in doomed], reclaimed, kept, kept_bytes
+    
+    except Exception as e:
+        logger.error(f"Error pruning uploads: {e}")
+        raise
+
+# ============================================
+# RECOMMENDATION OPERATIONS
+# ============================================
+
+class RecommendationCache:
+    """
+    Immutable in-memory copy of the recommendations table
+
+    Lookups read a frozen mapping that is swapped whole on reload, so readers
+    never take a lock. At most every check_interval seconds a lookup checks
+    for changes made by other processes: PRAGMA data_version on a dedicated
+    connection tells whether anything was committed since the last check, and
+    only then is the recommendations version counter (kept by triggers in the
+    meta table) read and compared.
+
+    Args:
+        check_interval: Minimum seconds between staleness checks
+    """
+
+    def __init__(self, check_interval: float = RECOMMENDATION_CHECK_INTERVAL):
+        self.check_interval = max(0.0, float(check_interval))
+
+        self._map = MappingProxyType({})
+        self._version = None
+        self._data_version = None
+        self._next_check = 0.0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self._reloads = metrics.counter("recommendations.reloads")
+
+    @property
+    def version(self):
+        """Version counter of the loaded recommendations (None before the first load)"""
+        return self._version
+
+    def get(self, disease_name: str):
+        """Frozen recommendation for disease_name, or None if unknown or not loaded"""
+        if time.monotonic() >= self._next_check:
+            self._check()
+        return self._map.get(disease_name)
+
+    def refresh(self):
+        """Reload now (at startup and after a local update)"""
+        with self._lock:
+            try:
+                conn = self._connection()
+                self._data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+                self._load(conn)
+            except sqlite3.Error as e:
+                logger.error(f"Error loading recommendations: {e}")
+            self._next_check = time.monotonic() + self.check_interval
+
+    def close(self):
+        """Close the change-detection connection"""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Not pooled: data_version is tracked per connection
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(_get_pool().path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+            self._pid = os.getpid()
+            self._data_version = None
+        return self._conn
+
+    def _check(self):
+        if not self._lock.acquire(blocking=False):
+            return   # Another thread is checking; serve the current map
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            conn = self._connection()
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version and self._version is not None:
+                return
+            self._data_version = data_version
+            row = conn.execute("SELECT value FROM meta WHERE key = 'recommendations_version'").fetchone()
+            if row is None or row[0] != self._version:
+                self._load(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not check recommendations for changes: {e}")
+        finally:
+            self._lock.release()
+
+    def _load(self, conn: sqlite3.Connection):
+        # Version first: a change landing in between only causes one more reload
+        row = conn.execute("SELECT value FROM meta WHERE key = 'recommendations_version'").fetchone()
+        rows = conn.execute('''
+            SELECT disease_name, cause, pesticide, fertilizer, prevention
+            FROM recommendations
+        ''').fetchall()
+        self._map = MappingProxyType({
+            name: MappingProxyType({
+                "cause": cause,
+                "pesticide": pesticide,
+                "fertilizer": fertilizer,
+                "prevention": prevention
+            })
+            for name, cause, pesticide, fertilizer, prevention in rows
+        })
+        self._version = row[0] if row else 0
+        self._reloads.inc()
+        logger.info(f"Loaded {len(rows)} recommendations (version {self._version})")
+
+recommendation_cache = RecommendationCache()
+
+def get_recommendations(disease_name: str) -> dict:
+    """
+    Get agronomic recommendations for a disease (served from memory)
+    
+    Args:
+        disease_name: Name of the disease
+    
+    Returns:
+        Dictionary with recommendations
+    """
+    result = recommendation_cache.get(disease_name)
+    
+    if result is not None:
+        return dict(result)
+    elif recommendation_cache.version is None:
+        logger.error(f"Recommendations unavailable for: {disease_name}")
         return {}
+    else:
+        logger.warning(f"Recommendations not found for: {disease_name}")
+        return {
+            "cause": "Unknown disease",
+            "pesticide": "Consult an agricultural expert",
+            "fertilizer": "Maintain balanced NPK fertilizer",
+            "prevention": "Regular monitoring recommended"
+        }
 
 def get_all_diseases():
     """Get all diseases in database"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT disease_name FROM recommendations ORDER BY disease_name')
-        diseases = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT disease_name FROM recommendations ORDER BY disease_name')
+            diseases = [row[0] for row in cursor.fetchall()]
         
         return diseases
     
@@ -315,17 +1324,17 @@ def update_recommendation(disease_name: str, cause: str, pesticide: str,
                          fertilizer: str, prevention: str):
     """Update existing recommendation"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE recommendations
-            SET cause = ?, pesticide = ?, fertilizer = ?, prevention = ?
-            WHERE disease_name = ?
-        ''', (cause, pesticide, fertilizer, prevention, disease_name))
-        
-        conn.commit()
-        conn.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE recommendations
+                SET cause = ?, pesticide = ?, fertilizer = ?, prevention = ?
+                WHERE disease_name = ?
+            ''', (cause, pesticide, fertilizer, prevention, disease_name))
+            
+            conn.commit()
+        recommendation_cache.refresh()
         logger.info(f"Updated recommendations for: {disease_name}")
     
     except Exception as e:
@@ -0,0 +1,272 @@
+"""
+Prediction Export - Stream the prediction history as CSV, NDJSON or Parquet
+Rows are read in id order a chunk at a time, each chunk in its own short
+read, so memory use is bounded by the chunk size and concurrent inserts are
+never blocked. An interrupted export resumes after the last id it delivered.
+
+Usage:
+    python backend/export.py --format csv --output predictions.csv
+    python backend/export.py --format parquet --output march.parquet \\
+        --start 2024-03-01 --end 2024-04-01
+    python backend/export.py --format ndjson --output predictions.ndjson \\
+        --after-id 120000 --append
+
+Requirements:
+    pyarrow for --format parquet
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from config import DISEASE_CLASSES, EXPORT_CHUNK_SIZE
+from database import read_prediction_rows, first_prediction_id, parse_timestamp, VECTOR_DTYPE
+
+logger = logging.getLogger(__name__)
+
+# Media type and file extension per format
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+COLUMNS = [
+    "id", "timestamp", "image_name", "disease", "confidence", "model_version",
+    "heatmap_id", "upload_sha256"
+]
+
+# ============================================
+# READING
+# ============================================
+
+def iter_chunks(start=None, end=None, after_id: int = 0, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yield the matching predictions chunk by chunk
+
+    Yields:
+        Tuple of (rows, probabilities): rows are tuples in COLUMNS order and
+        probabilities is a (len(rows), classes) float32 matrix, NaN where a
+        prediction has no stored vector
+    """
+    width = len(DISEASE_CLASSES) * VECTOR_DTYPE.itemsize
+    missing = np.full(len(DISEASE_CLASSES), np.nan, dtype=VECTOR_DTYPE).tobytes()
+    if start is not None:
+        # Ids increase with time: skip straight to the first row of the range
+        first_id = first_prediction_id(start)
+        if first_id is None:
+            return
+        after_id = max(after_id, first_id - 1)
+    while True:
+        rows = read_prediction_rows(after_id, start, end, chunk_size)
+        if not rows:
+            return
+        blobs = b"".join(row[8] if row[8] is not None and len(row[8]) == width else missing for row in rows)
+        probabilities = np.frombuffer(blobs, dtype=VECTOR_DTYPE).reshape(len(rows), -1).astype(np.float32)
+        yield [row[:8] for row in rows], probabilities
+        after_id = rows[-1][0]
+
+# ============================================
+# WRITERS
+# ============================================
+
+def _csv_chunk(rows, probabilities, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(COLUMNS + [f"p_{name}" for name in DISEASE_CLASSES])
+    for row, vector in zip(rows, probabilities.tolist()):
+        writer.writerow(list(row) + ["" if p != p else round(p, 4) for p in vector])   # p != p: NaN
+    return buffer.getvalue().encode("utf-8")
+
+def _ndjson_chunk(rows, probabilities) -> bytes:
+    lines = []
+    for row, vector in zip(rows, probabilities.tolist()):
+        record = dict(zip(COLUMNS, row))
+        record["probabilities"] = None if vector[0] != vector[0] else {
+            name: round(p, 4) for name, p in zip(DISEASE_CLASSES, vector)
+        }
+        lines.append(json.dumps(record))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow, pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+def _parquet_schema(pa):
+    return pa.schema(
+        [
+            ("id", pa.int64()), ("timestamp", pa.string()), ("image_name", pa.string()),
+            ("disease", pa.string()), ("confidence", pa.float64()), ("model_version", pa.string()),
+            ("heatmap_id", pa.string()), ("upload_sha256", pa.string())
+        ]
+        + [(f"p_{name}", pa.float32()) for name in DISEASE_CLASSES]
+    )
+
+def _parquet_table(pa, schema, rows, probabilities):
+    columns = [list(column) for column in zip(*rows)]
+    columns += [probabilities[:, i] for i in range(probabilities.shape[1])]
+    return pa.Table.from_arrays(
+        [pa.array(values, type=field.type, from_pandas=True) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+class _ChunkSink:
+    """Write-only file object that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+def check_format(fmt: str):
+    """
+    Raise ValueError for unknown formats and RuntimeError when a format's
+    optional dependency is missing
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (use {', '.join(FORMATS)})")
+    if fmt == "parquet":
+        _import_pyarrow()
+
+def stream_export(fmt: str, start=None, end=None, after_id: int = 0,
+                  chunk_size: int = EXPORT_CHUNK_SIZE, header: bool = True, progress=None):
+    """
+    Encoded export, one piece per chunk of rows
+
+    Args:
+        fmt: "csv", "ndjson" or "parquet"
+        start: Only predictions at or after this UTC time
+        end: Only predictions before this UTC time
+        after_id: Resume after this prediction id
+        chunk_size: Rows per read (and per Parquet row group)
+        header: Write the CSV header row
+        progress: Called with the last exported id after each chunk
+
+    Yields:
+        Bytes of the export file
+    """
+    check_format(fmt)
+    chunk_size = max(1, int(chunk_size))
+
+    if fmt == "parquet":
+        pa, pq = _import_pyarrow()
+        schema = _parquet_schema(pa)
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        for rows, probabilities in iter_chunks(start, end, after_id, chunk_size):
+            writer.write_table(_parquet_table(pa, schema, rows, probabilities))
+            yield sink.drain()
+            if progress:
+                progress(rows[-1][0])
+        writer.close()
+        yield sink.drain()
+        return
+
+    first = True
+    for rows, probabilities in iter_chunks(start, end, after_id, chunk_size):
+        if fmt == "csv":
+            yield _csv_chunk(rows, probabilities, header and first)
+        else:
+            yield _ndjson_chunk(rows, probabilities)
+        first = False
+        if progress:
+            progress(rows[-1][0])
+    if fmt == "csv" and header and first:
+        yield _csv_chunk([], np.empty((0, len(DISEASE_CLASSES)), dtype=np.float32), True)
+
+# ============================================
+# COMMAND LINE
+# ============================================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export the prediction history")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--output", default="-", help="Output file (default: stdout)")
+    parser.add_argument("--start", help="Only predictions at or after this time (ISO 8601, UTC)")
+    parser.add_argument("--end", help="Only predictions before this time (ISO 8601, UTC)")
+    parser.add_argument("--after-id", type=int, default=0, help="Resume after this prediction id")
+    parser.add_argument("--append", action="store_true",
+                        help="Append to --output without a CSV header (to resume CSV/NDJSON exports)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        start = parse_timestamp(args.start) if args.start else None
+        end = parse_timestamp(args.end) if args.end else None
+        check_format(args.format)
+    except (ValueError, RuntimeError) as e:
+        logger.error(str(e))
+        return 2
+    if args.append and (args.format == "parquet" or args.output == "-"):
+        logger.error("--append needs a CSV or NDJSON --output file")
+        return 2
+
+    exported = {"last_id": args.after_id}
+
+    def progress(last_id):
+        exported["last_id"] = last_id
+
+    if args.output == "-":
+        output = sys.stdout.buffer
+    else:
+        output = open(Path(args.output), "ab" if args.append else "wb")
+    try:
+        for data in stream_export(args.format, start, end, args.after_id, args.chunk_size,
+                                  header=not args.append, progress=progress):
+            output.write(data)
+    except (Exception, KeyboardInterrupt) as e:
+        resume = f"--after-id {exported['last_id']}"
+        if args.format == "parquet":
+            resume += " and a new --output file"
+        else:
+            resume += " --append"
+        logger.error(f"Export interrupted ({e!r}); resume with {resume}")
+        return 1
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    logger.info(f"Export complete; last id {exported['last_id']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,109 +1,496 @@
 """
 Grad-CAM (Gradient-weighted Class Activation Mapping)
 Explainable AI visualization for CNN predictions
+
+Explanation modes:
+    gradcam - gradients of the class score (Keras models only)
+    cam     - classic CAM from the last feature maps and the dense weights;
+              no gradients, so it also works for ONNX/TFLite models converted
+              with a feature output (see convert_model.py)
+    none    - no heatmap
+    auto    - cheapest valid mode for the model (cam, then gradcam)
 """
 
 import numpy as np
 import cv2
 import logging
+import threading
+import weakref
 from pathlib import Path
-from config import MODEL_INPUT_SIZE
+from config import MODEL_INPUT_SIZE, EXPLANATION_MODE
 
 logger = logging.getLogger(__name__)
 
 # Global model reference
 _model = None
 
-def generate_gradcam_heatmap(image_path: str, output_path: str, layer_name: str = None):
+def generate_gradcam_heatmap(image, output_path: str, layer_name: str = None,
+                             processed_image: np.ndarray = None, model=None, mode: str = None):
     """
     Generate Grad-CAM heatmap visualization
     Shows which regions of the image influenced the prediction
     
     Args:
-        image_path: Path to input image
+        image: Decoded RGB image array, or path to input image
         output_path: Path to save heatmap
         layer_name: Name of layer to visualize (uses last conv layer by default)
+        processed_image: Already preprocessed model input, to skip preprocessing again
+        model: Inference backend that served the prediction (defaults to the active model)
+        mode: "auto", "gradcam", "cam" or "none" (defaults to EXPLANATION_MODE)
     """
-    try:
-        # Try TensorFlow implementation first
-        try:
-            import tensorflow as tf
-            from model_loader import model
-            
-            if model is None:
-                logger.warning("Model not loaded, using mock heatmap")
-                _generate_mock_heatmap(image_path, output_path)
-                return
-            
-            _generate_tensorflow_gradcam(image_path, output_path, model, layer_name)
-            logger.info(f"Grad-CAM heatmap saved to {output_path}")
-        
-        except ImportError:
-            logger.info("TensorFlow not available, using mock heatmap")
-            _generate_mock_heatmap(image_path, output_path)
+    generate_gradcam_heatmaps(
+        [image], [output_path], layer_name,
+        processed_image[:1] if processed_image is not None else None, model, mode
+    )
+
+def generate_gradcam_heatmaps(images, output_paths, layer_name: str = None,
+                              processed_images: np.ndarray = None, model=None, mode: str = None):
+    """
+    Generate Grad-CAM heatmaps for several images in one batched pass
     
+    Args:
+        images: Decoded RGB image arrays, or paths to input images
+        output_paths: Path to save each heatmap
+        layer_name: Name of layer to visualize (uses last conv layer by default)
+        processed_images: Already preprocessed batch (N, H, W, 3), to skip preprocessing again
+        model: Inference backend that served the predictions (defaults to the active model)
+        mode: "auto", "gradcam", "cam" or "none" (defaults to EXPLANATION_MODE)
+    """
+    originals = [_load_original(image) for image in images]
+    if model is None:
+        from model_loader import model
+    
+    mode = explanation_mode(model, mode)
+    if mode == "none":
+        logger.info("No explanation for this model, skipping heatmap")
+        return
+    
+    if model is None:
+        logger.warning("Model not loaded, using mock heatmap")
+        _generate_mock_heatmaps(originals, output_paths)
+        return
+    
+    # Errors propagate: a real prediction never gets a simulated explanation
+    try:
+        if mode == "cam":
+            _generate_cam(originals, output_paths, model, processed_images)
+            logger.info(f"CAM heatmaps saved for {len(output_paths)} image(s)")
+            return
+        
+        _generate_tensorflow_gradcam(originals, output_paths, model.keras_model, layer_name, processed_images)
+        logger.info(f"Grad-CAM heatmaps saved for {len(output_paths)} image(s)")
     except Exception as e:
         logger.error(f"Error generating Grad-CAM heatmap: {e}")
-        # Fallback to mock heatmap
-        try:
-            _generate_mock_heatmap(image_path, output_path)
-        except Exception as e2:
-            logger.error(f"Error generating mock heatmap: {e2}")
-            raise
+        raise
 
-def _generate_tensorflow_gradcam(image_path: str, output_path: str, model, layer_name: str = None):
+def _load_original(image) -> np.ndarray:
     """
-    Generate Grad-CAM using TensorFlow/Keras
+    Return the RGB image array, reading it from disk only when given a path
     """
-    import tensorflow as tf
-    from model_loader import get_image_array, preprocess_image
-    
-    # Load and preprocess image
-    processed_image = preprocess_image(image_path)
-    original_image = get_image_array(image_path)
-    
-    # Get the last convolutional layer if not specified
-    if layer_name is None:
-        # Find last convolutional layer
-        for layer in reversed(model.layers):
-            if 'conv' in layer.name.lower():
-                layer_name = layer.name
-                break
-    
-    # Create model that outputs feature maps and predictions
-    grad_model = tf.keras.models.Model(
-        [model.inputs],
-        [model.get_layer(layer_name).output, model.output]
-    )
+    if isinstance(image, np.ndarray):
+        return image
+    
+    from model_loader import get_image_array
+    return get_image_array(str(image))
+
+# ============================================
+# GRAD-CAM ENGINE
+# ============================================
+
+class GradCamEngine:
+    """
+    Compiled Grad-CAM for one Keras model and layer
+    
+    The gradient model is built once, and the forward pass, gradient and
+    channel weighting run as one traced tf.function with a fixed input
+    signature, so repeated calls reuse the same graph for any batch size.
+    
+    Args:
+        keras_model: Loaded Keras model
+        layer_name: Convolutional layer to explain (last conv layer by default)
+    """
+    
+    def __init__(self, keras_model, layer_name: str = None):
+        import tensorflow as tf
+        
+        self.layer_name = layer_name or find_last_conv_layer(keras_model)
+        if self.layer_name is None:
+            raise ValueError("Model has no convolutional layer to explain")
+        
+        # Create model that outputs feature maps and predictions
+        self.grad_model = tf.keras.models.Model(
+            keras_model.inputs,
+            [keras_model.get_layer(self.layer_name).output, keras_model.output]
+        )
+        
+        self._step = tf.function(
+            self._explain_step,
+            input_signature=[
+                tf.TensorSpec([None, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3], tf.float32),
+                tf.TensorSpec([None], tf.int32)
+            ]
+        )
+    
+    def _explain_step(self, images, class_indices):
+        import tensorflow as tf
+        
+        with tf.GradientTape() as tape:
+            conv_outputs, predictions = self.grad_model(images, training=False)
+            # A negative class index means "explain the predicted class"
+            predicted = tf.argmax(predictions, axis=1, output_type=tf.int32)
+            classes = tf.where(class_indices < 0, predicted, class_indices)
+            scores = tf.gather(predictions, classes, axis=1, batch_dims=1)
+        
+        # Each image's score depends only on its own activations, so one
+        # gradient of the batch sum gives every image's gradients
+        grads = tape.gradient(scores, conv_outputs)
+        
+        # Average pooling of gradients per image, then weight the feature maps
+        weights = tf.reduce_mean(grads, axis=(1, 2))
+        heatmaps = tf.nn.relu(tf.einsum("nhwc,nc->nhw", conv_outputs, weights))
+        
+        # Normalize each heatmap to [0, 1]
+        heatmaps = heatmaps / (tf.reduce_max(heatmaps, axis=(1, 2), keepdims=True) + 1e-8)
+        return predictions, heatmaps
+    
+    def explain(self, images: np.ndarray, class_indices=None):
+        """
+        Run the model and Grad-CAM on a batch
+        
+        Args:
+            images: Preprocessed batch (N, H, W, 3)
+            class_indices: Class to explain per image (predicted class by default)
+        
+        Returns:
+            Tuple of (class probabilities (N, classes), heatmaps (N, h, w) in [0, 1])
+        """
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        if class_indices is None:
+            class_indices = np.full(len(images), -1, dtype=np.int32)
+        predictions, heatmaps = self._step(images, np.asarray(class_indices, dtype=np.int32))
+        return predictions.numpy(), heatmaps.numpy()
+
+def find_last_conv_layer(keras_model):
+    """Name of the last layer whose name contains "conv", or None"""
+    for layer in reversed(keras_model.layers):
+        if 'conv' in layer.name.lower():
+            return layer.name
+    return None
+
+# Engines per loaded model and layer; entries go away with the model, so a
+# hot-swapped version gets a fresh engine
+_engines = weakref.WeakKeyDictionary()
+_engines_lock = threading.Lock()
+
+def get_gradcam_engine(keras_model, layer_name: str = None) -> GradCamEngine:
+    """Return the cached GradCamEngine for (model, layer), building it on first use"""
+    with _engines_lock:
+        per_model = _engines.setdefault(keras_model, {})
+        engine = per_model.get(layer_name)
+        if engine is None:
+            engine = per_model[layer_name] = GradCamEngine(keras_model, layer_name)
+        return engine
+
+# ============================================
+# CAM (GRADIENT-FREE)
+# ============================================
+
+# Layers that are the identity at inference time and may sit between
+# global average pooling and the classifier
+_PASSTHROUGH_LAYERS = ("Dropout", "SpatialDropout2D", "GaussianNoise", "Activation", "Softmax")
+
+def find_cam_layers(keras_model):
+    """
+    Find the GlobalAveragePooling2D -> Dense head that classic CAM needs
+    
+    Returns:
+        Tuple of (pooling layer, dense layer), or None if the model ends differently
+    """
+    layers = list(keras_model.layers)
+    index = len(layers) - 1
+    while index >= 0 and type(layers[index]).__name__ in _PASSTHROUGH_LAYERS:
+        index -= 1
+    if index < 1 or type(layers[index]).__name__ != "Dense":
+        return None
+    dense = layers[index]
+    
+    index -= 1
+    while index >= 0 and type(layers[index]).__name__ in _PASSTHROUGH_LAYERS:
+        index -= 1
+    if index < 0 or type(layers[index]).__name__ != "GlobalAveragePooling2D":
+        return None
+    return layers[index], dense
+
+class CamEngine:
+    """
+    Forward-only feature extractor for classic CAM on a Keras model
+    
+    Args:
+        keras_model: Loaded Keras model ending in GlobalAveragePooling2D -> Dense
+    """
+    
+    def __init__(self, keras_model):
+        import tensorflow as tf
+        
+        head = find_cam_layers(keras_model)
+        if head is None:
+            raise ValueError("Model does not end in global average pooling and a dense layer")
+        pooling, dense = head
+        
+        self.weights = np.asarray(dense.get_weights()[0], dtype=np.float32)
+        self.feature_model = tf.keras.models.Model(keras_model.inputs, [keras_model.output, pooling.input])
+        self._step = tf.function(
+            lambda images: self.feature_model(images, training=False),
+            input_signature=[tf.TensorSpec([None, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3], tf.float32)]
+        )
+    
+    def predict_with_features(self, images: np.ndarray):
+        probabilities, features = self._step(np.ascontiguousarray(images, dtype=np.float32))
+        return probabilities.numpy(), features.numpy()
+
+def get_cam_engine(keras_model) -> CamEngine:
+    """Return the cached CamEngine for a Keras model, building it on first use"""
+    with _engines_lock:
+        per_model = _engines.setdefault(keras_model, {})
+        engine = per_model.get(CamEngine)
+        if engine is None:
+            engine = per_model[CamEngine] = CamEngine(keras_model)
+        return engine
+
+def class_activation_maps(features: np.ndarray, weights: np.ndarray, class_indices) -> np.ndarray:
+    """
+    Classic CAM: weight each feature map by the dense weight of the class
+    
+    Args:
+        features: Feature maps (N, h, w, channels) feeding global average pooling
+        weights: Dense kernel (channels, classes)
+        class_indices: Class to explain per image
     
-    # Calculate gradients
-    with tf.GradientTape() as tape:
-        conv_outputs, predictions = grad_model(processed_image)
-        predicted_class = tf.argmax(predictions[0])
-        class_channel = predictions[:, predicted_class]
+    Returns:
+        Heatmaps (N, h, w) normalized to [0, 1]
+    """
+    class_weights = weights[:, np.asarray(class_indices)].T            # (N, channels)
+    heatmaps = np.einsum("nhwc,nc->nhw", features, class_weights)
+    heatmaps = np.maximum(heatmaps, 0)
+    return heatmaps / (heatmaps.max(axis=(1, 2), keepdims=True) + 1e-8)
+
+def supports_cam(model) -> bool:
+    """True if the backend can produce classic CAM without gradients"""
+    if model is None:
+        return False
+    if model.framework == "keras":
+        return find_cam_layers(model.keras_model) is not None
+    return model.cam_weights is not None
+
+def _predict_features(model, images: np.ndarray):
+    """Probabilities, last feature maps and dense weights from one forward pass"""
+    if model.framework == "keras":
+        engine = get_cam_engine(model.keras_model)
+        probabilities, features = engine.predict_with_features(images)
+        weights = engine.weights
+    else:
+        probabilities, features = model.predict_with_features(images)
+        weights = model.cam_weights
+    return np.asarray(probabilities), np.asarray(features, dtype=np.float32), weights
+
+def _predict_cam(model, images: np.ndarray, embeddings: bool = False):
+    """Probabilities and CAM heatmaps (and pooled embeddings) from one forward pass"""
+    probabilities, features, weights = _predict_features(model, images)
+    heatmaps = class_activation_maps(features, weights, probabilities.argmax(axis=1))
+    if embeddings:
+        return probabilities, heatmaps, pooled_embeddings(features)
+    return probabilities, heatmaps
+
+def pooled_embeddings(features: np.ndarray) -> np.ndarray:
+    """Global average pooling of feature maps (N, h, w, channels): the penultimate layer of a CAM model"""
+    return features.mean(axis=(1, 2))
+
+def predict_with_embeddings(model, images: np.ndarray):
+    """
+    Class probabilities and penultimate-layer embeddings from one forward pass
+    
+    Returns:
+        Tuple of (probabilities, embeddings (N, channels)); embeddings is None
+        when the backend does not expose its feature maps
+    """
+    if not supports_cam(model):
+        return model.predict(images), None
+    try:
+        probabilities, features, _ = _predict_features(model, images)
+        return probabilities, pooled_embeddings(features)
+    except Exception as e:
+        logger.warning(f"Feature pass failed, predicting without embeddings: {e}")
+        return model.predict(images), None
+
+# ============================================
+# MODE SELECTION
+# ============================================
+
+def explanation_mode(model, mode: str = None) -> str:
+    """
+    Resolve the explanation mode for a backend
     
-    # Get gradients of class with respect to feature maps
-    grads = tape.gradient(class_channel, conv_outputs)
+    Args:
+        model: Inference backend (None in mock mode)
+        mode: "auto", "gradcam", "cam" or "none" (defaults to EXPLANATION_MODE)
     
-    # Average pooling of gradients
-    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
+    Returns:
+        "cam", "gradcam" or "none"; "auto" prefers gradient-free CAM. Models
+        that support neither (ONNX/TFLite/PyTorch without a CAM sidecar)
+        resolve to "none": they get no heatmap rather than a placeholder.
+    """
+    mode = (mode or EXPLANATION_MODE).lower()
+    if mode == "none":
+        return "none"
+    if mode not in ("auto", "gradcam", "cam"):
+        raise ValueError(f"Unknown explanation mode: {mode}")
     
-    # Multiply each feature map by its gradient weight
-    conv_outputs = conv_outputs[0]
-    heatmap = conv_outputs @ pooled_grads[..., tf.newaxis]
-    heatmap = tf.squeeze(heatmap)
+    if model is None:
+        return "gradcam"   # Mock mode: simulated heatmaps
+    if mode != "gradcam" and supports_cam(model):
+        return "cam"
+    if model.framework == "keras":
+        if mode == "cam":
+            logger.warning("CAM not supported for this keras model, using Grad-CAM")
+        return "gradcam"
+    if mode != "auto":
+        logger.warning(f"{mode} not supported for this {model.framework} model, skipping heatmaps")
+    return "none"
+
+def can_explain(model, mode: str = None) -> bool:
+    """True if predict_with_explanation can return real heatmaps for this backend"""
+    return model is not None and explanation_mode(model, mode) != "none"
+
+def predict_with_explanation(model, images: np.ndarray, layer_name: str = None, mode: str = None,
+                             embeddings: bool = False):
+    """
+    Class probabilities and heatmaps from a single forward pass
     
-    # Normalize to [0, 1]
-    heatmap = tf.maximum(heatmap, 0) / tf.math.reduce_max(heatmap)
-    heatmap = heatmap.numpy()
+    Args:
+        model: Inference backend
+        images: Preprocessed batch (N, H, W, 3)
+        layer_name: Layer to explain with Grad-CAM (last conv layer by default)
+        mode: "auto", "gradcam", "cam" or "none" (defaults to EXPLANATION_MODE)
+        embeddings: Also return penultimate-layer embeddings
     
-    # Resize to original image size
-    heatmap = cv2.resize(heatmap, (original_image.shape[1], original_image.shape[0]))
+    Returns:
+        Tuple of (probabilities, heatmaps[, embeddings]); heatmaps is None when
+        the backend cannot be explained (or TensorFlow is unavailable), and
+        embeddings is None when the backend does not expose its feature maps
+    """
+    if not can_explain(model, mode):
+        if embeddings:
+            probabilities, vectors = predict_with_embeddings(model, images)
+            return probabilities, None, vectors
+        return model.predict(images), None
+    try:
+        if explanation_mode(model, mode) == "cam":
+            return _predict_cam(model, images, embeddings)
+        probabilities, heatmaps = get_gradcam_engine(model.keras_model, layer_name).explain(images)
+        return (probabilities, heatmaps, None) if embeddings else (probabilities, heatmaps)
+    except Exception as e:
+        logger.warning(f"Explanation pass failed, predicting without explanation: {e}")
+        return (model.predict(images), None, None) if embeddings else (model.predict(images), None)
+
+def render_heatmap(image, heatmap_grid: np.ndarray, output_path: str):
+    """
+    Overlay a precomputed heatmap grid on the original image and save it
     
-    # Create visualization
+    Args:
+        image: Decoded RGB image array, or path to input image
+        heatmap_grid: Low-resolution heatmap in [0, 1] (e.g. from predict_with_explanation)
+        output_path: Path to save heatmap
+    """
+    original_image = _load_original(image)
+    heatmap = cv2.resize(
+        np.asarray(heatmap_grid, dtype=np.float32), (original_image.shape[1], original_image.shape[0])
+    )
     _visualize_and_save(original_image, heatmap, output_path)
 
-def _visualize_and_save(original_image: np.ndarray, heatmap: np.ndarray, output_path: str):
+def save_heatmap(image, output_path: str, heatmap_grid: np.ndarray = None,
+                 processed_image: np.ndarray = None, model=None):
+    """
+    Save the heatmap for one scored image: render heatmap_grid when the
+    prediction pass already computed it, otherwise run Grad-CAM
+    """
+    if heatmap_grid is not None:
+        render_heatmap(image, heatmap_grid, output_path)
+    else:
+        generate_gradcam_heatmap(image, output_path, None, processed_image, model)
+
+def heatmap_grids(images, processed_images: np.ndarray = None, model=None,
+                  layer_name: str = None, mode: str = None):
+    """
+    Low-resolution heatmaps for several images, without rendering anything
+    
+    Args:
+        images: Decoded RGB image arrays, or paths to input images
+        processed_images: Already preprocessed batch (N, H, W, 3), to skip preprocessing again
+        model: Inference backend that served the predictions (defaults to the active model)
+        layer_name: Layer to explain with Grad-CAM (last conv layer by default)
+        mode: "auto", "gradcam", "cam" or "none" (defaults to EXPLANATION_MODE)
+    
+    Returns:
+        List of heatmap grids in [0, 1], or None when the model cannot be
+        explained (simulated grids only in mock mode)
+    """
+    from model_loader import preprocess_array
+    
+    if model is None:
+        from model_loader import model
+    if explanation_mode(model, mode) == "none":
+        return None
+    
+    if processed_images is None:
+        processed_images = np.concatenate([preprocess_array(_load_original(image)) for image in images])
+    
+    if model is None:
+        # Mock mode: simulated heatmaps
+        return [_mock_grid() for _ in range(len(processed_images))]
+    _, heatmaps = predict_with_explanation(model, processed_images, layer_name, mode)
+    return list(heatmaps) if heatmaps is not None else None
+
+def _mock_grid(size: int = 14) -> np.ndarray:
+    """Simulated low-resolution heatmap with the mock heatmap's hotspots"""
+    y, x = np.mgrid[:size, :size].astype(np.float32) / size - 0.5
+    heatmap = (
+        np.exp(-((x - 0.08) ** 2 + (y + 0.05) ** 2) / (2 * 0.1 ** 2))
+        + np.exp(-((x + 0.07) ** 2 + (y - 0.03) ** 2) / (2 * 0.08 ** 2))
+        + np.exp(-(x ** 2 + y ** 2) / (2 * 0.07 ** 2))
+    ) / 3
+    return heatmap / heatmap.max()
+
+def _generate_cam(original_images, output_paths, model, processed_images: np.ndarray = None):
+    """
+    Generate classic CAM heatmaps (forward pass only)
+    """
+    from model_loader import preprocess_array
+    
+    if processed_images is None:
+        processed_images = np.concatenate([preprocess_array(image) for image in original_images])
+    
+    _, heatmaps = _predict_cam(model, processed_images)
+    for original_image, heatmap, output_path in zip(original_images, heatmaps, output_paths):
+        render_heatmap(original_image, heatmap, output_path)
+
+def _generate_tensorflow_gradcam(original_images, output_paths, model,
+                                 layer_name: str = None, processed_images: np.ndarray = None):
+    """
+    Generate Grad-CAM using TensorFlow/Keras
+    """
+    from model_loader import preprocess_array
+    
+    # Preprocess images unless the caller already did
+    if processed_images is None:
+        processed_images = np.concatenate([preprocess_array(image) for image in original_images])
+    
+    _, heatmaps = get_gradcam_engine(model, layer_name).explain(processed_images)
+    
+    for original_image, heatmap, output_path in zip(original_images, heatmaps, output_paths):
+        render_heatmap(original_image, heatmap, output_path)
+
+def _visualize_and_save(original_image: np.ndarray, heatmap: np.ndarray, output_path: str,
+                        title: str = "Grad-CAM Heatmap - Disease Detection Explanation"):
     """
     Create and save heatmap visualization
     
@@ -111,6 +498,7 @@ def _visualize_and_save(original_image: np.ndarray, heatmap: np.ndarray, output_
         original_image: Original RGB image
         heatmap: Grad-CAM heatmap
         output_path: Path to save result
+        title: Caption drawn above the overlay
     """
     # Normalize heatmap to 0-255
     heatmap = (heatmap * 255).astype(np.uint8)
@@ -132,7 +520,7 @@ def _visualize_and_save(original_image: np.ndarray, heatmap: np.ndarray, output_
     # Add title text
     cv2.putText(
         canvas,
-        "Grad-CAM Heatmap - Disease Detection Explanation",
+        title,
         (10, 25),
         cv2.FONT_HERSHEY_SIMPLEX,
         0.6,
@@ -144,16 +532,18 @@ def _visualize_and_save(original_image: np.ndarray, heatmap: np.ndarray, output_
     cv2.imwrite(str(output_path), canvas)
     logger.info(f"Heatmap saved to {output_path}")
 
-def _generate_mock_heatmap(image_path: str, output_path: str):
+def _generate_mock_heatmaps(original_images, output_paths):
+    for original_image, output_path in zip(original_images, output_paths):
+        _generate_mock_heatmap(original_image, output_path)
+
+def _generate_mock_heatmap(original_image: np.ndarray, output_path: str):
     """
     Generate mock Grad-CAM heatmap for demonstration
     Creates a simulated heatmap showing affected regions
     """
     try:
-        # Read image
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError(f"Could not read image: {image_path}")
+        # Convert RGB back to BGR for OpenCV
+        image = cv2.cvtColor(original_image, cv2.COLOR_RGB2BGR)
         
         # Resize if needed
         if image.shape[0] > 600 or image.shape[1] > 600:
@@ -0,0 +1,171 @@
+"""
+Heatmap Jobs - Render heatmaps off the request path
+/api/predict answers with the diagnosis right away and hands back a job ID;
+the heatmap is rendered by a bounded worker pool and fetched by polling or
+Server-Sent Events.
+"""
+
+import asyncio
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+import metrics
+from workers import WorkerPoolFull
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+
+FINISHED_STATES = (DONE, FAILED, TIMEOUT)
+
+class HeatmapJobs:
+    """
+    Bounded queue of heatmap rendering jobs
+
+    Args:
+        pool: WorkerPool that renders heatmaps; its queue size bounds the backlog
+        timeout_seconds: Time from submission after which an unfinished job is
+                         reported as timed out (a render already running still
+                         completes and then marks the job done)
+        max_jobs: Number of job records kept for status lookups
+    """
+
+    def __init__(self, pool, timeout_seconds: float = 30.0, max_jobs: int = 1000):
+        self.pool = pool
+        self.timeout_seconds = float(timeout_seconds)
+        self.max_jobs = max(1, int(max_jobs))
+
+        self._jobs = OrderedDict()   # {job_id: job dict}
+        self._finished = {}          # {job_id: asyncio.Event}
+
+        self._backlog = metrics.gauge("heatmap_jobs.backlog")
+        self._latency = metrics.histogram("heatmap_jobs.latency_ms")
+        self._completed = metrics.counter("heatmap_jobs.completed")
+        self._failed = metrics.counter("heatmap_jobs.failed")
+        self._timeouts = metrics.counter("heatmap_jobs.timeouts")
+        self._rejected = metrics.counter("heatmap_jobs.rejected")
+
+    def submit(self, heatmap: str, fn, *args) -> dict:
+        """
+        Queue fn(*args) to render the heatmap at the relative path heatmap
+        Must be called from the event loop.
+
+        Returns:
+            Copy of the new job record
+
+        Raises:
+            WorkerPoolFull: If the backlog is full
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": QUEUED,
+            "heatmap": None,
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "elapsed_ms": None
+        }
+
+        try:
+            future = self.pool.submit(self._run, job, fn, args)
+        except WorkerPoolFull:
+            self._rejected.inc()
+            raise
+
+        self._jobs[job_id] = job
+        self._finished[job_id] = asyncio.Event()
+        self._backlog.inc()
+        self._prune()
+        asyncio.ensure_future(self._watch(job, heatmap, future, time.perf_counter()))
+        return dict(job)
+
+    def get(self, job_id: str):
+        """Return a copy of a job record, or None if unknown or expired"""
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def wait(self, job_id: str, timeout: float = None):
+        """
+        Wait until a job finishes or timeout elapses
+
+        Returns:
+            Copy of the job record, or None if unknown
+        """
+        event = self._finished.get(job_id)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.get(job_id)
+
+    @staticmethod
+    def _run(job: dict, fn, args):
+        # Runs in a worker thread
+        job["status"] = RUNNING
+        fn(*args)
+
+    async def _watch(self, job: dict, heatmap: str, future, submitted: float):
+        wrapped = asyncio.wrap_future(future)
+        late = False
+        try:
+            await asyncio.wait_for(asyncio.shield(wrapped), self.timeout_seconds)
+            self._finish(job, DONE, submitted, heatmap)
+            self._completed.inc()
+        except asyncio.TimeoutError:
+            # A job still queued is cancelled, which frees its pool slot; one
+            # already rendering cannot be stopped and may finish later
+            late = not future.cancel()
+            job["error"] = f"Heatmap not ready within {self.timeout_seconds:g}s"
+            self._finish(job, TIMEOUT, submitted)
+            self._timeouts.inc()
+            logger.warning(f"Heatmap job {job['id']} timed out")
+        except Exception as e:
+            job["error"] = str(e)
+            self._finish(job, FAILED, submitted)
+            self._failed.inc()
+            logger.warning(f"Heatmap job {job['id']} failed: {e}")
+        finally:
+            self._latency.observe((time.perf_counter() - submitted) * 1000)
+            self._backlog.dec()
+
+        if late:
+            try:
+                await wrapped
+            except Exception:
+                return
+            # The heatmap exists after all: report it so status and storage agree
+            job["error"] = None
+            job["heatmap"] = heatmap
+            job["status"] = DONE
+            self._completed.inc()
+            logger.info(f"Heatmap job {job['id']} finished after its timeout")
+
+    def _finish(self, job: dict, status: str, submitted: float, heatmap: str = None):
+        """Record a job's outcome and wake its waiters"""
+        job["heatmap"] = heatmap
+        job["status"] = status
+        job["finished_at"] = datetime.now().isoformat()
+        job["elapsed_ms"] = round((time.perf_counter() - submitted) * 1000, 3)
+        event = self._finished.get(job["id"])
+        if event is not None:
+            event.set()
+
+    def _prune(self):
+        """Drop the oldest finished job records beyond max_jobs"""
+        excess = len(self._jobs) - self.max_jobs
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]["status"] in FINISHED_STATES:
+                del self._jobs[job_id]
+                self._finished.pop(job_id, None)
+                excess -= 1
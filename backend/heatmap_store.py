@@ -0,0 +1,233 @@
+"""
+Heatmap Store - Compact heatmaps rendered on request
+Each prediction keeps its raw heatmap as a small uint8 grid plus a JPEG
+preview of the leaf in the database, instead of a full-size PNG overlay on
+disk. /api/heatmap/{id} renders the overlay at the size and format the client
+asks for, and recently rendered images are kept in an in-memory LRU.
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+
+import metrics
+from config import HEATMAP_GRID_SIZE, HEATMAP_PREVIEW_SIZE, HEATMAP_RENDER_CACHE_SIZE
+from database import save_heatmap_record, get_heatmap_record, heatmap_exists, prune_heatmaps
+
+logger = logging.getLogger(__name__)
+
+# Output formats: media type and OpenCV encoder parameters
+FORMATS = {
+    "webp": ("image/webp", ".webp", [cv2.IMWRITE_WEBP_QUALITY, 85]),
+    "jpeg": ("image/jpeg", ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 85]),
+    "png": ("image/png", ".png", [cv2.IMWRITE_PNG_COMPRESSION, 3]),
+}
+
+MIN_RENDER_SIZE = 16
+
+def heatmap_url(heatmap_id: str) -> str:
+    """Relative URL that renders a stored heatmap"""
+    return f"api/heatmap/{heatmap_id}"
+
+def compact_grid(heatmap: np.ndarray, max_side: int = HEATMAP_GRID_SIZE) -> np.ndarray:
+    """
+    Quantize a heatmap in [0, 1] to uint8, shrinking it to at most max_side per side
+    """
+    heatmap = np.asarray(heatmap, dtype=np.float32)
+    rows, cols = heatmap.shape[:2]
+    if max(rows, cols) > max_side:
+        scale = max_side / float(max(rows, cols))
+        size = (max(1, round(cols * scale)), max(1, round(rows * scale)))
+        heatmap = cv2.resize(heatmap, size, interpolation=cv2.INTER_AREA)
+    return np.clip(np.rint(heatmap * 255), 0, 255).astype(np.uint8)
+
+def encode_preview(image: np.ndarray, max_side: int = HEATMAP_PREVIEW_SIZE) -> bytes:
+    """JPEG of an RGB image with its long side at most max_side"""
+    height, width = image.shape[:2]
+    if max(height, width) > max_side:
+        scale = max_side / float(max(height, width))
+        image = cv2.resize(
+            image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+        )
+    bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    return cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+def negotiate_format(requested: str = None, accept: str = None) -> str:
+    """
+    Pick the output format: the requested one, else WebP if the client accepts
+    it, else JPEG
+
+    Raises:
+        ValueError: If requested is not a supported format
+    """
+    if requested:
+        requested = requested.lower()
+        requested = "jpeg" if requested == "jpg" else requested
+        if requested not in FORMATS:
+            raise ValueError(f"Unsupported format: {requested}. Use one of: {', '.join(FORMATS)}")
+        return requested
+    if accept and "image/webp" in accept:
+        return "webp"
+    return "jpeg"
+
+def render_overlay(preview: bytes, grid: np.ndarray, size: int = None, fmt: str = "webp") -> bytes:
+    """
+    Overlay a heatmap grid on a stored preview
+
+    Args:
+        preview: Encoded preview image
+        grid: uint8 heatmap grid
+        size: Long side of the output in pixels (default and maximum: the preview size)
+        fmt: Key of FORMATS
+
+    Returns:
+        Encoded image bytes
+    """
+    image = cv2.imdecode(np.frombuffer(preview, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Stored heatmap preview is unreadable")
+
+    height, width = image.shape[:2]
+    if size and size < max(height, width):
+        scale = max(size, MIN_RENDER_SIZE) / float(max(height, width))
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+    heatmap = cv2.resize(grid, (width, height), interpolation=cv2.INTER_LINEAR)
+    heatmap_colored = cv2.applyColorMap(heatmap, cv2.COLORMAP_JET)
+    overlay = cv2.addWeighted(image, 0.6, heatmap_colored, 0.4, 0)
+
+    _, extension, params = FORMATS[fmt]
+    return cv2.imencode(extension, overlay, params)[1].tobytes()
+
+class HeatmapStore:
+    """
+    Stores compact heatmaps and renders them with an LRU of encoded images
+
+    Args:
+        cache_size: Number of rendered images kept in memory (0 disables the cache)
+    """
+
+    def __init__(self, cache_size: int = HEATMAP_RENDER_CACHE_SIZE):
+        self.cache_size = max(0, int(cache_size))
+        self._rendered = OrderedDict()   # {(id, size, format): bytes}
+        self._lock = threading.Lock()
+
+        self._stored = metrics.counter("heatmap_store.stored")
+        self._stored_bytes = metrics.counter("heatmap_store.stored_bytes")
+        self._hits = metrics.counter("heatmap_store.render_hits")
+        self._misses = metrics.counter("heatmap_store.render_misses")
+        self._render_ms = metrics.histogram("heatmap_store.render_ms")
+
+    def save(self, heatmap_id: str, image: np.ndarray, heatmap_grid: np.ndarray):
+        """
+        Store a heatmap grid and a preview of the image it explains
+
+        Args:
+            heatmap_id: ID to store it under (see heatmap_url)
+            image: Decoded RGB image
+            heatmap_grid: Heatmap in [0, 1] at any resolution
+        """
+        grid = compact_grid(heatmap_grid)
+        preview = encode_preview(image)
+        save_heatmap_record(heatmap_id, grid.tobytes(), grid.shape[0], grid.shape[1], preview)
+        self._stored.inc()
+        self._stored_bytes.inc(grid.nbytes + len(preview))
+
+    def save_many(self, heatmap_ids, images, heatmap_grids, processed_images: np.ndarray = None, model=None):
+        """
+        Store heatmaps for several images, computing the missing grids in one
+        batched explanation pass
+
+        Args:
+            heatmap_ids: ID per image
+            images: Decoded RGB images
+            heatmap_grids: Grid per image from the prediction pass, or None where missing
+            processed_images: Preprocessed batch (N, H, W, 3), used for missing grids
+            model: Inference backend that served the predictions
+
+        Raises:
+            ValueError: If grids are missing and the model cannot be explained
+        """
+        from gradcam import heatmap_grids as compute_grids
+
+        heatmap_grids = list(heatmap_grids)
+        missing = [i for i, grid in enumerate(heatmap_grids) if grid is None]
+        if missing:
+            computed = compute_grids(
+                [images[i] for i in missing],
+                processed_images[missing] if processed_images is not None else None,
+                model
+            )
+            if computed is None:
+                raise ValueError("Model cannot explain these images, no heatmap stored")
+            for i, grid in zip(missing, computed):
+                heatmap_grids[i] = grid
+
+        for heatmap_id, image, grid in zip(heatmap_ids, images, heatmap_grids):
+            self.save(heatmap_id, image, grid)
+
+    def store(self, heatmap_id: str, image: np.ndarray, heatmap_grid: np.ndarray = None,
+              processed_image: np.ndarray = None, model=None):
+        """Store the heatmap for one scored image (runs an explanation pass if heatmap_grid is None)"""
+        self.save_many([heatmap_id], [image], [heatmap_grid], processed_image, model)
+
+    def exists(self, heatmap_id: str) -> bool:
+        return heatmap_exists(heatmap_id)
+
+    def render(self, heatmap_id: str, size: int = None, fmt: str = "webp"):
+        """
+        Render a stored heatmap
+
+        Returns:
+            Encoded image bytes, or None if the heatmap is unknown
+        """
+        key = (heatmap_id, size, fmt)
+        with self._lock:
+            data = self._rendered.get(key)
+            if data is not None:
+                self._rendered.move_to_end(key)
+        if data is not None:
+            self._hits.inc()
+            return data
+
+        self._misses.inc()
+        record = get_heatmap_record(heatmap_id)
+        if record is None:
+            return None
+
+        started = time.perf_counter()
+        grid = np.frombuffer(record["grid"], dtype=np.uint8).reshape(record["grid_rows"], record["grid_cols"])
+        data = render_overlay(record["preview"], grid, size, fmt)
+        self._render_ms.observe((time.perf_counter() - started) * 1000)
+
+        if self.cache_size:
+            with self._lock:
+                self._rendered[key] = data
+                while len(self._rendered) > self.cache_size:
+                    self._rendered.popitem(last=False)
+        return data
+
+    def prune(self, max_age_days: float = 0, max_rows: int = 0, max_bytes: int = 0):
+        """
+        Delete stored heatmaps beyond the quotas (see database.prune_heatmaps)
+        and drop their rendered images
+
+        Returns:
+            Tuple of (heatmaps removed, bytes reclaimed, heatmaps kept, bytes kept)
+        """
+        removed, reclaimed, kept, kept_bytes = prune_heatmaps(max_age_days, max_rows, max_bytes)
+        if removed:
+            self.forget(removed)
+        return len(removed), reclaimed, kept, kept_bytes
+
+    def forget(self, heatmap_ids):
+        """Drop rendered images of the given heatmaps from the LRU"""
+        heatmap_ids = set(heatmap_ids)
+        with self._lock:
+            for key in [key for key in self._rendered if key[0] in heatmap_ids]:
+                del self._rendered[key]
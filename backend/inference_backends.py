@@ -0,0 +1,320 @@
+"""
+Inference Backends - Pluggable runtimes for the disease classifier
+Keras (.h5/.keras), PyTorch (.pt), ONNX Runtime (.onnx) and TFLite (.tflite)
+
+Every backend takes a preprocessed float32 batch of shape (N, H, W, 3) and
+returns class probabilities of shape (N, num_classes). Framework imports
+happen only when a backend of that type is loaded.
+"""
+
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class InferenceBackend:
+    """Base class for model runtimes"""
+
+    framework = "base"
+
+    # Dense-layer weights (channels, classes) for gradient-free CAM; set when the
+    # model exposes its last feature maps and has a CAM sidecar file
+    cam_weights = None
+
+    def __init__(self, model_path: Path):
+        self.model_path = Path(model_path)
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict_with_features(self, images: np.ndarray):
+        """
+        Class probabilities and the feature maps feeding global average pooling
+
+        Returns:
+            Tuple of (probabilities (N, classes), features (N, h, w, channels))
+        """
+        raise NotImplementedError(f"{self.framework} backend does not expose feature maps")
+
+def cam_sidecar_path(model_path: Path) -> Path:
+    """CAM sidecar written next to a converted model ("<model file>.cam.npz")"""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.name + ".cam.npz")
+
+def load_cam_weights(model_path: Path):
+    """Dense weights (channels, classes) from the model's CAM sidecar, or None"""
+    sidecar = cam_sidecar_path(model_path)
+    if not sidecar.exists():
+        return None
+    try:
+        with np.load(sidecar) as data:
+            return np.asarray(data["weights"], dtype=np.float32)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable CAM sidecar {sidecar}: {e}")
+        return None
+
+class KerasBackend(InferenceBackend):
+    """TensorFlow/Keras model (supports Grad-CAM)"""
+
+    framework = "keras"
+
+    def __init__(self, model_path: Path):
+        super().__init__(model_path)
+        import tensorflow as tf
+        self.keras_model = tf.keras.models.load_model(str(self.model_path))
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        # Calling the model directly avoids model.predict's per-call setup cost
+        return np.asarray(self.keras_model(images, training=False))
+
+class TorchBackend(InferenceBackend):
+    """Pickled PyTorch model"""
+
+    framework = "torch"
+
+    def __init__(self, model_path: Path):
+        super().__init__(model_path)
+        import torch
+        self.torch_model = torch.load(str(self.model_path))
+        self.torch_model.eval()
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        import torch
+        image_tensor = torch.from_numpy(images).to(next(self.torch_model.parameters()).device)
+        with torch.no_grad():
+            output = self.torch_model(image_tensor)
+        return torch.softmax(output, dim=1).cpu().numpy()
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime CPU session (float or INT8-quantized models)"""
+
+    framework = "onnx"
+
+    def __init__(self, model_path: Path, num_threads: int = 0):
+        super().__init__(model_path)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(
+            str(self.model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+        # Models converted with CAM support have a second, rank-4 feature output
+        outputs = self.session.get_outputs()
+        probabilities = [o for o in outputs if len(o.shape) == 2]
+        features = [o for o in outputs if len(o.shape) == 4]
+        self.output_name = (probabilities or outputs)[0].name
+        self.feature_name = features[0].name if features else None
+        if self.feature_name:
+            self.cam_weights = load_cam_weights(self.model_path)
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        return self.session.run([self.output_name], {self.input_name: images})[0]
+
+    def predict_with_features(self, images: np.ndarray):
+        if self.feature_name is None:
+            return super().predict_with_features(images)
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        probabilities, features = self.session.run(
+            [self.output_name, self.feature_name], {self.input_name: images}
+        )
+        return probabilities, features
+
+class _SizedInterpreter:
+    """TFLite interpreter with its tensors allocated for one batch size"""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.input_detail = interpreter.get_input_details()[0]
+        outputs = interpreter.get_output_details()
+
+        # Models converted with CAM support have a second, rank-4 feature output
+        probabilities = [d for d in outputs if len(d["shape"]) == 2]
+        features = [d for d in outputs if len(d["shape"]) == 4]
+        self.output_detail = (probabilities or outputs)[0]
+        self.feature_detail = features[0] if features else None
+        self.batch_size = int(self.input_detail["shape"][0])
+
+        # The interpreter is not thread-safe
+        self.lock = threading.Lock()
+
+    def run(self, images: np.ndarray, features: bool = False):
+        """Probabilities (and feature maps) for a batch of exactly batch_size images"""
+        with self.lock:
+            self.interpreter.set_tensor(self.input_detail["index"], _quantize(images, self.input_detail))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output_detail["index"])
+            feature_maps = self.interpreter.get_tensor(self.feature_detail["index"]) if features else None
+        output = _dequantize(output, self.output_detail)
+        return (output, _dequantize(feature_maps, self.feature_detail)) if features else output
+
+class TFLiteBackend(InferenceBackend):
+    """
+    TFLite interpreter (float or INT8-quantized models)
+
+    Resizing an interpreter's input reallocates all of its tensors, which is
+    too slow to do whenever the micro-batch size changes. Instead one
+    interpreter is kept per batch size (the max_interpreters most recently
+    used), allocated on first use; warm-up creates the common sizes.
+    """
+
+    framework = "tflite"
+
+    max_interpreters = 16
+
+    def __init__(self, model_path: Path, num_threads: int = 0):
+        super().__init__(model_path)
+        self._interpreter_class = _import_tflite_interpreter()
+        self._num_threads = num_threads
+        self._interpreters = OrderedDict()   # {batch size: _SizedInterpreter}
+        self._lock = threading.Lock()
+
+        first = self._create()
+        self._interpreters[first.batch_size] = first
+        self.feature_detail = first.feature_detail
+        if self.feature_detail is not None:
+            self.cam_weights = load_cam_weights(self.model_path)
+
+    def _create(self, batch_size: int = None) -> _SizedInterpreter:
+        """New interpreter allocated for batch_size (the model's own input shape if None)"""
+        kwargs = {"num_threads": self._num_threads} if self._num_threads else {}
+        interpreter = self._interpreter_class(model_path=str(self.model_path), **kwargs)
+        if batch_size is not None:
+            detail = interpreter.get_input_details()[0]
+            shape = list(detail["shape"])
+            if shape[0] != batch_size:
+                shape[0] = batch_size
+                interpreter.resize_tensor_input(detail["index"], shape)
+        interpreter.allocate_tensors()
+        return _SizedInterpreter(interpreter)
+
+    def _interpreter(self, batch_size: int) -> _SizedInterpreter:
+        with self._lock:
+            sized = self._interpreters.get(batch_size)
+            if sized is not None:
+                self._interpreters.move_to_end(batch_size)
+                return sized
+
+        # Allocate outside the lock so other batch sizes keep running
+        sized = self._create(batch_size)
+        logger.info(f"TFLite interpreter allocated for batch size {batch_size}")
+        with self._lock:
+            sized = self._interpreters.setdefault(batch_size, sized)
+            self._interpreters.move_to_end(batch_size)
+            while len(self._interpreters) > self.max_interpreters:
+                self._interpreters.popitem(last=False)
+        return sized
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        return self._interpreter(images.shape[0]).run(images)
+
+    def predict_with_features(self, images: np.ndarray):
+        if self.feature_detail is None:
+            return super().predict_with_features(images)
+        return self._interpreter(images.shape[0]).run(images, features=True)
+
+def _import_tflite_interpreter():
+    """Prefer the standalone TFLite runtime so serving does not import TensorFlow"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+def _quantize(images: np.ndarray, detail: dict) -> np.ndarray:
+    """Convert float input to the interpreter's input dtype"""
+    dtype = detail["dtype"]
+    if dtype == np.float32:
+        return np.ascontiguousarray(images, dtype=np.float32)
+    scale, zero_point = detail["quantization"]
+    info = np.iinfo(dtype)
+    quantized = np.round(images / scale + zero_point)
+    return np.clip(quantized, info.min, info.max).astype(dtype)
+
+def _dequantize(output: np.ndarray, detail: dict) -> np.ndarray:
+    """Convert quantized output back to float probabilities"""
+    if output.dtype == np.float32:
+        return output
+    scale, zero_point = detail["quantization"]
+    return (output.astype(np.float32) - zero_point) * scale
+
+# ============================================
+# BACKEND SELECTION
+# ============================================
+
+BACKENDS = {
+    ".onnx": OnnxBackend,
+    ".tflite": TFLiteBackend,
+    ".h5": KerasBackend,
+    ".keras": KerasBackend,
+    ".pt": TorchBackend,
+}
+
+# Preference order for MODEL_BACKEND="auto": lightweight CPU runtimes first
+AUTO_ORDER = [".onnx", ".tflite", ".h5", ".keras", ".pt"]
+
+BACKEND_EXTENSIONS = {
+    "onnx": [".onnx"],
+    "tflite": [".tflite"],
+    "keras": [".h5", ".keras"],
+    "torch": [".pt"],
+}
+
+def find_model_file(model_dir: Path, backend: str = "auto"):
+    """
+    Find the model file to serve
+
+    Args:
+        model_dir: Directory containing model files
+        backend: "auto", "onnx", "tflite", "keras" or "torch"
+
+    Returns:
+        Path to the model file, or None if no matching file exists
+    """
+    if backend == "auto":
+        extensions = AUTO_ORDER
+    elif backend in BACKEND_EXTENSIONS:
+        extensions = BACKEND_EXTENSIONS[backend]
+    else:
+        raise ValueError(f"Unknown model backend: {backend}")
+
+    for extension in extensions:
+        files = sorted(Path(model_dir).glob(f"*{extension}"))
+        if files:
+            return files[0]
+    return None
+
+def load_backend(model_path: Path, num_threads: int = 0) -> InferenceBackend:
+    """
+    Load a model file with the backend matching its extension
+
+    Args:
+        model_path: Path to .h5, .keras, .pt, .onnx or .tflite file
+        num_threads: Intra-op threads for ONNX Runtime/TFLite (0 = runtime default)
+    """
+    model_path = Path(model_path)
+    backend_class = BACKENDS.get(model_path.suffix.lower())
+    if backend_class is None:
+        raise ValueError(f"Unsupported model format: {model_path.suffix}")
+
+    logger.info(f"Loading {backend_class.framework} model from {model_path}")
+    if backend_class in (OnnxBackend, TFLiteBackend):
+        return backend_class(model_path, num_threads)
+    return backend_class(model_path)
@@ -3,12 +3,17 @@ Smart Maize Leaf Disease Detection System
 FastAPI Backend - Main Application
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request, Query
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import io
+import json
+import asyncio
 import logging
+import uuid
+import zipfile
 from datetime import datetime
 from pathlib import Path
 import sys
@@ -16,15 +21,48 @@ import random
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import List, Optional
 from pydantic import BaseModel
+import numpy as np
 
 # Add backend directory to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from model_loader import load_model, predict_disease
-from gradcam import generate_gradcam_heatmap
-from database import init_db, save_prediction, get_recommendations
-from config import UPLOAD_FOLDER, HEATMAP_FOLDER, MODEL_PATH
+from model_loader import (
+    load_model, start_background_load, get_model_status, is_model_ready, is_model_loading,
+    decode_and_preprocess, predict_routed, route_model, serving_version, get_model_version,
+    registry
+)
+from model_registry import DEFAULT_MODEL
+from gradcam import generate_gradcam_heatmaps, render_heatmap, save_heatmap, can_explain, explanation_mode
+from database import (
+    init_db, close_pool, save_prediction, save_predictions, describe_prediction, get_recommendations,
+    get_statistics, get_prediction_history, estimate_prediction_count, parse_timestamp, encode_cursor, decode_cursor,
+    pack_probabilities, pack_embedding
+)
+from batching import MicroBatcher
+from workers import WorkerPool, WorkerPoolFull
+from prediction_cache import PredictionCache
+from tiling import score_tiled, ImageTooLarge
+from heatmap_jobs import HeatmapJobs
+from heatmap_store import HeatmapStore, FORMATS, heatmap_url, negotiate_format
+from storage import Janitor, Quota, UploadStore, sharded_path, relative_url
+from write_behind import WriteBehindBuffer
+import export
+import metrics
+from config import (
+    PROJECT_ROOT, UPLOAD_FOLDER, HEATMAP_FOLDER, MODEL_PATH, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+    WORKER_POOL_KIND, WORKER_POOL_SIZE, WORKER_QUEUE_SIZE, IO_POOL_SIZE, INFERENCE_THREADS,
+    ALLOWED_EXTENSIONS, MAX_FILE_SIZE, BULK_MAX_IMAGES, SAVE_UPLOADS,
+    PREDICTION_CACHE_SIZE, PREDICTION_CACHE_PERSIST, PREDICTION_CACHE_PATH,
+    PREDICTION_CACHE_DISK_MAX_ENTRIES, TILE_OVERLAP, TILE_MAX_PIXELS, TILE_MAX_FILE_SIZE,
+    HEATMAP_DEFERRED, HEATMAP_WORKERS, HEATMAP_QUEUE_SIZE, HEATMAP_JOB_TIMEOUT,
+    HEATMAP_STORAGE, HEATMAP_RENDER_CACHE_SIZE, HEATMAP_RENDER_WORKERS, HEATMAP_RENDER_QUEUE_SIZE,
+    JANITOR_INTERVAL, UPLOAD_MAX_AGE_DAYS, UPLOAD_MAX_FILES, UPLOAD_MAX_BYTES,
+    HEATMAP_MAX_AGE_DAYS, HEATMAP_MAX_FILES, HEATMAP_MAX_BYTES,
+    WRITE_BEHIND, WRITE_BEHIND_MAX_ROWS, WRITE_BEHIND_MAX_WAIT_MS, WRITE_BEHIND_QUEUE_SIZE,
+    EXPORT_CHUNK_SIZE
+)
 
 # Logging configuration
 logging.basicConfig(
@@ -46,6 +84,24 @@ class OTPVerifyRequest(BaseModel):
     email: str
     otp: str
 
+class ModelLoadRequest(BaseModel):
+    """Load a model version into the registry"""
+    file: str
+    name: str = DEFAULT_MODEL
+    version: Optional[str] = None
+    activate: bool = False
+
+class ModelRouteRequest(BaseModel):
+    """Activate a version, or send a percentage of traffic to it"""
+    version: str
+    name: str = DEFAULT_MODEL
+    percent: float = 0.0
+
+class ModelShadowRequest(BaseModel):
+    """Set (or clear, with version=null) the shadow version"""
+    version: Optional[str] = None
+    name: str = DEFAULT_MODEL
+
 # ============================================
 # OTP Storage (In-memory for demo - use Redis in production)
 # ============================================
@@ -79,6 +135,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Micro-batching scheduler in front of the model
+# Items are (preprocessed image, ModelHandle) pairs so canary routing is per request
+inference_batcher = MicroBatcher(predict_routed, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
+# Worker pools keep CPU-bound stages and blocking I/O off the event loop
+cpu_pool = WorkerPool(
+    "cpu", WORKER_POOL_KIND, WORKER_POOL_SIZE, WORKER_QUEUE_SIZE,
+    initializer=load_model if WORKER_POOL_KIND == "process" else None
+)
+io_pool = WorkerPool("io", "thread", IO_POOL_SIZE, WORKER_QUEUE_SIZE)
+
+# Deferred heatmap rendering, off the /api/predict response path
+heatmap_pool = WorkerPool("heatmap", "thread", HEATMAP_WORKERS, HEATMAP_QUEUE_SIZE)
+heatmap_jobs = HeatmapJobs(heatmap_pool, HEATMAP_JOB_TIMEOUT)
+
+# /api/heatmap/{id} renders, kept apart so they never wait behind Grad-CAM jobs
+render_pool = WorkerPool("heatmap_render", "thread", HEATMAP_RENDER_WORKERS, HEATMAP_RENDER_QUEUE_SIZE)
+
+# Compact heatmap grids, rendered by /api/heatmap/{id} (HEATMAP_STORAGE=grid)
+heatmap_store = HeatmapStore(HEATMAP_RENDER_CACHE_SIZE)
+
+# Uploads stored once per distinct image, under their SHA-256
+upload_store = UploadStore(UPLOAD_FOLDER / "sha256")
+
+# Age/count/byte quotas for uploads, heatmap files and stored heatmap grids
+heatmap_quota = Quota(HEATMAP_MAX_AGE_DAYS, HEATMAP_MAX_FILES, HEATMAP_MAX_BYTES)
+upload_quota = Quota(UPLOAD_MAX_AGE_DAYS, UPLOAD_MAX_FILES, UPLOAD_MAX_BYTES)
+janitor = Janitor(
+    {
+        # Files saved by name before content addressing
+        "legacy_uploads": (UPLOAD_FOLDER, upload_quota),
+        "heatmaps": (HEATMAP_FOLDER, heatmap_quota)
+    },
+    JANITOR_INTERVAL,
+    {
+        "uploads": (upload_store, upload_quota),
+        "heatmap_grids": (heatmap_store, heatmap_quota)
+    }
+)
+
+# Prediction log rows are inserted in batches after the response
+prediction_writer = WriteBehindBuffer(
+    save_predictions, WRITE_BEHIND_MAX_ROWS, WRITE_BEHIND_MAX_WAIT_MS, WRITE_BEHIND_QUEUE_SIZE,
+    describe_fn=describe_prediction
+)
+
+# Content-hash cache of finished predictions
+prediction_cache = PredictionCache(
+    PREDICTION_CACHE_SIZE,
+    PREDICTION_CACHE_PATH if PREDICTION_CACHE_PERSIST else None,
+    PREDICTION_CACHE_DISK_MAX_ENTRIES
+)
+
 # Static files
 static_dir = Path(__file__).parent.parent / "static"
 static_dir.mkdir(parents=True, exist_ok=True)
@@ -98,14 +207,32 @@ async def startup_event():
     init_db()
     logger.info("Database initialized successfully")
     
-    # Load model
-    try:
-        load_model()
-        logger.info("Model loaded successfully")
-    except Exception as e:
-        logger.warning(f"Could not load model: {e}. Using mock predictions.")
+    # Load and warm up the model in the background; /api/health reports progress
+    start_background_load()
     
-    logger.info("System ready for predictions")
+    inference_batcher.start()
+    cpu_pool.start()
+    io_pool.start()
+    heatmap_pool.start()
+    render_pool.start()
+    if WRITE_BEHIND:
+        prediction_writer.start()
+    janitor.start()
+    
+    logger.info("System accepting requests (model loading in background)")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release background resources on shutdown"""
+    inference_batcher.stop()
+    janitor.stop()
+    cpu_pool.shutdown()
+    io_pool.shutdown()
+    heatmap_pool.shutdown(wait=False)
+    render_pool.shutdown(wait=False)
+    prediction_writer.stop()   # Writes buffered predictions before the pool closes
+    close_pool()
+    prediction_cache.close()
 
 # ============================================
 # API ENDPOINTS
@@ -117,19 +244,204 @@ def root():
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (liveness and readiness reported separately)"""
+    ready = is_model_ready()
     return {
         "status": "healthy",
+        "live": True,
+        "ready": ready,
+        "model": get_model_status(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/api/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and the event loop responds"""
+    return {"live": True}
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the model is loaded and warmed up"""
+    status = get_model_status()
+    if not is_model_ready():
+        return JSONResponse(status_code=503, content={"ready": False, "model": status})
+    return {"ready": True, "model": status}
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Runtime metrics (batch sizes, queue waits, latencies)"""
+    return {
+        "success": True,
+        "metrics": metrics.snapshot(),
         "timestamp": datetime.now().isoformat()
     }
 
+async def _log_prediction(image_name: str, disease: str, confidence: float, model_version: str,
+                          heatmap_id: str = None, upload_sha256: str = None,
+                          all_predictions: dict = None, embedding=None):
+    """
+    Record a prediction in the database. With WRITE_BEHIND the row is buffered
+    and inserted with others after the response; when the buffer is full, or
+    write-behind is off, it is written before returning
+    """
+    record = (
+        image_name, disease, confidence, model_version, heatmap_id, upload_sha256,
+        pack_probabilities(all_predictions), pack_embedding(embedding)
+    )
+    if WRITE_BEHIND:
+        if prediction_writer.submit(record):
+            return
+        await io_pool.run(prediction_writer.write_now, [record])
+    else:
+        await io_pool.run(save_prediction, *record)
+
+def _save_upload(content: bytes, filename: str, sha256: str):
+    """Store an upload in the content-addressed store (runs after the response)"""
+    try:
+        upload_store.save(content, filename, sha256)
+    except Exception as e:
+        logger.warning(f"Could not save upload {filename}: {e}")
+
+def _explains(handle) -> bool:
+    """
+    False when heatmaps are disabled (EXPLANATION_MODE=none) or the model
+    serving handle cannot be explained; such predictions get no heatmap
+    """
+    return explanation_mode(handle.backend if handle else None) != "none"
+
+def _explain_backend(handle):
+    """
+    Backend to pass to Grad-CAM so the heatmap explains the version that served
+    the prediction (process pools use their own copy of the active model)
+    """
+    if handle is None or WORKER_POOL_KIND == "process":
+        return None
+    return handle.backend
+
+async def _render_heatmap(original_image, image, prediction_result: dict, heatmap_path: str, handle):
+    """
+    Save the heatmap for one scored image: render the grid computed in the
+    prediction pass when there is one, otherwise run Grad-CAM separately
+    """
+    await cpu_pool.run(
+        save_heatmap, original_image, heatmap_path, prediction_result.get("heatmap_grid"),
+        image, _explain_backend(handle)
+    )
+
+def _heatmap_available(heatmap: str) -> bool:
+    """True if a heatmap referenced by a cached prediction still exists"""
+    if heatmap.startswith("api/heatmap/"):
+        return heatmap_store.exists(heatmap.rsplit("/", 1)[1])
+    return (PROJECT_ROOT / heatmap).exists()
+
+def _job_urls(job: dict) -> dict:
+    """Heatmap job record plus the URLs to poll or stream it"""
+    return {
+        **job,
+        "status_url": f"/api/heatmaps/jobs/{job['id']}",
+        "events_url": f"/api/heatmaps/jobs/{job['id']}/events"
+    }
+
+async def _run_prediction(filename: str, content: bytes, background_tasks: BackgroundTasks,
+                          handle=None, defer: bool = False) -> dict:
+    """
+    Decode, score and explain one uploaded image
+    
+    Args:
+        handle: ModelHandle chosen by route_model() (None in mock mode)
+        defer: Queue the heatmap as a background job instead of waiting for it
+    
+    Returns:
+        Dictionary with disease, confidence, all_predictions, heatmap,
+        model_version, heatmap_job (the job record when deferred; heatmap is
+        then the path the job will write), embedding (None unless
+        STORE_EMBEDDINGS) and fallback (True when inference failed and a
+        loaded model's answer was replaced by a mock prediction). Recommendations are looked up per response, so
+        cached predictions never serve stale ones.
+    """
+    # Decode once in memory; the frame is reused for Grad-CAM
+    try:
+        original_image, image = await cpu_pool.run(decode_and_preprocess, content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Persist the original (once per distinct image) after the response is sent
+    upload_sha256 = None
+    if SAVE_UPLOADS:
+        upload_sha256 = UploadStore.digest(content)
+        background_tasks.add_task(_save_upload, content, filename, upload_sha256)
+    
+    # Make prediction (batched with concurrent requests); models that support it
+    # return the Grad-CAM heatmap from the same forward pass. Deferred heatmaps
+    # are explained by the heatmap job instead, off the request path.
+    explain = not defer and handle is not None and can_explain(handle.backend)
+    prediction_result = await asyncio.wrap_future(inference_batcher.submit((image[0], handle, explain)))
+    disease = prediction_result["disease"]
+    confidence = prediction_result["confidence"]
+    
+    logger.info(f"Prediction: {disease} ({confidence:.2%})")
+    
+    heatmap_id = None
+    heatmap_job = None
+    if HEATMAP_STORAGE == "grid":
+        # Store the compact grid; /api/heatmap/{id} renders it on request
+        heatmap_id = uuid.uuid4().hex
+        heatmap_path = None
+        heatmap_relative = heatmap_url(heatmap_id)
+        render, render_args = heatmap_store.store, (heatmap_id, original_image, prediction_result.get("heatmap_grid"))
+    else:
+        heatmap_filename = f"heatmap_{Path(filename).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+        heatmap_path = sharded_path(HEATMAP_FOLDER, heatmap_filename)
+        heatmap_relative = relative_url(heatmap_path)
+        render, render_args = save_heatmap, (original_image, heatmap_path, prediction_result.get("heatmap_grid"))
+    
+    if not _explains(handle):
+        # Heatmaps are disabled or not possible for this model
+        heatmap_id = heatmap_relative = None
+    elif defer:
+        # Render in the heatmap pool; the client polls or streams the job
+        try:
+            heatmap_job = heatmap_jobs.submit(
+                heatmap_relative, render, *render_args, image, handle.backend if handle else None
+            )
+        except WorkerPoolFull:
+            logger.warning("Heatmap queue full, returning prediction without heatmap")
+            heatmap_id = heatmap_relative = None
+    else:
+        # Generate Grad-CAM heatmap
+        try:
+            if heatmap_id is not None:
+                await heatmap_pool.run(render, *render_args, image, handle.backend if handle else None)
+            else:
+                await _render_heatmap(original_image, image, prediction_result, heatmap_path, handle)
+            logger.info("Grad-CAM heatmap generated successfully")
+        except WorkerPoolFull:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not generate heatmap: {e}")
+            heatmap_id = heatmap_relative = None
+    
+    return {
+        "disease": disease,
+        "confidence": confidence,
+        "all_predictions": prediction_result.get("all_predictions", {}),
+        "heatmap": heatmap_relative,
+        "model_version": prediction_result["model_version"],
+        "fallback": handle is not None and prediction_result.get("is_mock", False),
+        "heatmap_id": heatmap_id,
+        "upload_sha256": upload_sha256,
+        "heatmap_job": heatmap_job,
+        "embedding": prediction_result.get("embedding")
+    }
+
 @app.post("/api/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
     Predict disease from uploaded image
     
     - **file**: Image file (JPG, PNG, WebP)
-    - Returns: Disease prediction, confidence, heatmap, recommendations
+    - Returns: Disease prediction, confidence, recommendations, and either the
+      heatmap or a heatmap job to poll (HEATMAP_DEFERRED)
     """
     try:
         # Validate file
@@ -142,39 +454,52 @@ async def predict(file: UploadFile = File(...)):
                 detail="Invalid file type. Please upload JPG, PNG, or WebP image"
             )
         
+        if is_model_loading():
+            raise HTTPException(status_code=503, detail="Model is loading. Please retry shortly.")
+        
         logger.info(f"Processing image: {file.filename}")
         
-        # Save uploaded file
-        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        content = await file.read()
         
-        # Make prediction
-        prediction_result = predict_disease(file_path)
-        disease = prediction_result["disease"]
-        confidence = prediction_result["confidence"]
+        # Pick the model version for this request (canary routing happens here)
+        handle = route_model()
         
-        logger.info(f"Prediction: {disease} ({confidence:.2%})")
+        # Serve repeated uploads (and client retries) from the prediction cache
+        cache_key = PredictionCache.make_key(content, serving_version(handle))
+        result = await io_pool.run(prediction_cache.get, cache_key)
+        if result is not None and result["heatmap"] and not await io_pool.run(_heatmap_available, result["heatmap"]):
+            # Heatmap was pruned from disk; score the image again
+            result = None
         
-        # Generate Grad-CAM heatmap
-        heatmap_path = None
-        try:
-            heatmap_filename = f"heatmap_{Path(file.filename).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-            heatmap_path = os.path.join(HEATMAP_FOLDER, heatmap_filename)
-            generate_gradcam_heatmap(file_path, heatmap_path)
-            heatmap_relative = f"static/heatmaps/{heatmap_filename}"
-            logger.info("Grad-CAM heatmap generated successfully")
-        except Exception as e:
-            logger.warning(f"Could not generate heatmap: {e}")
-            heatmap_relative = None
+        cached = result is not None
+        heatmap_job = None
+        embedding = None
+        if cached:
+            logger.info(f"Prediction cache hit for {file.filename}")
+            if SAVE_UPLOADS:
+                # Same bytes: add a reference to the stored upload (restoring it if pruned)
+                result["upload_sha256"] = UploadStore.digest(content)
+                background_tasks.add_task(_save_upload, content, file.filename, result["upload_sha256"])
+        else:
+            result = await _run_prediction(file.filename, content, background_tasks, handle, HEATMAP_DEFERRED)
+            heatmap_job = result.pop("heatmap_job")
+            embedding = result.pop("embedding")   # Logged, not cached or returned
+            if result.pop("fallback"):
+                # Never cache a mock answer under the real model's version
+                logger.warning(f"Not caching fallback prediction for {file.filename}")
+            elif result["heatmap"] is not None or not _explains(handle):
+                await io_pool.run(prediction_cache.put, cache_key, result)
         
-        # Get recommendations
-        recommendation = get_recommendations(disease)
+        disease = result["disease"]
+        confidence = result["confidence"]
         
         # Save to database
         try:
-            save_prediction(file.filename, disease, confidence)
+            await _log_prediction(
+                file.filename, disease, confidence, result["model_version"],
+                result.get("heatmap_id"), result.get("upload_sha256"),
+                result.get("all_predictions"), embedding
+            )
         except Exception as e:
             logger.warning(f"Could not save to database: {e}")
         
@@ -183,17 +508,505 @@ async def predict(file: UploadFile = File(...)):
             "success": True,
             "disease": disease,
             "confidence": confidence,
-            "heatmap": heatmap_relative,
-            "recommendation": recommendation,
+            # With a pending job the heatmap is fetched from the job once it is done
+            "heatmap": result["heatmap"] if heatmap_job is None else None,
+            "heatmap_job": _job_urls(heatmap_job) if heatmap_job else None,
+            # Looked up per response: recommendations can change after caching
+            "recommendation": get_recommendations(disease),
+            "model_version": result["model_version"],
+            "cached": cached,
             "timestamp": datetime.now().isoformat()
         }
     
     except HTTPException:
         raise
+    except WorkerPoolFull as e:
+        logger.warning(f"Rejecting prediction: {e}")
+        raise HTTPException(status_code=503, detail="Server busy. Please retry shortly.")
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+# ============================================
+# HEATMAP RENDERING
+# ============================================
+
+@app.get("/api/heatmap/{heatmap_id}")
+async def get_heatmap(heatmap_id: str, request: Request,
+                      size: Optional[int] = Query(None, ge=16, le=4096),
+                      format: Optional[str] = None):
+    """
+    Render a stored heatmap overlay
+    
+    - **size**: Long side in pixels (default and maximum: the stored preview size)
+    - **format**: webp, jpeg or png (default: webp if the Accept header allows it, else jpeg)
+    """
+    try:
+        fmt = negotiate_format(format, request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        data = await render_pool.run(heatmap_store.render, heatmap_id, size, fmt)
+    except WorkerPoolFull:
+        raise HTTPException(
+            status_code=503, detail="Server busy. Please retry shortly.", headers={"Retry-After": "1"}
+        )
+    if data is None:
+        raise HTTPException(status_code=404, detail="Heatmap not found")
+    
+    return Response(
+        content=data,
+        media_type=FORMATS[fmt][0],
+        headers={"Cache-Control": "public, max-age=86400, immutable", "Vary": "Accept"}
+    )
+
+# ============================================
+# HEATMAP JOBS
+# ============================================
+
+@app.get("/api/heatmaps/jobs/{job_id}")
+async def get_heatmap_job(job_id: str):
+    """Poll a deferred heatmap job"""
+    job = heatmap_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Heatmap job not found")
+    return {"success": True, "job": _job_urls(job)}
+
+@app.get("/api/heatmaps/jobs/{job_id}/events")
+async def stream_heatmap_job(job_id: str):
+    """
+    Server-Sent Events stream for a deferred heatmap job
+    Sends the job record on every status change and ends once it is finished
+    """
+    if heatmap_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Heatmap job not found")
+    
+    async def _events():
+        job = heatmap_jobs.get(job_id)
+        last_status = None
+        idle_seconds = 0.0
+        while job is not None:
+            if job["status"] != last_status:
+                last_status = job["status"]
+                idle_seconds = 0.0
+                yield f"event: {last_status}\ndata: {json.dumps(_job_urls(job))}\n\n"
+            elif idle_seconds >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                idle_seconds = 0.0
+                yield ": keep-alive\n\n"
+            if job["finished_at"] is not None:
+                return
+            job = await heatmap_jobs.wait(job_id, timeout=0.5)
+            idle_seconds += 0.5
+    
+    return StreamingResponse(
+        _events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============================================
+# BULK PREDICTION
+# ============================================
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "multipart/x-zip"}
+
+def _is_zip_upload(filename: str, content_type: str) -> bool:
+    return content_type in ZIP_CONTENT_TYPES or filename.lower().endswith(".zip")
+
+def _expand_bulk_uploads(uploads):
+    """
+    Turn uploaded files (or a single ZIP archive) into a list of bulk items
+    
+    Args:
+        uploads: List of (filename, content_type, content) tuples
+    
+    Returns:
+        Tuple of (archive, items) where items are (name, source) pairs and a
+        source is either raw bytes or a ZipInfo member of archive
+    """
+    archive = None
+    items = []
+    
+    for filename, content_type, content in uploads:
+        if not _is_zip_upload(filename, content_type):
+            items.append((filename, content))
+            continue
+        
+        if len(uploads) > 1:
+            raise HTTPException(status_code=400, detail="Upload either image files or a single ZIP archive")
+        
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(content))
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="Invalid ZIP archive")
+        
+        for info in archive.infolist():
+            extension = Path(info.filename).suffix.lower().lstrip(".")
+            if info.is_dir() or extension not in ALLOWED_EXTENSIONS:
+                continue
+            items.append((info.filename, info))
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    
+    if len(items) > BULK_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images ({len(items)}). Maximum is {BULK_MAX_IMAGES} per request"
+        )
+    
+    return archive, items
+
+def _read_bulk_sources(archive, sources) -> list:
+    """Read raw bytes for each bulk item (runs in the I/O pool)"""
+    results = []
+    for source in sources:
+        if isinstance(source, zipfile.ZipInfo):
+            if source.file_size > MAX_FILE_SIZE:
+                results.append(ValueError("Image exceeds maximum file size"))
+                continue
+            try:
+                results.append(archive.read(source))
+            except Exception as e:
+                results.append(e)
+        else:
+            results.append(source)
+    return results
+
+async def _bulk_prediction_stream(archive, items, heatmaps: bool):
+    """
+    Score bulk items chunk by chunk, yielding one NDJSON line per image
+    """
+    records = []
+    failed = 0
+    chunk_size = max(1, BATCH_MAX_SIZE)
+    batch_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        
+        # Read and decode the chunk in parallel
+        datas = await io_pool.run(_read_bulk_sources, archive, [source for _, source in chunk])
+        decoded = list(datas)
+        decode_jobs = {i: cpu_pool.run(decode_and_preprocess, data) for i, data in enumerate(datas) if isinstance(data, bytes)}
+        for i, frames in zip(decode_jobs, await asyncio.gather(*decode_jobs.values(), return_exceptions=True)):
+            decoded[i] = frames
+        del datas
+        
+        # Score all decoded images through the micro-batcher
+        ready = [i for i, image in enumerate(decoded) if not isinstance(image, BaseException)]
+        handles = {i: route_model() for i in ready}
+        predictions = await asyncio.gather(
+            *[asyncio.wrap_future(inference_batcher.submit((
+                decoded[i][1][0], handles[i], heatmaps and handles[i] is not None and can_explain(handles[i].backend)
+            ))) for i in ready],
+            return_exceptions=True
+        )
+        predictions = dict(zip(ready, predictions))
+        
+        heatmap_paths = {}
+        heatmap_ids = {}
+        if heatmaps:
+            scored = [
+                i for i in ready if not isinstance(predictions[i], BaseException) and _explains(handles[i])
+            ]
+            if HEATMAP_STORAGE == "grid":
+                heatmap_ids = await _store_bulk_heatmaps(decoded, predictions, scored, handles)
+                heatmap_paths = {i: heatmap_url(heatmap_id) for i, heatmap_id in heatmap_ids.items() if heatmap_id}
+            else:
+                heatmap_paths = await _bulk_heatmaps(chunk, decoded, predictions, scored, start, batch_stamp, handles)
+        
+        for offset, (name, _) in enumerate(chunk):
+            index = start + offset
+            result = predictions.get(offset, decoded[offset])
+            
+            if isinstance(result, BaseException):
+                failed += 1
+                error = "Server busy" if isinstance(result, WorkerPoolFull) else str(result)
+                line = {"index": index, "filename": name, "success": False, "error": error}
+                yield json.dumps(line) + "\n"
+                continue
+            
+            line = {
+                "index": index,
+                "filename": name,
+                "success": True,
+                "disease": result["disease"],
+                "confidence": result["confidence"],
+                "model_version": result["model_version"]
+            }
+            
+            if heatmaps:
+                line["heatmap"] = heatmap_paths.get(offset)
+            
+            records.append((
+                Path(name).name, result["disease"], result["confidence"], result["model_version"],
+                heatmap_ids.get(offset), None,
+                pack_probabilities(result.get("all_predictions")), pack_embedding(result.get("embedding"))
+            ))
+            yield json.dumps(line) + "\n"
+    
+    # Single batched insert for the whole request
+    try:
+        await io_pool.run(save_predictions, records)
+    except Exception as e:
+        logger.warning(f"Could not save bulk predictions to database: {e}")
+    
+    summary = {"done": True, "total": len(items), "succeeded": len(records), "failed": failed}
+    yield json.dumps(summary) + "\n"
+
+async def _store_bulk_heatmaps(decoded, predictions, offsets, handles) -> dict:
+    """
+    Store compact heatmaps for the scored images of one bulk chunk. Images
+    without a grid from the prediction pass get one batched explanation pass
+    per model version.
+    
+    Returns:
+        Dictionary {offset: heatmap ID or None}
+    """
+    groups = {}
+    for offset in offsets:
+        groups.setdefault(handles[offset], []).append(offset)
+    
+    async def _store_group(handle, group):
+        heatmap_ids = [uuid.uuid4().hex for _ in group]
+        try:
+            await heatmap_pool.run(
+                heatmap_store.save_many,
+                heatmap_ids,
+                [decoded[offset][0] for offset in group],
+                [predictions[offset].get("heatmap_grid") for offset in group],
+                np.concatenate([decoded[offset][1] for offset in group]),
+                handle.backend if handle else None
+            )
+            return dict(zip(group, heatmap_ids))
+        except Exception as e:
+            logger.warning(f"Could not store bulk heatmaps: {e}")
+            return {offset: None for offset in group}
+    
+    ids = {}
+    for stored in await asyncio.gather(*[_store_group(handle, group) for handle, group in groups.items()]):
+        ids.update(stored)
+    return ids
+
+async def _bulk_heatmaps(chunk, decoded, predictions, offsets, start: int, batch_stamp: str, handles) -> dict:
+    """
+    Render heatmaps for the scored images of one bulk chunk. Grids computed in
+    the prediction pass are only rendered; the rest get one batched Grad-CAM
+    pass per model version.
+    
+    Returns:
+        Dictionary {offset: heatmap path or None}
+    """
+    def _path(offset):
+        return sharded_path(HEATMAP_FOLDER, f"heatmap_{Path(chunk[offset][0]).stem}_{batch_stamp}_{start + offset}.png")
+    
+    async def _render_grid(offset):
+        path = _path(offset)
+        try:
+            await cpu_pool.run(render_heatmap, decoded[offset][0], predictions[offset]["heatmap_grid"], path)
+            return {offset: relative_url(path)}
+        except Exception as e:
+            logger.warning(f"Could not render bulk heatmap: {e}")
+            return {offset: None}
+    
+    async def _render_group(handle, group):
+        paths = [_path(offset) for offset in group]
+        try:
+            await cpu_pool.run(
+                generate_gradcam_heatmaps,
+                [decoded[offset][0] for offset in group],
+                paths,
+                None,
+                np.concatenate([decoded[offset][1] for offset in group]),
+                _explain_backend(handle)
+            )
+            return {offset: relative_url(path) for offset, path in zip(group, paths)}
+        except Exception as e:
+            logger.warning(f"Could not generate bulk heatmaps: {e}")
+            return {offset: None for offset in group}
+    
+    jobs = []
+    groups = {}
+    for offset in offsets:
+        if predictions[offset].get("heatmap_grid") is not None:
+            jobs.append(_render_grid(offset))
+        else:
+            groups.setdefault(handles[offset], []).append(offset)
+    jobs.extend(_render_group(handle, group) for handle, group in groups.items())
+    
+    paths = {}
+    for rendered in await asyncio.gather(*jobs):
+        paths.update(rendered)
+    return paths
+
+@app.post("/api/predict/batch")
+async def predict_bulk(files: List[UploadFile] = File(...), heatmaps: bool = False):
+    """
+    Predict diseases for many images in one request
+    
+    - **files**: Image files, or a single ZIP archive of images
+    - **heatmaps**: Render a Grad-CAM heatmap per image (query parameter, default false)
+    - Returns: NDJSON stream with one line per image and a final summary line
+    """
+    if is_model_loading():
+        raise HTTPException(status_code=503, detail="Model is loading. Please retry shortly.")
+    
+    uploads = []
+    for file in files:
+        uploads.append((file.filename or "", file.content_type or "", await file.read()))
+    
+    archive, items = _expand_bulk_uploads(uploads)
+    logger.info(f"Processing bulk upload: {len(items)} images")
+    
+    return StreamingResponse(
+        _bulk_prediction_stream(archive, items, heatmaps),
+        media_type="application/x-ndjson"
+    )
+
+# ============================================
+# TILED PREDICTION
+# ============================================
+
+@app.post("/api/predict/tiled")
+async def predict_tiled_image(file: UploadFile = File(...), overlap: float = TILE_OVERLAP,
+                              heatmap: bool = True):
+    """
+    Predict disease on a large field or drone image by scoring overlapping tiles
+    
+    - **file**: Image file (JPG, PNG, WebP), any resolution
+    - **overlap**: Fraction of each tile shared with its neighbour (query parameter)
+    - **heatmap**: Render the stitched tile heatmap (query parameter, default true)
+    - Returns: Aggregated verdict, per-tile disease grid and heatmap
+    """
+    if is_model_loading():
+        raise HTTPException(status_code=503, detail="Model is loading. Please retry shortly.")
+    if not 0 <= overlap < 1:
+        raise HTTPException(status_code=400, detail="overlap must be between 0 and 1")
+    
+    content = await file.read()
+    if len(content) > TILE_MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="Image is too large")
+    
+    handle = route_model()
+    heatmap_path = None
+    if heatmap:
+        heatmap_filename = f"tiled_{Path(file.filename or 'image').stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+        heatmap_path = sharded_path(HEATMAP_FOLDER, heatmap_filename)
+    
+    try:
+        result = await cpu_pool.run(
+            score_tiled, content, overlap, TILE_MAX_PIXELS, BATCH_MAX_SIZE,
+            heatmap_path,
+            # Process pools score with their own copy of the active model
+            None if WORKER_POOL_KIND == "process" else handle
+        )
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WorkerPoolFull:
+        raise HTTPException(status_code=503, detail="Server busy. Please retry shortly.")
+    
+    verdict = result["verdict"]
+    model_version = serving_version(handle) if WORKER_POOL_KIND != "process" else get_model_version()
+    logger.info(
+        f"Tiled prediction: {verdict['disease']} on {verdict['affected_tiles']}/{len(result['tiles'])} tiles"
+    )
+    
+    try:
+        await _log_prediction(
+            file.filename, verdict["disease"], verdict["confidence"], model_version,
+            all_predictions=verdict["mean_probabilities"]
+        )
+    except Exception as e:
+        logger.warning(f"Could not save to database: {e}")
+    
+    grid = result["grid"]
+    disease_grid = [[None] * grid["cols"] for _ in range(grid["rows"])]
+    tiles = []
+    for tile in result["tiles"]:
+        disease_grid[tile["row"]][tile["col"]] = tile["disease"]
+        tiles.append({k: tile[k] for k in ("row", "col", "x", "y", "disease", "confidence")})
+    
+    return {
+        "success": True,
+        "disease": verdict["disease"],
+        "confidence": verdict["confidence"],
+        "verdict": verdict,
+        "width": result["width"],
+        "height": result["height"],
+        "tile_size": result["tile_size"],
+        "stride": result["stride"],
+        "grid": grid,
+        "disease_grid": disease_grid,
+        "tiles": tiles,
+        "heatmap": relative_url(heatmap_path) if heatmap_path else None,
+        "recommendation": get_recommendations(verdict["disease"]),
+        "model_version": model_version,
+        "timestamp": datetime.now().isoformat()
+    }
+
+# ============================================
+# MODEL REGISTRY
+# ============================================
+
+def _model_file(file_name: str) -> Path:
+    """Resolve a model file name inside the models directory"""
+    path = (MODEL_PATH / Path(file_name).name).resolve()
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail=f"Model file not found: {file_name}")
+    return path
+
+@app.get("/api/models")
+async def list_models():
+    """List registered model versions, active/canary/shadow routing and loads in progress"""
+    return {"success": True, **registry.describe()}
+
+@app.post("/api/models/load", status_code=202)
+async def load_model_version(request: ModelLoadRequest):
+    """
+    Load and warm up a model version in the background
+    
+    - **file**: Model file name in backend/models
+    - **activate**: Switch traffic to it once it is warm
+    """
+    path = _model_file(request.file)
+    version = registry.load_in_background(
+        request.name, path, request.version, request.activate, INFERENCE_THREADS
+    )
+    return {"success": True, "name": request.name, "version": version, "state": "loading"}
+
+@app.post("/api/models/activate")
+async def activate_model_version(request: ModelRouteRequest):
+    """Atomically switch all traffic to a loaded version"""
+    try:
+        registry.activate(request.name, request.version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"success": True, **registry.describe()}
+
+@app.post("/api/models/canary")
+async def set_canary_version(request: ModelRouteRequest):
+    """Route a percentage of traffic to a loaded version (percent=0 clears it)"""
+    try:
+        registry.set_canary(request.name, request.version, request.percent)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **registry.describe()}
+
+@app.post("/api/models/shadow")
+async def set_shadow_version(request: ModelShadowRequest):
+    """Score every request on a version too, without returning its result"""
+    try:
+        registry.set_shadow(request.name, request.version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"success": True, **registry.describe()}
+
 @app.get("/api/recommendations/{disease_name}")
 async def get_disease_recommendations(disease_name: str):
     """
@@ -217,6 +1030,128 @@ async def get_disease_recommendations(disease_name: str):
         logger.error(f"Recommendation error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve recommendations")
 
+def _time_param(value: Optional[str], name: str):
+    """Parse an optional ISO 8601 query parameter (400 if malformed)"""
+    if value is None:
+        return None
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 date or date-time")
+
+@app.get("/api/statistics")
+async def prediction_statistics(start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Prediction counts and average confidence per disease
+    
+    - **start**: Only predictions at or after this time (ISO 8601, UTC unless an offset is given)
+    - **end**: Only predictions before this time
+    """
+    start_time = _time_param(start, "start")
+    end_time = _time_param(end, "end")
+    if start_time and end_time and start_time >= end_time:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    try:
+        stats = await io_pool.run(get_statistics, start_time, end_time)
+    except WorkerPoolFull:
+        raise HTTPException(status_code=503, detail="Server busy. Please retry shortly.")
+    if not stats:
+        raise HTTPException(status_code=500, detail="Failed to retrieve statistics")
+    
+    return {
+        "success": True,
+        **stats,
+        "start": start_time.isoformat() if start_time else None,
+        "end": end_time.isoformat() if end_time else None,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/api/history")
+async def prediction_history(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    disease: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    max_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """
+    Past predictions, newest first, one page at a time
+    
+    - **limit**: Page size (1-500)
+    - **cursor**: next_cursor of the previous page
+    - **disease**: Only this disease
+    - **min_confidence** / **max_confidence**: Confidence range (0-1)
+    - **start** / **end**: Time window (ISO 8601, UTC unless an offset is given)
+    """
+    start_time = _time_param(start, "start")
+    end_time = _time_param(end, "end")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # One extra row tells whether another page follows
+        rows = await io_pool.run(
+            get_prediction_history, limit + 1, after, disease,
+            min_confidence, max_confidence, start_time, end_time
+        )
+        estimated_total = await io_pool.run(estimate_prediction_count, disease, start_time, end_time)
+    except WorkerPoolFull:
+        raise HTTPException(status_code=503, detail="Server busy. Please retry shortly.")
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to retrieve prediction history")
+    
+    items = rows[:limit]
+    for item in items:
+        heatmap_id = item.pop("heatmap_id")
+        item["heatmap"] = heatmap_url(heatmap_id) if heatmap_id else None
+    
+    return {
+        "success": True,
+        "items": items,
+        "next_cursor": encode_cursor(items[-1]["timestamp"], items[-1]["id"]) if len(rows) > limit else None,
+        "estimated_total": estimated_total,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/api/export")
+async def export_predictions(
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    after_id: int = Query(0, ge=0),
+    chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=1, le=100000)
+):
+    """
+    Stream the prediction history as a file, oldest first
+    
+    - **format**: csv, ndjson or parquet (parquet needs pyarrow)
+    - **start** / **end**: Time window (ISO 8601, UTC unless an offset is given)
+    - **after_id**: Resume after this prediction id (the last id received)
+    - **chunk_size**: Rows read per chunk
+    """
+    start_time = _time_param(start, "start")
+    end_time = _time_param(end, "end")
+    try:
+        export.check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    media_type, extension = export.FORMATS[format]
+    filename = f"predictions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    # A sync generator: Starlette iterates it in a worker thread, chunk by chunk
+    return StreamingResponse(
+        export.stream_export(format, start_time, end_time, after_id, chunk_size, header=after_id == 0),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # ============================================
 # OTP & AUTHENTICATION ENDPOINTS
 # ============================================
@@ -410,11 +1345,15 @@ async def verify_otp(request: OTPVerifyRequest):
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Custom HTTP exception handler"""
-    return {
-        "success": False,
-        "error": exc.detail,
-        "status_code": exc.status_code
-    }
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={
+            "success": False,
+            "error": exc.detail,
+            "status_code": exc.status_code
+        },
+        headers=exc.headers
+    )
 
 
 # ============================================
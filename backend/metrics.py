@@ -0,0 +1,134 @@
+"""
+Metrics - Lightweight in-process counters and histograms
+Used to tune batching, caching and background workers at runtime
+"""
+
+import threading
+from bisect import bisect_left
+
+# Default bucket upper bounds for latency histograms (milliseconds)
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+class Counter:
+    """Thread-safe monotonically increasing counter"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+class Gauge:
+    """Thread-safe value that can go up and down"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket histogram
+
+    Args:
+        buckets: Sorted bucket upper bounds; values above the last bound
+                 are counted in the "+Inf" bucket
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            count, total, maximum = self._count, self._sum, self._max
+
+        labels = [f"<={b:g}" for b in self.buckets] + ["+Inf"]
+        return {
+            "count": count,
+            "sum": round(total, 3),
+            "mean": round(total / count, 3) if count else 0.0,
+            "max": round(maximum, 3),
+            "buckets": dict(zip(labels, counts))
+        }
+
+# ============================================
+# REGISTRY
+# ============================================
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def counter(name: str) -> Counter:
+    """Get or create a named counter"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Counter()
+        return _registry[name]
+
+def gauge(name: str) -> Gauge:
+    """Get or create a named gauge"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Gauge()
+        return _registry[name]
+
+def histogram(name: str, buckets=LATENCY_BUCKETS_MS) -> Histogram:
+    """Get or create a named histogram"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(buckets)
+        return _registry[name]
+
+def register(name: str, metric):
+    """Register any object with a snapshot() method, e.g. a derived statistic"""
+    with _registry_lock:
+        _registry[name] = metric
+    return metric
+
+def snapshot() -> dict:
+    """Return the current value of every registered metric"""
+    with _registry_lock:
+        items = list(_registry.items())
+    return {name: metric.snapshot() for name, metric in sorted(items)}
@@ -1,57 +1,179 @@
 """
 Model Loader - Load pre-trained CNN model and make predictions
-Supports TensorFlow/Keras (.h5) and PyTorch (.pt) models
+Supports TensorFlow/Keras (.h5), PyTorch (.pt), ONNX (.onnx) and TFLite (.tflite) models
 """
 
 import numpy as np
 import cv2
 import logging
+import threading
+import time
 from pathlib import Path
-from config import MODEL_PATH, MODEL_INPUT_SIZE, DISEASE_CLASSES, CONFIDENCE_THRESHOLD
+from config import (
+    MODEL_PATH, MODEL_INPUT_SIZE, DISEASE_CLASSES, CONFIDENCE_THRESHOLD,
+    MODEL_BACKEND, MODEL_FILE, INFERENCE_THREADS, BATCH_MAX_SIZE,
+    CASCADE_MODEL_FILE, CASCADE_CLASS_THRESHOLDS, STORE_EMBEDDINGS
+)
+from inference_backends import find_model_file
+from model_registry import ModelRegistry, DEFAULT_MODEL
+from cascade import Cascade, parse_class_thresholds
+from preprocessing import Preprocessor, read_file
+import metrics
 
 logger = logging.getLogger(__name__)
 
-# Global model variable
+# Registry of named, versioned models; traffic goes to the active version
+# of DEFAULT_MODEL unless a canary is configured
+registry = ModelRegistry(MODEL_INPUT_SIZE, (1, BATCH_MAX_SIZE))
+
+# Registry name of the fast first-stage model; the cascade is active
+# whenever a version of it is active in the registry
+CASCADE_MODEL = "fast"
+
+cascade = Cascade(
+    registry, CASCADE_MODEL, CONFIDENCE_THRESHOLD,
+    parse_class_thresholds(CASCADE_CLASS_THRESHOLDS, DISEASE_CLASSES)
+)
+
+# Active default model (an InferenceBackend from inference_backends),
+# kept in sync with the registry on every hot swap
 model = None
 
+# Identifies the active default weights ("mock" when no model is loaded)
+model_version = "mock"
+
+# Shared decode/resize/normalize pipeline with per-thread scratch buffers
+preprocessor = Preprocessor(MODEL_INPUT_SIZE, BATCH_MAX_SIZE)
+
+def _on_activate(handle):
+    global model, model_version
+    if handle.name == DEFAULT_MODEL:
+        model = handle.backend
+        model_version = handle.version
+        _set_status(framework=handle.framework, version=handle.version)
+
+registry.add_listener(_on_activate)
+
+# Model lifecycle reported by /api/health:
+# not_loaded -> loading -> ready | mock | failed
+_status = {
+    "state": "not_loaded",
+    "framework": None,
+    "version": "mock",
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "error": None
+}
+_status_lock = threading.Lock()
+_load_thread = None
+
+def _set_status(**fields):
+    with _status_lock:
+        _status.update(fields)
+
+def get_model_status() -> dict:
+    """Return a copy of the model lifecycle state"""
+    with _status_lock:
+        return dict(_status)
+
+def is_model_ready() -> bool:
+    """True once requests can be served (real model warmed up, or mock mode)"""
+    return _status["state"] in ("ready", "mock")
+
+def is_model_loading() -> bool:
+    """True while the initial model load and warm-up is in progress"""
+    return _status["state"] in ("not_loaded", "loading")
+
 def load_model():
     """
-    Load pre-trained model from disk
-    Supports TensorFlow/Keras (.h5) and PyTorch (.pt) models
+    Load and warm up the default model from disk and make it active
+    Uses MODEL_FILE if set, otherwise the first file in the models directory
+    matching MODEL_BACKEND ("auto" prefers ONNX, then TFLite, Keras, PyTorch)
     """
-    global model
+    _set_status(state="loading", error=None)
+    started = time.perf_counter()
     
     try:
-        # Try to load TensorFlow/Keras model first
-        h5_files = list(MODEL_PATH.glob("*.h5"))
-        if h5_files:
-            model_file = h5_files[0]
-            logger.info(f"Loading TensorFlow model from {model_file}")
-            import tensorflow as tf
-            model = tf.keras.models.load_model(str(model_file))
-            logger.info("TensorFlow model loaded successfully")
-            return True
+        model_file = Path(MODEL_FILE) if MODEL_FILE else find_model_file(MODEL_PATH, MODEL_BACKEND)
+        if model_file is None:
+            logger.warning("No pre-trained model found in models directory")
+            logger.info("Using mock model for demonstration")
+            _set_status(state="mock")
+            return False
         
-        # Try PyTorch model
-        pt_files = list(MODEL_PATH.glob("*.pt"))
-        if pt_files:
-            model_file = pt_files[0]
-            logger.info(f"Loading PyTorch model from {model_file}")
-            import torch
-            model = torch.load(str(model_file))
-            model.eval()
-            logger.info("PyTorch model loaded successfully")
-            return True
-        
-        logger.warning("No pre-trained model found in models directory")
-        logger.info("Using mock model for demonstration")
-        return False
+        handle = registry.load(DEFAULT_MODEL, model_file, activate=True, num_threads=INFERENCE_THREADS)
+        if CASCADE_MODEL_FILE:
+            load_cascade_model(CASCADE_MODEL_FILE)
+        total = time.perf_counter() - started
+        warmup = handle.warmup_seconds
+        _set_status(
+            state="ready",
+            load_seconds=round(total - warmup, 3),
+            warmup_seconds=round(warmup, 3)
+        )
+        logger.info(f"{handle.framework} model loaded and warmed up in {total:.2f}s ({handle.version})")
+        return True
     
     except Exception as e:
         logger.error(f"Error loading model: {e}")
         logger.info("Using mock model for demonstration")
+        _set_status(state="failed", error=str(e))
         return False
 
+def load_cascade_model(model_file) -> bool:
+    """
+    Load the fast first-stage model; a failure only disables the cascade
+    """
+    try:
+        registry.load(CASCADE_MODEL, Path(model_file), activate=True, num_threads=INFERENCE_THREADS)
+        return True
+    except Exception as e:
+        logger.warning(f"Cascade disabled, could not load fast model: {e}")
+        return False
+
+def start_background_load() -> threading.Thread:
+    """
+    Load and warm up the model in a background thread so the server can
+    answer health checks immediately
+    """
+    global _load_thread
+    
+    if _load_thread is not None and _load_thread.is_alive():
+        return _load_thread
+    
+    _load_thread = threading.Thread(target=load_model, name="model-loader", daemon=True)
+    _load_thread.start()
+    return _load_thread
+
+def wait_until_ready(timeout: float = None) -> bool:
+    """Block until a background load finishes; returns is_model_ready()"""
+    if _load_thread is not None:
+        _load_thread.join(timeout)
+    return is_model_ready()
+
+def route_model(name: str = DEFAULT_MODEL):
+    """
+    Pick the model version that serves one request (honours canary routing)
+    
+    Returns:
+        ModelHandle, or None in mock mode
+    """
+    return registry.route(name)
+
+def get_model_version() -> str:
+    """Return the version string of the active default model"""
+    return model_version
+
+def serving_version(handle) -> str:
+    """
+    Version string for everything that can answer a request routed to handle,
+    including the fast cascade model (used in prediction cache keys)
+    """
+    if handle is None:
+        return "mock"
+    fast = cascade.fast_model(handle)
+    return f"{handle.version}+{fast.version}" if fast else handle.version
+
 def preprocess_image(image_path: str) -> np.ndarray:
     """
     Preprocess image for model input
@@ -63,29 +185,67 @@ def preprocess_image(image_path: str) -> np.ndarray:
         Preprocessed image array
     """
     try:
-        # Read image
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError(f"Could not read image: {image_path}")
-        
-        # Convert BGR to RGB
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # Resize to model input size
-        image = cv2.resize(image, (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
-        
-        # Normalize to [0, 1]
-        image = image.astype(np.float32) / 255.0
-        
-        # Add batch dimension
-        image = np.expand_dims(image, axis=0)
-        
-        return image
+        return preprocessor.preprocess_bytes(read_file(image_path))
     
     except Exception as e:
         logger.error(f"Error preprocessing image: {e}")
         raise
 
+def preprocess_images(image_paths) -> np.ndarray:
+    """
+    Preprocess several image files into one (N, H, W, 3) batch array
+    """
+    return preprocessor.preprocess_batch(read_file(path) for path in image_paths)
+
+def decode_image(data: bytes) -> np.ndarray:
+    """
+    Decode encoded image bytes (JPEG, PNG, WebP) at full resolution without touching disk
+    
+    Args:
+        data: Encoded image bytes
+    
+    Returns:
+        Image array in RGB format
+    """
+    image = preprocessor.decode(data, reduce=False)
+    # In place: a second full-size copy is what large images cannot afford
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+def preprocess_array(image: np.ndarray) -> np.ndarray:
+    """
+    Preprocess an RGB image array for model input
+    
+    Args:
+        image: Image array in RGB format
+    
+    Returns:
+        Preprocessed image array with batch dimension
+    """
+    # Resize to model input size
+    image = cv2.resize(image, (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
+    
+    # Normalize to [0, 1]
+    image = image.astype(np.float32) / 255.0
+    
+    # Add batch dimension
+    return np.expand_dims(image, axis=0)
+
+def decode_and_preprocess(data: bytes):
+    """
+    Decode encoded image bytes once for both inference and visualization
+    Large JPEGs are decoded at reduced resolution (close to the model input size)
+    
+    Args:
+        data: Encoded image bytes
+    
+    Returns:
+        Tuple of (RGB image array, preprocessed image array with batch dimension)
+    """
+    image = preprocessor.decode(data)
+    processed = np.empty((1, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3), dtype=np.float32)
+    preprocessor.preprocess_into(image, processed[0])
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), processed
+
 def predict_disease(image_path: str) -> dict:
     """
     Predict disease from image
@@ -100,48 +260,188 @@ def predict_disease(image_path: str) -> dict:
         # Preprocess image
         image = preprocess_image(image_path)
         
-        # Make prediction
-        if model is not None:
-            try:
-                import tensorflow as tf
-                # Check if it's a TensorFlow model
-                if hasattr(model, 'predict'):
-                    predictions = model.predict(image, verbose=0)
-                    class_idx = np.argmax(predictions[0])
-                    confidence = float(predictions[0][class_idx])
-                else:
-                    # PyTorch model
-                    import torch
-                    image_tensor = torch.from_numpy(image).to(next(model.parameters()).device)
-                    with torch.no_grad():
-                        output = model(image_tensor)
-                    confidence = torch.softmax(output, dim=1)
-                    class_idx = int(torch.argmax(confidence[0]))
-                    confidence = float(confidence[0][class_idx])
-            except Exception as e:
-                logger.warning(f"Error running inference: {e}. Using mock prediction.")
-                return _mock_prediction()
-        else:
-            # Use mock prediction if model not loaded
-            return _mock_prediction()
-        
-        disease = DISEASE_CLASSES[class_idx] if class_idx < len(DISEASE_CLASSES) else "Unknown"
-        
-        return {
-            "disease": disease,
-            "confidence": confidence,
-            "class_index": class_idx,
-            "all_predictions": {
-                DISEASE_CLASSES[i]: float(pred) 
-                for i, pred in enumerate(predictions[0]) 
-                if i < len(DISEASE_CLASSES)
-            } if model is not None else {}
-        }
+        return predict_batch(image)[0]
     
     except Exception as e:
         logger.error(f"Error in disease prediction: {e}")
         raise
 
+def predict_batch(images, handle=None, explain: bool = False) -> list:
+    """
+    Predict diseases for a batch of preprocessed images in one forward pass
+    
+    Args:
+        images: Array of shape (N, H, W, 3) or a list of (H, W, 3) arrays
+        handle: ModelHandle to run (defaults to the active default model)
+        explain: Also compute Grad-CAM heatmaps from the same forward pass
+                 (with the cascade, only for the rows that escalate to the
+                 full model)
+    
+    Returns:
+        List of prediction dictionaries, one per image, each recording
+        the model_version that served it and the cascade_stage ("fast" or
+        "full") when the cascade is active. With explain, results of the full
+        model carry a "heatmap_grid" array in [0, 1] if the backend supports
+        it; fast answers have none and are explained later if needed.
+        With STORE_EMBEDDINGS, results of the full model carry an
+        "embedding" vector if the backend exposes its last feature maps.
+    """
+    if not isinstance(images, np.ndarray):
+        images = np.stack(images)
+    
+    if handle is None:
+        handle = registry.active()
+    
+    # Use mock prediction if model not loaded
+    if handle is None:
+        return [_mock_prediction() for _ in range(len(images))]
+    
+    fast = cascade.fast_model(handle)
+    try:
+        if fast is not None:
+            outputs = {}
+            
+            def _escalate(batch):
+                probabilities, outputs["heatmaps"], outputs["embeddings"] = _full_pass(handle.backend, batch, explain)
+                return probabilities
+            
+            predictions, served_by = cascade.predict(fast, handle, images, _escalate)
+            # Heatmaps and embeddings exist for the escalated rows only, in order
+            escalated = [i for i, served in enumerate(served_by) if served is not fast]
+            heatmaps = _scatter(outputs.get("heatmaps"), escalated, len(images))
+            embeddings = _scatter(outputs.get("embeddings"), escalated, len(images))
+        else:
+            predictions, heatmaps, embeddings = _full_pass(handle.backend, images, explain)
+            served_by = None
+    except Exception as e:
+        logger.warning(f"Error running inference: {e}. Using mock prediction.")
+        return [_mock_prediction() for _ in range(len(images))]
+    
+    _submit_shadow(handle, images, predictions)
+    
+    results = []
+    for i, row in enumerate(predictions):
+        result = _format_prediction(row)
+        result["model_version"] = handle.version
+        if served_by is not None:
+            result["model_version"] = served_by[i].version
+            result["cascade_stage"] = "fast" if served_by[i] is fast else "full"
+        if heatmaps is not None and heatmaps[i] is not None:
+            result["heatmap_grid"] = heatmaps[i]
+        if embeddings is not None and embeddings[i] is not None:
+            result["embedding"] = embeddings[i]
+        results.append(result)
+    return results
+
+def _full_pass(backend, images: np.ndarray, explain: bool):
+    """
+    One forward pass of a full model
+    
+    Returns:
+        Tuple of (probabilities, heatmaps, embeddings); heatmaps and
+        embeddings are None when not requested or not available
+    """
+    if explain:
+        from gradcam import predict_with_explanation
+        if STORE_EMBEDDINGS:
+            return predict_with_explanation(backend, images, embeddings=True)
+        probabilities, heatmaps = predict_with_explanation(backend, images)
+        return probabilities, heatmaps, None
+    if STORE_EMBEDDINGS:
+        from gradcam import predict_with_embeddings
+        probabilities, embeddings = predict_with_embeddings(backend, images)
+        return probabilities, None, embeddings
+    return backend.predict(images), None, None
+
+def _scatter(values, rows: list, count: int):
+    """Spread per-row values computed for rows over a list of count entries (None elsewhere)"""
+    if values is None:
+        return None
+    spread = [None] * count
+    for row, value in zip(rows, values):
+        spread[row] = value
+    return spread
+
+def predict_routed(items) -> list:
+    """
+    Batch function for the micro-batcher
+    
+    Args:
+        items: List of (preprocessed image, ModelHandle or None) pairs, where
+               the handle was chosen by route_model() when the request arrived,
+               or (image, handle, explain) triples to request a heatmap from
+               the same forward pass
+    
+    Returns:
+        List of prediction dictionaries in the same order as items
+    """
+    groups = {}
+    for index, item in enumerate(items):
+        explain = len(item) > 2 and bool(item[2])
+        groups.setdefault((item[1], explain), []).append(index)
+    
+    results = [None] * len(items)
+    for (handle, explain), indices in groups.items():
+        # Stack into the batcher thread's reusable buffer instead of a new array
+        images = np.stack([items[i][0] for i in indices], out=preprocessor.batch_buffer(len(indices)))
+        for i, result in zip(indices, predict_batch(images, handle, explain)):
+            results[i] = result
+    return results
+
+# ============================================
+# SHADOW SCORING
+# ============================================
+
+_shadow_executor = None
+_shadow_lock = threading.Lock()
+
+def _submit_shadow(handle, images: np.ndarray, predictions: np.ndarray):
+    """Score the same batch on the shadow version in the background"""
+    global _shadow_executor
+    
+    shadow = registry.shadow(handle.name)
+    if shadow is None or shadow is handle:
+        return
+    
+    with _shadow_lock:
+        if _shadow_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+    # Copy: the batch may live in a buffer that is reused for the next batch
+    _shadow_executor.submit(_run_shadow, shadow, images.copy(), np.asarray(predictions))
+
+def _run_shadow(shadow, images: np.ndarray, predictions: np.ndarray):
+    try:
+        started = time.perf_counter()
+        shadow_predictions = shadow.backend.predict(images)
+        metrics.histogram("shadow.latency_ms").observe((time.perf_counter() - started) * 1000)
+        
+        agree = int((shadow_predictions.argmax(axis=1) == predictions.argmax(axis=1)).sum())
+        metrics.counter("shadow.agree").inc(agree)
+        metrics.counter("shadow.disagree").inc(len(images) - agree)
+    except Exception as e:
+        metrics.counter("shadow.errors").inc()
+        logger.warning(f"Shadow model {shadow.version} failed: {e}")
+
+def _format_prediction(probabilities: np.ndarray) -> dict:
+    """
+    Convert one row of class probabilities into a prediction dictionary
+    """
+    class_idx = int(np.argmax(probabilities))
+    confidence = float(probabilities[class_idx])
+    disease = DISEASE_CLASSES[class_idx] if class_idx < len(DISEASE_CLASSES) else "Unknown"
+    
+    return {
+        "disease": disease,
+        "confidence": confidence,
+        "class_index": class_idx,
+        "all_predictions": {
+            DISEASE_CLASSES[i]: float(pred) 
+            for i, pred in enumerate(probabilities) 
+            if i < len(DISEASE_CLASSES)
+        }
+    }
+
 def _mock_prediction() -> dict:
     """
     Generate enhanced mock prediction for demonstration
@@ -195,6 +495,7 @@ def _mock_prediction() -> dict:
         "confidence": round(all_predictions[selected_disease], 4),
         "class_index": DISEASE_CLASSES.index(selected_disease),
         "all_predictions": {d: round(c, 4) for d, c in all_predictions.items()},
+        "model_version": "mock",
         "is_mock": True
     }
 
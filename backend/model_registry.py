@@ -0,0 +1,284 @@
+"""
+Model Registry - Named, versioned models with zero-downtime hot swap
+New versions load and warm up in the background, then traffic switches
+atomically. Supports canary routing by percentage and shadow scoring.
+
+In-flight requests keep a reference to the handle they were routed to, so a
+swap never drops or changes a request that is already being scored.
+"""
+
+import random
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from inference_backends import load_backend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "default"
+
+def file_version(model_file: Path) -> str:
+    """Version string for a model file: name plus modification time"""
+    model_file = Path(model_file)
+    return f"{model_file.name}@{int(model_file.stat().st_mtime)}"
+
+def warm_up(backend, input_size: int, batch_sizes=(1,)):
+    """
+    Run dummy batches through a backend so graph tracing, kernel selection
+    and buffer allocation happen before real traffic
+
+    Returns:
+        Warm-up time in seconds
+    """
+    started = time.perf_counter()
+    for batch_size in sorted(set(max(1, b) for b in batch_sizes)):
+        dummy = np.zeros((batch_size, input_size, input_size, 3), dtype=np.float32)
+        backend.predict(dummy)
+    return time.perf_counter() - started
+
+class ModelHandle:
+    """A loaded model version"""
+
+    def __init__(self, name: str, version: str, backend, path: Path = None):
+        self.name = name
+        self.version = version
+        self.backend = backend
+        self.path = Path(path) if path else None
+        self.loaded_at = datetime.now().isoformat()
+        self.warmup_seconds = 0.0
+
+    @property
+    def framework(self) -> str:
+        return self.backend.framework
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "framework": self.framework,
+            "path": str(self.path) if self.path else None,
+            "loaded_at": self.loaded_at,
+            "warmup_seconds": round(self.warmup_seconds, 3)
+        }
+
+class ModelRegistry:
+    """
+    Thread-safe registry of model versions
+
+    Args:
+        input_size: Model input size used for warm-up batches
+        warmup_batch_sizes: Batch sizes run during warm-up
+        failed_job_ttl: Seconds a failed load stays listed in describe()
+    """
+
+    def __init__(self, input_size: int, warmup_batch_sizes=(1,), failed_job_ttl: float = 600.0):
+        self.input_size = input_size
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        self.failed_job_ttl = float(failed_job_ttl)
+
+        self._models = {}    # {name: {version: ModelHandle}}
+        self._active = {}    # {name: version}
+        self._canary = {}    # {name: (version, percent)}
+        self._shadow = {}    # {name: version}
+        self._loading = {}   # {(name, version): load job}
+        self._listeners = []
+        self._lock = threading.RLock()
+        # Serializes activations so listeners see them in the order they took effect
+        self._activation_lock = threading.RLock()
+
+    # ============================================
+    # LOADING
+    # ============================================
+
+    def load(self, name: str, path: Path, version: str = None, activate: bool = False,
+             num_threads: int = 0) -> ModelHandle:
+        """
+        Load, warm up and register a model version (blocking)
+
+        Args:
+            name: Model name
+            path: Model file
+            version: Version label (defaults to file name plus modification time)
+            activate: Switch traffic to this version once it is warm
+            num_threads: Intra-op threads for ONNX Runtime/TFLite
+        """
+        path = Path(path)
+        version = version or file_version(path)
+        job = {"name": name, "version": version, "path": str(path), "state": "loading", "error": None}
+        with self._lock:
+            self._prune_failed()
+            self._loading[(name, version)] = job
+
+        try:
+            backend = load_backend(path, num_threads)
+            job["state"] = "warming_up"
+            handle = ModelHandle(name, version, backend, path)
+            handle.warmup_seconds = warm_up(backend, self.input_size, self.warmup_batch_sizes)
+            self.register(handle)
+            with self._lock:
+                self._loading.pop((name, version), None)
+            if activate:
+                self.activate(name, version)
+            return handle
+        except Exception as e:
+            job["state"] = "failed"
+            job["error"] = str(e)
+            job["failed_at"] = time.monotonic()
+            logger.error(f"Error loading model {name}:{version}: {e}")
+            raise
+
+    def load_in_background(self, name: str, path: Path, version: str = None,
+                           activate: bool = False, num_threads: int = 0) -> str:
+        """
+        Load a model version in a background thread
+
+        Returns:
+            Version label being loaded
+        """
+        version = version or file_version(path)
+
+        def _run():
+            try:
+                self.load(name, path, version, activate, num_threads)
+            except Exception:
+                pass  # Already logged and recorded in the load job
+
+        threading.Thread(target=_run, name=f"model-load-{name}", daemon=True).start()
+        return version
+
+    def register(self, handle: ModelHandle):
+        """Register an already loaded model version"""
+        with self._lock:
+            self._models.setdefault(handle.name, {})[handle.version] = handle
+        logger.info(f"Registered model {handle.name}:{handle.version} ({handle.framework})")
+
+    def unload(self, name: str, version: str):
+        """Remove a version that is not serving traffic"""
+        with self._lock:
+            if self._active.get(name) == version:
+                raise ValueError("Cannot unload the active version")
+            if self._canary.get(name, (None,))[0] == version or self._shadow.get(name) == version:
+                raise ValueError("Cannot unload a canary or shadow version")
+            versions = self._models.get(name, {})
+            if version not in versions:
+                raise KeyError(f"Unknown model version {name}:{version}")
+            del versions[version]
+        logger.info(f"Unloaded model {name}:{version}")
+
+    # ============================================
+    # ROUTING
+    # ============================================
+
+    def add_listener(self, callback):
+        """Call callback(handle) whenever a model becomes active"""
+        self._listeners.append(callback)
+
+    def activate(self, name: str, version: str):
+        """
+        Atomically switch all traffic for name to version
+
+        Listeners run before the next activation starts, so after concurrent
+        activations they have seen the version that ended up active last
+        """
+        with self._activation_lock:
+            with self._lock:
+                handle = self._get(name, version)
+                previous = self._active.get(name)
+                self._active[name] = version
+                if self._canary.get(name, (None,))[0] == version:
+                    del self._canary[name]
+            logger.info(f"Model {name} switched {previous} -> {version}")
+            for callback in self._listeners:
+                callback(handle)
+
+    def set_canary(self, name: str, version: str, percent: float):
+        """Route percent (0-100) of traffic for name to version"""
+        if not 0 <= percent <= 100:
+            raise ValueError("Canary percent must be between 0 and 100")
+        with self._lock:
+            self._get(name, version)
+            if percent == 0:
+                self._canary.pop(name, None)
+            else:
+                self._canary[name] = (version, float(percent))
+        logger.info(f"Canary for {name}: {version} at {percent}%")
+
+    def set_shadow(self, name: str, version: str = None):
+        """Score every request for name on version too, without returning its result"""
+        with self._lock:
+            if version is None:
+                self._shadow.pop(name, None)
+            else:
+                self._get(name, version)
+                self._shadow[name] = version
+        logger.info(f"Shadow for {name}: {version}")
+
+    def route(self, name: str = DEFAULT_MODEL):
+        """
+        Pick the handle that should serve one request
+
+        Returns:
+            ModelHandle, or None when no version of name is active
+        """
+        with self._lock:
+            canary = self._canary.get(name)
+            if canary and random.uniform(0, 100) < canary[1]:
+                return self._models[name][canary[0]]
+            version = self._active.get(name)
+            return self._models[name][version] if version else None
+
+    def active(self, name: str = DEFAULT_MODEL):
+        """Return the active handle for name, or None"""
+        with self._lock:
+            version = self._active.get(name)
+            return self._models[name][version] if version else None
+
+    def shadow(self, name: str = DEFAULT_MODEL):
+        """Return the shadow handle for name, or None"""
+        with self._lock:
+            version = self._shadow.get(name)
+            return self._models[name][version] if version else None
+
+    def get(self, name: str, version: str) -> ModelHandle:
+        with self._lock:
+            return self._get(name, version)
+
+    def _get(self, name: str, version: str) -> ModelHandle:
+        try:
+            return self._models[name][version]
+        except KeyError:
+            raise KeyError(f"Unknown model version {name}:{version}")
+
+    def _prune_failed(self):
+        """Forget failed load jobs older than failed_job_ttl (caller holds self._lock)"""
+        cutoff = time.monotonic() - self.failed_job_ttl
+        for key, job in list(self._loading.items()):
+            if job["state"] == "failed" and job["failed_at"] <= cutoff:
+                del self._loading[key]
+
+    def describe(self) -> dict:
+        """Registry contents for the /api/models endpoint"""
+        with self._lock:
+            self._prune_failed()
+            return {
+                "models": {
+                    name: {
+                        "active": self._active.get(name),
+                        "canary": (
+                            {"version": self._canary[name][0], "percent": self._canary[name][1]}
+                            if name in self._canary else None
+                        ),
+                        "shadow": self._shadow.get(name),
+                        "versions": [h.describe() for h in versions.values()]
+                    }
+                    for name, versions in self._models.items()
+                },
+                "loading": [
+                    {k: v for k, v in job.items() if k != "failed_at"} for job in self._loading.values()
+                ]
+            }
@@ -0,0 +1,183 @@
+"""
+Prediction Cache - Skip inference for images that were already scored
+Keyed by a hash of the image bytes plus the model version, with a bounded
+in-memory LRU and an optional SQLite-backed tier that survives restarts
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class PredictionCache:
+    """
+    Two-tier prediction cache
+
+    Args:
+        max_entries: Maximum number of entries kept in memory (0 disables the cache)
+        db_path: Optional SQLite file for the persistent tier
+        max_disk_entries: Maximum number of rows kept in the persistent tier
+    """
+
+    def __init__(self, max_entries: int = 1024, db_path=None, max_disk_entries: int = 100000):
+        self.max_entries = max(0, int(max_entries))
+        self.db_path = str(db_path) if db_path else None
+        self.max_disk_entries = max(1, int(max_disk_entries))
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._conn = None
+
+        self._memory_hits = metrics.counter("prediction_cache.memory_hits")
+        self._disk_hits = metrics.counter("prediction_cache.disk_hits")
+        self._misses = metrics.counter("prediction_cache.misses")
+        self._size = metrics.gauge("prediction_cache.size")
+
+        if self.db_path:
+            self._init_disk()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(content: bytes, model_version: str) -> str:
+        """Build a cache key from the image bytes and the model version"""
+        digest = hashlib.sha256(content)
+        digest.update(b"\0" + model_version.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """
+        Look up a cached prediction
+
+        Returns:
+            Cached prediction dictionary, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        if value is not None:
+            self._memory_hits.inc()
+            return dict(value)
+
+        value = self._get_disk(key)
+        if value is not None:
+            self._disk_hits.inc()
+            self._put_memory(key, value)
+            return dict(value)
+
+        self._misses.inc()
+        return None
+
+    def put(self, key: str, value: dict):
+        """Store a prediction in both tiers"""
+        if not self.enabled:
+            return
+        self._put_memory(key, value)
+        self._put_disk(key, value)
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        with self._lock:
+            self._entries.clear()
+        self._size.set(0)
+
+    def _put_memory(self, key: str, value: dict):
+        with self._lock:
+            self._entries[key] = dict(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            size = len(self._entries)
+        self._size.set(size)
+
+    # ============================================
+    # PERSISTENT TIER
+    # ============================================
+
+    def _init_disk(self):
+        try:
+            # One long-lived connection, used under self._lock
+            conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('PRAGMA busy_timeout = 5000')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS prediction_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_prediction_cache_last_used ON prediction_cache(last_used)')
+            conn.commit()
+            self._conn = conn
+            logger.info(f"Persistent prediction cache at {self.db_path}")
+        except Exception as e:
+            logger.error(f"Error initializing prediction cache: {e}")
+            self.db_path = None
+
+    def close(self):
+        """Close the persistent tier's connection"""
+        with self._lock:
+            conn, self._conn = self._conn, None
+            self.db_path = None
+        if conn is not None:
+            conn.close()
+
+    def _get_disk(self, key: str):
+        if not self.db_path:
+            return None
+        try:
+            with self._lock:
+                if self._conn is None:
+                    return None
+                row = self._conn.execute('SELECT value FROM prediction_cache WHERE key = ?', (key,)).fetchone()
+                if row:
+                    self._conn.execute('UPDATE prediction_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+                    self._conn.commit()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            logger.warning(f"Error reading prediction cache: {e}")
+            return None
+
+    def _put_disk(self, key: str, value: dict):
+        if not self.db_path:
+            return
+        try:
+            with self._lock:
+                if self._conn is None:
+                    return
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO prediction_cache (key, value, last_used) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), time.time())
+                )
+
+                # Prune the least recently used rows now and then
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 100:
+                    self._writes_since_prune = 0
+                    self._conn.execute('''
+                        DELETE FROM prediction_cache WHERE key IN (
+                            SELECT key FROM prediction_cache
+                            ORDER BY last_used DESC
+                            LIMIT -1 OFFSET ?
+                        )
+                    ''', (self.max_disk_entries,))
+
+                self._conn.commit()
+        except Exception as e:
+            logger.warning(f"Error writing prediction cache: {e}")
@@ -0,0 +1,188 @@
+"""
+Preprocessing Engine - Decode and normalize images with minimal work and memory
+JPEGs are decoded with DCT scaling (cv2.IMREAD_REDUCED_*) close to the model
+input size, so a 12 MP photo never exists as a full-size array. Color
+conversion, resize and normalization then run on model-sized, per-thread
+scratch buffers and write straight into the output batch slot.
+"""
+
+import struct
+import threading
+import logging
+
+import numpy as np
+import cv2
+
+from config import MODEL_INPUT_SIZE
+
+logger = logging.getLogger(__name__)
+
+# DCT scale factors libjpeg can decode at directly, largest first
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# JPEG start-of-frame markers carrying the image dimensions
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_size(data: bytes):
+    """
+    Read (width, height) from a JPEG header without decoding it
+
+    Returns:
+        Tuple of (width, height), or None if data is not a readable JPEG
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        if marker in _SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+def image_size(data: bytes):
+    """
+    Read (width, height) from a JPEG, PNG or WebP header without decoding it
+
+    Returns:
+        Tuple of (width, height), or None for other or unreadable data
+    """
+    if data[:2] == b"\xff\xd8":
+        return jpeg_size(data)
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = struct.unpack("<I", data[21:25])[0]
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    return None
+
+def reduced_decode_flag(width: int, height: int, target: int = MODEL_INPUT_SIZE) -> int:
+    """
+    Pick the strongest DCT reduction that keeps both sides at least target pixels
+    """
+    for factor, flag in REDUCED_FLAGS:
+        if min(width, height) // factor >= target:
+            return flag
+    return cv2.IMREAD_COLOR
+
+class Preprocessor:
+    """
+    Fused decode -> resize -> RGB -> [0, 1] pipeline
+
+    Args:
+        size: Model input size
+        max_batch: Capacity of the per-thread batch buffer
+    """
+
+    def __init__(self, size: int = MODEL_INPUT_SIZE, max_batch: int = 8):
+        self.size = size
+        self.max_batch = max(1, int(max_batch))
+        self._local = threading.local()
+
+    def _scratch(self) -> np.ndarray:
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None:
+            scratch = self._local.scratch = np.empty((self.size, self.size, 3), dtype=np.uint8)
+        return scratch
+
+    def batch_buffer(self, count: int) -> np.ndarray:
+        """
+        Per-thread float32 batch buffer of shape (count, size, size, 3)
+
+        The buffer is reused by the next call on the same thread; copy it
+        if the batch has to outlive that.
+        """
+        buffer = getattr(self._local, "batch", None)
+        if buffer is None or len(buffer) < count:
+            buffer = self._local.batch = np.empty(
+                (max(count, self.max_batch), self.size, self.size, 3), dtype=np.float32
+            )
+        return buffer[:count]
+
+    def decode(self, data: bytes, reduce: bool = True) -> np.ndarray:
+        """
+        Decode encoded image bytes to BGR, at reduced resolution when possible
+
+        Args:
+            data: Encoded image bytes (JPEG, PNG, WebP)
+            reduce: Use DCT-scaled decoding for large JPEGs
+        """
+        flag = cv2.IMREAD_COLOR
+        if reduce:
+            size = jpeg_size(data)
+            if size is not None:
+                flag = reduced_decode_flag(*size, target=self.size)
+
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+        if image is None:
+            raise ValueError("Could not decode image data")
+        return image
+
+    def preprocess_into(self, bgr: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Resize, convert to RGB and normalize a BGR image into out
+
+        Args:
+            bgr: Decoded BGR image of any size
+            out: float32 array of shape (size, size, 3) to write into
+        """
+        scratch = self._scratch()
+        cv2.resize(bgr, (self.size, self.size), dst=scratch)
+        cv2.cvtColor(scratch, cv2.COLOR_BGR2RGB, dst=scratch)
+        np.divide(scratch, np.float32(255.0), out=out, casting="unsafe")
+        return out
+
+    def preprocess_bytes(self, data: bytes) -> np.ndarray:
+        """
+        Decode and preprocess one image
+
+        Returns:
+            Preprocessed image array with batch dimension
+        """
+        out = np.empty((1, self.size, self.size, 3), dtype=np.float32)
+        self.preprocess_into(self.decode(data), out[0])
+        return out
+
+    def preprocess_batch(self, datas, out: np.ndarray = None) -> np.ndarray:
+        """
+        Decode and preprocess several images into one batch array
+
+        Args:
+            datas: Iterable of encoded image bytes
+            out: Optional float32 (N, size, size, 3) array to fill; by default
+                 a new array is allocated (use batch_buffer() to reuse one)
+        """
+        datas = list(datas)
+        if out is None:
+            out = np.empty((len(datas), self.size, self.size, 3), dtype=np.float32)
+        for slot, data in zip(out, datas):
+            self.preprocess_into(self.decode(data), slot)
+        return out
+
+def read_file(image_path: str) -> bytes:
+    """Read an image file's encoded bytes"""
+    with open(image_path, "rb") as f:
+        return f.read()
@@ -0,0 +1,349 @@
+"""
+Storage - Sharded file layout and retention for static/uploads and static/heatmaps
+Files are spread over 256 subdirectories picked by a hash of the file name,
+so no single directory grows to millions of entries. Uploads are stored once
+per distinct content under their SHA-256, with a reference count in the
+database. A background janitor enforces age, count and byte quotas on each
+folder and on the uploads and heatmap grids tracked in the database, and
+clears database references to what it removes.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import logging
+from pathlib import Path
+
+import metrics
+from config import PROJECT_ROOT, ALLOWED_EXTENSIONS
+from database import add_upload_reference, get_upload, prune_uploads
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# SHARDED LAYOUT
+# ============================================
+
+def shard_name(filename: str) -> str:
+    """Two hex digits derived from the file name (256 shards)"""
+    return hashlib.md5(filename.encode("utf-8")).hexdigest()[:2]
+
+def sharded_path(folder, filename: str) -> Path:
+    """
+    Path for filename inside its shard of folder; creates the shard directory
+
+    Returns:
+        Absolute path folder/<shard>/filename
+    """
+    shard = Path(folder) / shard_name(filename)
+    shard.mkdir(parents=True, exist_ok=True)
+    return shard / filename
+
+def relative_url(path) -> str:
+    """URL path of a file under the project root (e.g. "static/heatmaps/ab/x.png")"""
+    return Path(path).resolve().relative_to(Path(PROJECT_ROOT).resolve()).as_posix()
+
+def _scan(folder):
+    """
+    List (mtime, size, path) of the files in folder and its shard directories
+    (files written before sharding sit directly in folder)
+    """
+    files = []
+    pending = [(folder, True)]
+    while pending:
+        directory, is_root = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if is_root:
+                        pending.append((entry.path, False))
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                continue
+    return files
+
+def prune_folder(folder, max_age_days: float = 0, max_files: int = 0, max_bytes: int = 0, now: float = None):
+    """
+    Delete files beyond the quotas, oldest first (0 means no limit)
+
+    Args:
+        folder: Folder to prune (including its shard directories)
+        max_age_days: Delete files last modified longer ago than this
+        max_files: Keep at most this many files
+        max_bytes: Keep at most this many bytes
+
+    Returns:
+        Tuple of (files removed, bytes reclaimed, files kept, bytes kept)
+    """
+    now = time.time() if now is None else now
+    files = sorted(_scan(folder), reverse=True)   # Newest first
+
+    keep_files = 0
+    keep_bytes = 0
+    full = False
+    doomed = []
+    for mtime, size, path in files:
+        # Once a count or byte quota is reached, everything older goes too
+        if (max_files and keep_files >= max_files) or (max_bytes and keep_bytes + size > max_bytes):
+            full = True
+        if full or (max_age_days and now - mtime > max_age_days * 86400):
+            doomed.append((size, path))
+        else:
+            keep_files += 1
+            keep_bytes += size
+
+    removed = 0
+    reclaimed = 0
+    for size, path in doomed:
+        try:
+            os.remove(path)
+            removed += 1
+            reclaimed += size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {e}")
+
+    _remove_empty_shards(folder)
+    return removed, reclaimed, keep_files, keep_bytes
+
+def _remove_empty_shards(folder):
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False) and not entry.name.startswith("."):
+            try:
+                os.rmdir(entry.path)   # Fails unless empty
+            except OSError:
+                pass
+
+# ============================================
+# CONTENT-ADDRESSED UPLOADS
+# ============================================
+
+class UploadStore:
+    """
+    Uploads stored under their content hash: folder/<first 2 hex digits>/<sha256>.<ext>
+
+    Identical images are written once, and concurrent uploads with the same
+    file name can no longer overwrite each other. Files are written to a
+    temporary name and renamed into place, so readers never see a partial file.
+
+    save and prune hold a per-hash lock between checking for an upload and
+    writing or deleting it, so the janitor never unlinks a file that a
+    concurrent save has just decided to reuse.
+
+    Args:
+        folder: Root of the content-addressed layout
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+        self._stored = metrics.counter("uploads.stored")
+        self._deduplicated = metrics.counter("uploads.deduplicated")
+        self._stored_bytes = metrics.counter("uploads.stored_bytes")
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        """SHA-256 of the image bytes (hex)"""
+        return hashlib.sha256(content).hexdigest()
+
+    def _lock_for(self, sha256: str) -> threading.Lock:
+        return self._locks[int(sha256[:8], 16) % self.LOCK_STRIPES]
+
+    def path_for(self, sha256: str, filename: str = "") -> Path:
+        """Where content with this hash is stored; the extension comes from the original name"""
+        extension = Path(filename).suffix.lower().lstrip(".")
+        name = f"{sha256}.{extension}" if extension in ALLOWED_EXTENSIONS else sha256
+        return self.folder / sha256[:2] / name
+
+    def save(self, content: bytes, filename: str = "", sha256: str = None) -> str:
+        """
+        Store an upload (if new) and add a reference to it
+
+        Args:
+            content: Image bytes
+            filename: Original file name (only its extension is used)
+            sha256: Precomputed digest(content)
+
+        Returns:
+            Content hash of the upload
+        """
+        sha256 = sha256 or self.digest(content)
+        path = self.path_for(sha256, filename)
+
+        with self._lock_for(sha256):
+            record = get_upload(sha256)
+            if record is not None and (PROJECT_ROOT / record["path"]).exists():
+                path = PROJECT_ROOT / record["path"]
+                self._deduplicated.inc()
+            elif not path.exists():
+                self._write(path, content)
+            else:
+                self._deduplicated.inc()
+
+            add_upload_reference(sha256, relative_url(path), len(content))
+
+            # A janitor in another process may have removed the file meanwhile
+            if not path.exists():
+                self._write(path, content)
+        return sha256
+
+    def _write(self, path: Path, content: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temporary, "wb") as f:
+            f.write(content)
+        os.replace(temporary, path)
+        self._stored.inc()
+        self._stored_bytes.inc(len(content))
+
+    def prune(self, max_age_days: float = 0, max_files: int = 0, max_bytes: int = 0):
+        """
+        Delete uploads beyond the quotas, least recently used first, and clear
+        the predictions that referenced them
+
+        Returns:
+            Tuple of (uploads removed, bytes reclaimed, uploads kept, bytes kept)
+        """
+        paths, reclaimed, kept, kept_bytes = prune_uploads(max_age_days, max_files, max_bytes)
+        for path in paths:
+            sha256 = Path(path).stem
+            with self._lock_for(sha256):
+                if get_upload(sha256) is not None:
+                    continue   # Uploaded again since the row was deleted
+                try:
+                    os.remove(PROJECT_ROOT / path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Could not remove {path}: {e}")
+        _remove_empty_shards(self.folder)
+        return len(paths), reclaimed, kept, kept_bytes
+
+# ============================================
+# JANITOR
+# ============================================
+
+class Quota:
+    """
+    Retention limits for one storage target (0 means no limit)
+
+    Args:
+        max_age_days: Maximum age of an entry
+        max_files: Maximum number of entries
+        max_bytes: Maximum total size in bytes
+    """
+
+    def __init__(self, max_age_days: float = 0, max_files: int = 0, max_bytes: int = 0):
+        self.max_age_days = float(max_age_days)
+        self.max_files = int(max_files)
+        self.max_bytes = int(max_bytes)
+
+class Janitor:
+    """
+    Background thread that enforces storage quotas
+
+    Args:
+        folders: Dictionary {name: (folder, Quota)} of directories to prune
+        interval_seconds: Time between runs (0 disables the thread; run_once still works)
+        stores: Dictionary {name: (store, Quota)} of database-tracked stores
+                (UploadStore, HeatmapStore); each store's prune(max_age_days,
+                max_files, max_bytes) keeps its own references consistent
+    """
+
+    def __init__(self, folders: dict, interval_seconds: float = 3600.0, stores: dict = None):
+        self.folders = dict(folders)
+        self.interval = max(0.0, float(interval_seconds))
+        self.stores = dict(stores or {})
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._run_lock = threading.Lock()
+
+        self._files_removed = metrics.counter("janitor.files_removed")
+        self._rows_removed = metrics.counter("janitor.rows_removed")
+        self._bytes_reclaimed = metrics.counter("janitor.bytes_reclaimed")
+        self._run_ms = metrics.histogram("janitor.run_ms")
+
+    def start(self):
+        """Start the background thread (no-op when the interval is 0)"""
+        if not self.interval or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="storage-janitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Storage janitor started (interval={self.interval:g}s)")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the background thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Storage janitor run failed: {e}")
+
+    def run_once(self) -> dict:
+        """
+        Prune every target once
+
+        Returns:
+            Dictionary {target: {"removed", "bytes_reclaimed", "kept", "bytes_kept"}}
+        """
+        with self._run_lock:
+            started = time.perf_counter()
+            summary = {}
+
+            for name, (folder, quota) in self.folders.items():
+                removed, reclaimed, kept, kept_bytes = prune_folder(
+                    folder, quota.max_age_days, quota.max_files, quota.max_bytes
+                )
+                self._files_removed.inc(removed)
+                self._record(name, summary, removed, reclaimed, kept, kept_bytes)
+
+            for name, (store, quota) in self.stores.items():
+                removed, reclaimed, kept, kept_bytes = store.prune(
+                    quota.max_age_days, quota.max_files, quota.max_bytes
+                )
+                self._rows_removed.inc(removed)
+                self._record(name, summary, removed, reclaimed, kept, kept_bytes)
+
+            self._run_ms.observe((time.perf_counter() - started) * 1000)
+
+        reclaimed = sum(target["bytes_reclaimed"] for target in summary.values())
+        if reclaimed:
+            logger.info(f"Storage janitor reclaimed {reclaimed} bytes: {summary}")
+        return summary
+
+    def _record(self, name: str, summary: dict, removed: int, reclaimed: int, kept: int, kept_bytes: int):
+        self._bytes_reclaimed.inc(reclaimed)
+        metrics.gauge(f"janitor.{name}.files").set(kept)
+        metrics.gauge(f"janitor.{name}.bytes").set(kept_bytes)
+        summary[name] = {
+            "removed": removed,
+            "bytes_reclaimed": reclaimed,
+            "kept": kept,
+            "bytes_kept": kept_bytes
+        }
@@ -0,0 +1,252 @@
+"""
+Tiled Inference - Score high-resolution field and drone images tile by tile
+Large images are cut into overlapping model-sized windows instead of being
+squashed to the model input size, so small lesions stay visible.
+
+Tiles are converted to float32 in fixed-size chunks written into one reusable
+buffer, so peak memory is bounded by the chunk size rather than the image size.
+The image itself is held once, as uint8 RGB: its size is read from the header
+and checked against the pixel cap before anything is decoded.
+"""
+
+import logging
+from collections import Counter
+
+import numpy as np
+import cv2
+
+from config import MODEL_INPUT_SIZE, DISEASE_CLASSES, CONFIDENCE_THRESHOLD
+from preprocessing import REDUCED_FLAGS, image_size
+
+logger = logging.getLogger(__name__)
+
+HEALTHY_CLASS = "Healthy"
+
+class ImageTooLarge(ValueError):
+    """Raised when an image has more pixels than can be tiled"""
+
+def tile_origins(length: int, tile: int, stride: int) -> list:
+    """
+    Start offsets of windows covering [0, length); the last window is
+    aligned with the far edge so no pixels are dropped
+    """
+    if length <= tile:
+        return [0]
+    origins = list(range(0, length - tile + 1, stride))
+    if origins[-1] != length - tile:
+        origins.append(length - tile)
+    return origins
+
+def limit_pixels(image: np.ndarray, max_pixels: int) -> np.ndarray:
+    """Downscale image so it has at most max_pixels pixels"""
+    height, width = image.shape[:2]
+    if not max_pixels or height * width <= max_pixels:
+        return image
+    scale = (max_pixels / float(height * width)) ** 0.5
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    logger.info(f"Downscaling {width}x{height} image to {size[0]}x{size[1]} for tiling")
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+def decode_for_tiling(content: bytes, max_pixels: int) -> np.ndarray:
+    """
+    Decode encoded image bytes to RGB with at most about max_pixels pixels
+    The size comes from the header, so an oversize image is rejected before
+    it is decoded. JPEGs above the cap are decoded at 1/2, 1/4 or 1/8 scale
+    (DCT scaling) instead; other formats above it are rejected.
+
+    Raises:
+        ImageTooLarge: If the image cannot be decoded within max_pixels
+        ValueError: If the image is unreadable or not JPEG, PNG or WebP
+    """
+    size = image_size(content)
+    if size is None:
+        raise ValueError("Could not read image dimensions (use JPEG, PNG or WebP)")
+    width, height = size
+
+    flag = cv2.IMREAD_COLOR
+    if max_pixels and width * height > max_pixels:
+        flag = None
+        if content[:2] == b"\xff\xd8":
+            # Smallest reduction that fits, so as much detail as possible is kept
+            for factor, reduced in reversed(REDUCED_FLAGS):
+                if -(-width // factor) * -(-height // factor) <= max_pixels:
+                    flag = reduced
+                    logger.info(f"Decoding {width}x{height} JPEG at 1/{factor} scale for tiling")
+                    break
+        if flag is None:
+            raise ImageTooLarge(f"Image is {width}x{height}; at most {max_pixels} pixels can be tiled")
+
+    image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), flag)
+    if image is None:
+        raise ValueError("Could not decode image data")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+def _pad_to_tile(image: np.ndarray, tile: int) -> np.ndarray:
+    """Reflect-pad images smaller than one tile"""
+    height, width = image.shape[:2]
+    if height >= tile and width >= tile:
+        return image
+    return cv2.copyMakeBorder(
+        image, 0, max(0, tile - height), 0, max(0, tile - width), cv2.BORDER_REFLECT_101
+    )
+
+def predict_tiled(image: np.ndarray, predict_fn, tile: int = MODEL_INPUT_SIZE,
+                  overlap: float = 0.25, chunk_size: int = 8) -> dict:
+    """
+    Score every tile of an RGB image
+
+    Args:
+        image: Image array in RGB format (uint8, any size)
+        predict_fn: Function taking a float32 batch (N, tile, tile, 3) and
+                    returning prediction dictionaries (e.g. predict_batch)
+        tile: Window size in pixels
+        overlap: Fraction of a window shared with its neighbour (0 to <1)
+        chunk_size: Tiles per forward pass
+
+    Returns:
+        Dictionary with the tile grid, per-tile predictions and the
+        aggregated verdict
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError("Tile overlap must be in [0, 1)")
+
+    image = _pad_to_tile(image, tile)
+    height, width = image.shape[:2]
+    stride = max(1, int(tile * (1 - overlap)))
+    rows = tile_origins(height, tile, stride)
+    cols = tile_origins(width, tile, stride)
+    origins = [(r, c) for r in range(len(rows)) for c in range(len(cols))]
+
+    chunk_size = max(1, int(chunk_size))
+    buffer = np.empty((chunk_size, tile, tile, 3), dtype=np.float32)
+    tiles = []
+
+    for start in range(0, len(origins), chunk_size):
+        chunk = origins[start:start + chunk_size]
+        for i, (r, c) in enumerate(chunk):
+            y, x = rows[r], cols[c]
+            np.multiply(image[y:y + tile, x:x + tile], 1.0 / 255.0, out=buffer[i], casting="unsafe")
+
+        # Copy so a backend that keeps references never sees the buffer change
+        for (r, c), result in zip(chunk, predict_fn(buffer[:len(chunk)].copy())):
+            tiles.append({
+                "row": r,
+                "col": c,
+                "x": cols[c],
+                "y": rows[r],
+                "disease": result["disease"],
+                "confidence": result["confidence"],
+                "all_predictions": result.get("all_predictions", {})
+            })
+
+    return {
+        "width": width,
+        "height": height,
+        "tile_size": tile,
+        "stride": stride,
+        "grid": {"rows": len(rows), "cols": len(cols)},
+        "tiles": tiles,
+        "verdict": aggregate_tiles(tiles)
+    }
+
+def aggregate_tiles(tiles: list, threshold: float = CONFIDENCE_THRESHOLD) -> dict:
+    """
+    Combine tile predictions into one verdict
+
+    A disease found with confidence in any tile outranks healthy tiles: the
+    verdict is the disease with the most confident tiles, and affected_fraction
+    says how much of the image it covers.
+    """
+    diseased = [t for t in tiles if t["disease"] != HEALTHY_CLASS and t["confidence"] >= threshold]
+    counts = Counter(t["disease"] for t in diseased)
+
+    if counts:
+        disease, count = counts.most_common(1)[0]
+        confidence = float(np.mean([t["confidence"] for t in diseased if t["disease"] == disease]))
+    else:
+        disease = HEALTHY_CLASS
+        count = 0
+        confidence = float(np.mean([t["all_predictions"].get(HEALTHY_CLASS, 0.0) for t in tiles])) if tiles else 0.0
+
+    mean_probabilities = {
+        name: float(np.mean([t["all_predictions"].get(name, 0.0) for t in tiles])) if tiles else 0.0
+        for name in DISEASE_CLASSES
+    }
+
+    return {
+        "disease": disease,
+        "confidence": confidence,
+        "affected_tiles": count,
+        "affected_fraction": count / len(tiles) if tiles else 0.0,
+        "tile_counts": dict(Counter(t["disease"] for t in tiles)),
+        "mean_probabilities": mean_probabilities
+    }
+
+def stitch_heatmap(result: dict, max_side: int = 1024) -> np.ndarray:
+    """
+    Build a disease-likelihood map (1 - P(healthy)) from tile predictions,
+    averaged where tiles overlap
+
+    Returns:
+        Float heatmap in [0, 1] with the image aspect ratio, long side <= max_side
+    """
+    scale = min(1.0, max_side / float(max(result["width"], result["height"])))
+    height = max(1, int(round(result["height"] * scale)))
+    width = max(1, int(round(result["width"] * scale)))
+    tile = result["tile_size"]
+
+    total = np.zeros((height, width), dtype=np.float32)
+    weight = np.zeros((height, width), dtype=np.float32)
+    for t in result["tiles"]:
+        y0, x0 = int(t["y"] * scale), int(t["x"] * scale)
+        y1, x1 = int(round((t["y"] + tile) * scale)), int(round((t["x"] + tile) * scale))
+        total[y0:y1, x0:x1] += 1.0 - t["all_predictions"].get(HEALTHY_CLASS, 0.0)
+        weight[y0:y1, x0:x1] += 1.0
+
+    heatmap = total / np.maximum(weight, 1e-6)
+    return cv2.GaussianBlur(heatmap, (0, 0), sigmaX=max(1.0, tile * scale / 8))
+
+def save_tiled_heatmap(image: np.ndarray, result: dict, output_path: str, max_side: int = 1024):
+    """
+    Overlay the stitched tile heatmap on a downscaled copy of the image
+
+    Args:
+        image: Image array in RGB format that was passed to predict_tiled
+        result: Return value of predict_tiled
+        output_path: Path to save result
+    """
+    from gradcam import _visualize_and_save
+
+    heatmap = stitch_heatmap(result, max_side)
+    preview = _pad_to_tile(image, result["tile_size"])
+    preview = cv2.resize(preview, (heatmap.shape[1], heatmap.shape[0]), interpolation=cv2.INTER_AREA)
+    _visualize_and_save(preview, heatmap, output_path, title="Tiled Disease Map")
+
+def score_tiled(content: bytes, overlap: float, max_pixels: int, chunk_size: int,
+                heatmap_path: str = None, handle=None) -> dict:
+    """
+    Decode encoded image bytes (see decode_for_tiling) and score them tile by tile
+
+    Args:
+        content: Encoded image bytes
+        overlap: Fraction of a window shared with its neighbour
+        max_pixels: Largest image to decode; bigger JPEGs are decoded reduced
+        chunk_size: Tiles per forward pass
+        heatmap_path: Where to save the stitched heatmap (None to skip)
+        handle: ModelHandle to run (defaults to the active default model)
+
+    Returns:
+        Result of predict_tiled
+
+    Raises:
+        ImageTooLarge: If the image cannot be decoded within max_pixels
+    """
+    from model_loader import predict_batch
+
+    image = limit_pixels(decode_for_tiling(content, max_pixels), max_pixels)
+    result = predict_tiled(
+        image, lambda batch: predict_batch(batch, handle), overlap=overlap, chunk_size=chunk_size
+    )
+    if heatmap_path:
+        save_tiled_heatmap(image, result, heatmap_path)
+    return result
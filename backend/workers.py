@@ -0,0 +1,121 @@
+"""
+Worker Pools - Run CPU-bound and blocking stages off the asyncio event loop
+Bounded thread or process pools so health checks and OTP calls stay responsive
+"""
+
+import asyncio
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class WorkerPoolFull(Exception):
+    """Raised when a pool's submission queue is full"""
+
+class WorkerPool:
+    """
+    Bounded worker pool
+
+    At most max_workers tasks run at once and at most max_queue more wait for
+    a free worker; further submissions are rejected with WorkerPoolFull.
+
+    Args:
+        name: Pool name used in logs and metric names
+        kind: "thread" or "process"
+        max_workers: Number of worker threads/processes
+        max_queue: Number of submissions allowed to wait for a worker
+        initializer: Optional callable run once in each worker process
+    """
+
+    def __init__(self, name: str, kind: str = "thread", max_workers: int = 4,
+                 max_queue: int = 64, initializer=None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.initializer = initializer
+
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+
+        self._pending = metrics.gauge(f"workers.{name}.pending")
+        self._rejected = metrics.counter(f"workers.{name}.rejected")
+        self._latency = metrics.histogram(f"workers.{name}.latency_ms")
+
+    def start(self):
+        """Create the underlying executor"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=self.initializer
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"{self.name}-worker"
+                )
+        logger.info(
+            f"Worker pool '{self.name}' started "
+            f"({self.kind}, workers={self.max_workers}, queue={self.max_queue})"
+        )
+
+    def shutdown(self, wait: bool = True):
+        """Shut down the executor, optionally waiting for running tasks"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Submit a task without waiting for it
+
+        Returns:
+            concurrent.futures.Future for the task
+
+        Raises:
+            WorkerPoolFull: If the submission queue is full
+        """
+        if self._executor is None:
+            self.start()
+
+        if not self._slots.acquire(blocking=False):
+            self._rejected.inc()
+            raise WorkerPoolFull(f"Worker pool '{self.name}' is saturated")
+
+        self._pending.inc()
+        submitted = time.perf_counter()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._pending.dec()
+            self._slots.release()
+            raise
+
+        def _release(_):
+            self._pending.dec()
+            self._slots.release()
+            self._latency.observe((time.perf_counter() - submitted) * 1000)
+
+        future.add_done_callback(_release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run a task in the pool and await its result from the event loop
+
+        Raises:
+            WorkerPoolFull: If the submission queue is full
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
@@ -0,0 +1,186 @@
+"""
+Write-behind Buffer - Batch prediction inserts off the request path
+Records are queued and a background thread writes them in one transaction
+every N rows or T milliseconds, so a request no longer waits for its own
+INSERT and commit. When the buffer is full the caller writes synchronously.
+"""
+
+import queue
+import threading
+import time
+import logging
+
+import metrics
+from batching import BATCH_SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class _Flush:
+    """Marker asking the writer thread to write what it holds and signal"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+class WriteBehindBuffer:
+    """
+    Bounded write-behind queue in front of a batch write function
+
+    Args:
+        write_fn: Callable writing a list of records in one transaction
+                  (e.g. database.save_predictions)
+        max_rows: Flush once this many records are buffered (N)
+        max_wait_ms: Flush at most this long after the first buffered record (T)
+        queue_size: Records that may wait; submit returns False beyond this
+        name: Metric name prefix
+        describe_fn: Callable returning a short label for a record in error
+                     logs (e.g. database.describe_prediction); records can
+                     hold large blobs, so they are never logged whole
+    """
+
+    def __init__(self, write_fn, max_rows: int = 64, max_wait_ms: float = 50.0,
+                 queue_size: int = 1024, name: str = "write_behind", describe_fn=None):
+        self.write_fn = write_fn
+        self.describe_fn = describe_fn or (lambda record: type(record).__name__)
+        self.max_rows = max(1, int(max_rows))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue(max(1, int(queue_size)))
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self._pending = metrics.gauge(f"{name}.pending")
+        self._batch_sizes = metrics.histogram(f"{name}.batch_size", BATCH_SIZE_BUCKETS)
+        self._flush_ms = metrics.histogram(f"{name}.flush_ms")
+        self._written = metrics.counter(f"{name}.rows_written")
+        self._sync_rows = metrics.counter(f"{name}.sync_rows")
+        self._failed = metrics.counter(f"{name}.rows_failed")
+
+    def start(self):
+        """Start the background writer thread"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+            self._thread.start()
+        logger.info(
+            f"Write-behind buffer '{self.name}' started "
+            f"(max_rows={self.max_rows}, max_wait_ms={self.max_wait * 1000:g})"
+        )
+
+    def stop(self, timeout: float = 10.0):
+        """Write every buffered record, then stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP, timeout=timeout)
+            thread.join(timeout)
+
+        # Anything submitted after the thread exited
+        leftovers = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(entry, _Flush):
+                entry.done.set()
+            elif entry is not _STOP:
+                leftovers.append(entry)
+        if leftovers:
+            self._pending.dec(len(leftovers))
+            self._write(leftovers)
+
+    def submit(self, record) -> bool:
+        """
+        Buffer a record for the next batch
+
+        Args:
+            record: Record passed to write_fn as part of a list
+
+        Returns:
+            True if buffered, False if the buffer is full (write it with write_now)
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            return False
+        self._pending.inc()
+        return True
+
+    def write_now(self, records: list):
+        """Write records synchronously (backpressure fallback)"""
+        self._sync_rows.inc(len(records))
+        self.write_fn(records)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Block until everything submitted so far is written
+
+        Returns:
+            False if the writer did not catch up within timeout
+        """
+        if self._thread is None:
+            return True
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def _collect(self, first) -> tuple:
+        """Gather records until the batch is full, the wait budget is spent or a marker arrives"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP or isinstance(entry, _Flush):
+                return batch, entry
+            batch.append(entry)
+        return batch, None
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            if isinstance(first, _Flush):
+                first.done.set()
+                continue
+
+            batch, marker = self._collect(first)
+            self._pending.dec(len(batch))
+            self._write(batch)
+
+            if marker is _STOP:
+                break
+            if marker is not None:
+                marker.done.set()
+
+    def _write(self, batch: list):
+        started = time.perf_counter()
+        try:
+            self.write_fn(batch)
+            self._written.inc(len(batch))
+        except Exception as e:
+            # One bad record rolls back the whole transaction; keep the others
+            logger.error(f"Write-behind batch of {len(batch)} failed, retrying one by one: {e}")
+            for record in batch:
+                try:
+                    self.write_fn([record])
+                    self._written.inc()
+                except Exception as e:
+                    self._failed.inc()
+                    logger.error(f"Dropped record {self.describe_fn(record)}: {e}")
+        finally:
+            self._batch_sizes.observe(len(batch))
+            self._flush_ms.observe((time.perf_counter() - started) * 1000)
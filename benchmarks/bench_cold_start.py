@@ -0,0 +1,90 @@
+"""
+Cold-Start Benchmark - Catch startup-time regressions during autoscaling
+Starts fresh interpreters and measures how long it takes until the API can
+answer requests and until the model is loaded, warmed up and ready
+
+Usage:
+    python benchmarks/bench_cold_start.py --runs 5 --max-ready-seconds 20
+
+Exits with status 1 when a median exceeds its --max-* threshold.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Runs inside a fresh interpreter; prints one JSON line of timings
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {backend!r})
+import main
+import model_loader
+imported = time.perf_counter()
+model_loader.start_background_load()
+model_loader.wait_until_ready()
+ready = time.perf_counter()
+status = model_loader.get_model_status()
+print(json.dumps({{
+    "import_seconds": imported - started,
+    "ready_seconds": ready - started,
+    "load_seconds": status["load_seconds"],
+    "warmup_seconds": status["warmup_seconds"],
+    "state": status["state"],
+    "framework": status["framework"],
+    "tensorflow_imported": "tensorflow" in sys.modules
+}}))
+"""
+
+def run_once() -> dict:
+    """Start one interpreter and collect its startup timings"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT.format(backend=str(BACKEND_DIR))],
+        capture_output=True, text=True, cwd=str(BACKEND_DIR.parent), env=os.environ.copy()
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup failed:\n{result.stderr}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_seconds"] = time.perf_counter() - started
+    return timings
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure API cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, help="Fail if median import time exceeds this")
+    parser.add_argument("--max-ready-seconds", type=float, help="Fail if median time-to-ready exceeds this")
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(max(1, args.runs))]
+
+    summary = {"runs": len(runs), "state": runs[-1]["state"], "framework": runs[-1]["framework"],
+               "tensorflow_imported": runs[-1]["tensorflow_imported"]}
+    for key in ("import_seconds", "ready_seconds", "process_seconds", "load_seconds", "warmup_seconds"):
+        values = [r[key] for r in runs if r[key] is not None]
+        if values:
+            summary[key] = {
+                "median": round(statistics.median(values), 3),
+                "min": round(min(values), 3),
+                "max": round(max(values), 3)
+            }
+    print(json.dumps(summary, indent=2))
+
+    failed = False
+    if args.max_import_seconds is not None and summary["import_seconds"]["median"] > args.max_import_seconds:
+        print(f"FAIL: median import time above {args.max_import_seconds}s", file=sys.stderr)
+        failed = True
+    if args.max_ready_seconds is not None and summary["ready_seconds"]["median"] > args.max_ready_seconds:
+        print(f"FAIL: median time-to-ready above {args.max_ready_seconds}s", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Database Benchmark - Insert and select throughput under concurrent requests
+Compares the original access pattern (a new sqlite3 connection per call,
+rollback journal, default pragmas) with the pooled WAL connections used by
+backend/database.py. Each of --threads workers runs --ops operations, mixing
+save_prediction with get_recommendations and get_prediction_history
+
+Usage:
+    python benchmarks/bench_database.py --threads 16 --ops 500
+    python benchmarks/bench_database.py --threads 32 --write-ratio 0.5
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import database
+from config import DISEASE_CLASSES
+
+def legacy_insert(path: str, disease: str, confidence: float):
+    """save_prediction as it was before the connection pool"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO predictions (image_name, disease, confidence, model_version)
+        VALUES (?, ?, ?, ?)
+    ''', ("bench.jpg", disease, confidence, "bench"))
+    conn.commit()
+    conn.close()
+
+def legacy_recommendations(path: str, disease: str):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT cause, pesticide, fertilizer, prevention
+        FROM recommendations
+        WHERE disease_name = ?
+    ''', (disease,))
+    result = cursor.fetchone()
+    conn.close()
+    return result
+
+def legacy_history(path: str, limit: int):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, image_name, disease, confidence, timestamp, model_version
+        FROM predictions
+        ORDER BY timestamp DESC
+        LIMIT ?
+    ''', (limit,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def pooled_insert(path: str, disease: str, confidence: float):
+    database.save_prediction("bench.jpg", disease, confidence, "bench")
+
+def pooled_recommendations(path: str, disease: str):
+    return database.get_recommendations(disease)
+
+def pooled_history(path: str, limit: int):
+    return database.get_prediction_history(limit)
+
+def prepare(path: Path, pooled: bool, pool_size: int):
+    """Fresh database with the application schema (rollback journal unless pooled)"""
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+    database.init_pool(path, pool_size)
+    database.DATABASE_PATH = path
+    database.init_db()
+    database.close_pool()
+    if not pooled:
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+    else:
+        database.init_pool(path, pool_size)
+
+def run(path: Path, threads: int, ops: int, write_ratio: float, insert, recommendations, history) -> dict:
+    """Throughput of threads workers issuing ops operations each"""
+    inserts = []
+    selects = []
+    errors = []
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        local_inserts = []
+        local_selects = []
+        barrier.wait()
+        for _ in range(ops):
+            disease = rng.choice(DISEASE_CLASSES)
+            started = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    insert(str(path), disease, rng.random())
+                    local_inserts.append(time.perf_counter() - started)
+                else:
+                    if rng.random() < 0.5:
+                        recommendations(str(path), disease)
+                    else:
+                        history(str(path), 10)
+                    local_selects.append(time.perf_counter() - started)
+            except sqlite3.Error as e:
+                errors.append(str(e))
+        inserts.extend(local_inserts)
+        selects.extend(local_selects)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    def percentile(values, fraction):
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 3)
+
+    return {
+        "seconds": round(elapsed, 3),
+        "ops_per_second": round((len(inserts) + len(selects)) / elapsed, 1),
+        "inserts_per_second": round(len(inserts) / elapsed, 1),
+        "selects_per_second": round(len(selects) / elapsed, 1),
+        "insert_p95_ms": percentile(inserts, 0.95),
+        "select_p95_ms": percentile(selects, 0.95),
+        "errors": len(errors)
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark database access under concurrency")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=300, help="Operations per thread")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--pool-size", type=int, default=database.DB_POOL_SIZE)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "bench.db"
+
+        prepare(path, pooled=False, pool_size=args.pool_size)
+        before = run(path, args.threads, args.ops, args.write_ratio,
+                     legacy_insert, legacy_recommendations, legacy_history)
+
+        prepare(path, pooled=True, pool_size=args.pool_size)
+        after = run(path, args.threads, args.ops, args.write_ratio,
+                    pooled_insert, pooled_recommendations, pooled_history)
+        database.close_pool()
+
+    print(json.dumps({
+        "threads": args.threads,
+        "ops_per_thread": args.ops,
+        "write_ratio": args.write_ratio,
+        "pool_size": args.pool_size,
+        "before": before,
+        "after": after,
+        "speedup": round(after["ops_per_second"] / max(before["ops_per_second"], 1e-9), 2)
+    }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
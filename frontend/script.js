@@ -222,14 +222,10 @@ function displayResults(data, processingTime) {
     
     document.getElementById('detectionTime').textContent = `${processingTime}s`;
 
-    // Update explainability section
-    if (data.heatmap) {
-        document.getElementById('heatmapImage').src = `${CONFIG.API_URL}/${data.heatmap}`;
-        document.getElementById('heatmapImage').style.display = 'block';
-        document.getElementById('heatmapPlaceholder').style.display = 'none';
-    } else {
-        document.getElementById('heatmapImage').style.display = 'none';
-        document.getElementById('heatmapPlaceholder').style.display = 'block';
+    // Update explainability section (the heatmap may still be rendering)
+    showHeatmap(data.heatmap);
+    if (data.heatmap_job) {
+        followHeatmapJob(data.heatmap_job);
     }
 
     // Update recommendations - preserve line breaks
@@ -255,6 +251,33 @@ function displayResults(data, processingTime) {
     window.scrollTo({ top: resultsSection.offsetTop - 100, behavior: 'smooth' });
 }
 
+function showHeatmap(heatmap) {
+    if (heatmap) {
+        document.getElementById('heatmapImage').src = `${CONFIG.API_URL}/${heatmap}`;
+        document.getElementById('heatmapImage').style.display = 'block';
+        document.getElementById('heatmapPlaceholder').style.display = 'none';
+    } else {
+        document.getElementById('heatmapImage').style.display = 'none';
+        document.getElementById('heatmapPlaceholder').style.display = 'block';
+    }
+}
+
+// Wait for a deferred heatmap job over Server-Sent Events
+function followHeatmapJob(job) {
+    const source = new EventSource(`${CONFIG.API_URL}${job.events_url}`);
+    
+    source.addEventListener('done', (event) => {
+        showHeatmap(JSON.parse(event.data).heatmap);
+        source.close();
+    });
+    
+    ['failed', 'timeout'].forEach((status) => {
+        source.addEventListener(status, () => source.close());
+    });
+    
+    source.onerror = () => source.close();
+}
+
 // ============================================
 // ERROR HANDLING
 // ============================================
@@ -158,6 +158,1430 @@ def test_model_loader():
         print(f"❌ Model loader error: {e}\n")
         return False
 
+def test_batching():
+    """Test micro-batching scheduler"""
+    print("📦 Testing micro-batching scheduler...")
+    
+    try:
+        from batching import MicroBatcher
+        
+        batcher = MicroBatcher(lambda items: [x * 2 for x in items], max_batch_size=4, max_wait_ms=20)
+        futures = [batcher.submit(i) for i in range(10)]
+        results = [f.result(timeout=5) for f in futures]
+        batcher.stop()
+        
+        assert results == [i * 2 for i in range(10)]
+        sizes = batcher._batch_sizes.snapshot()
+        
+        # Cancelled callers are dropped and never kill the batching thread
+        import threading
+        started, release = threading.Event(), threading.Event()
+        
+        def blocking(items):
+            started.set()
+            release.wait(5)
+            return items
+        
+        blocked = MicroBatcher(blocking, max_batch_size=1, max_wait_ms=0)
+        running = blocked.submit("running")
+        assert started.wait(5)
+        queued = blocked.submit("queued")
+        assert not running.cancel()    # Already claimed by the batch
+        assert queued.cancel()
+        release.set()
+        assert running.result(timeout=5) == "running"
+        assert blocked.submit("next").result(timeout=5) == "next"
+        blocked.stop()
+        
+        print(f"✅ {len(results)} items scored in {sizes['count']} batches")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Batching error: {e}\n")
+        return False
+
+def test_prediction_cache():
+    """Test content-hash prediction cache"""
+    print("🗃️  Testing prediction cache...")
+    
+    try:
+        from prediction_cache import PredictionCache
+        
+        cache = PredictionCache(max_entries=2)
+        key = cache.make_key(b"leaf-bytes", "model@1")
+        assert cache.get(key) is None
+        
+        cache.put(key, {"disease": "Healthy", "confidence": 0.9})
+        assert cache.get(key)["disease"] == "Healthy"
+        assert cache.make_key(b"leaf-bytes", "model@2") != key
+        
+        for i in range(3):
+            cache.put(f"key-{i}", {"disease": "Healthy"})
+        assert cache.get(key) is None
+        
+        # The persistent tier keeps one WAL connection and survives restarts
+        import asyncio
+        import tempfile
+        from pathlib import Path
+        
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "cache.db"
+            disk = PredictionCache(max_entries=2, db_path=path)
+            assert disk._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            disk.put(key, {"disease": "Healthy"})
+            disk.clear()
+            assert disk.get(key)["disease"] == "Healthy"
+            disk.close()
+            assert disk.get("other") is None
+            
+            reopened = PredictionCache(max_entries=2, db_path=path)
+            assert reopened.get(key)["disease"] == "Healthy"
+            reopened.close()
+        
+        # Cache hits serve the current recommendation, which is not cached
+        from fastapi import BackgroundTasks
+        import database
+        import main
+        import model_loader
+        
+        model_loader.load_model()
+        saved = main.prediction_cache
+        main.prediction_cache = PredictionCache(max_entries=8)
+        
+        async def _predict():
+            response = await main.predict(BackgroundTasks(), _upload(_leaf_jpeg()))
+            if response["heatmap_job"]:
+                await main.heatmap_jobs.wait(response["heatmap_job"]["id"], 5)
+            return response
+        
+        with tempfile.TemporaryDirectory() as folder:
+            database.init_pool(Path(folder) / "cache.db")
+            try:
+                database.init_db()
+                first = asyncio.run(_predict())
+                disease = first["disease"]
+                database.update_recommendation(disease, "c", "Updated after caching", "f", "p")
+                second = asyncio.run(_predict())
+            finally:
+                main.prediction_cache = saved
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        assert second["cached"] and second["disease"] == disease
+        assert second["recommendation"]["pesticide"] == "Updated after caching"
+        
+        # A loaded model that fails falls back to a mock answer, which is not cached
+        from model_registry import ModelHandle
+        
+        class FailingBackend:
+            framework = "test"
+            cam_weights = None
+            def predict(self, images):
+                raise RuntimeError("inference failed")
+        
+        handle = ModelHandle("failing-test", "v1", FailingBackend())
+        fresh = PredictionCache(max_entries=8)
+        saved_route, saved_cache = main.route_model, main.prediction_cache
+        main.route_model, main.prediction_cache = (lambda: handle), fresh
+        with tempfile.TemporaryDirectory() as folder:
+            database.init_pool(Path(folder) / "fallback.db")
+            try:
+                database.init_db()
+                response = asyncio.run(_predict())
+            finally:
+                main.route_model, main.prediction_cache = saved_route, saved_cache
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        assert response["model_version"] == "mock" and not response["cached"]
+        assert len(fresh._entries) == 0
+        
+        print("✅ Cache hits, misses and LRU eviction work")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Prediction cache error: {e}\n")
+        return False
+
+def test_cascade():
+    """Test two-stage cascade escalation"""
+    print("🪜 Testing cascade inference...")
+    
+    try:
+        import numpy as np
+        from cascade import Cascade
+        from model_registry import ModelRegistry, ModelHandle
+        
+        class FixedBackend:
+            framework = "test"
+            def __init__(self, rows):
+                self.rows = np.array(rows, dtype=np.float32)
+            def predict(self, images):
+                return self.rows[:len(images)]
+        
+        registry = ModelRegistry(8)
+        full = ModelHandle("default", "full@1", FixedBackend([[0.0, 1.0]]))
+        fast = ModelHandle("fast", "fast@1", FixedBackend([[0.95, 0.05], [0.6, 0.4], [0.3, 0.7]]))
+        registry.register(fast)
+        registry.activate("fast", "fast@1")
+        
+        cascade = Cascade(registry, "fast", 0.5, {0: 0.9})
+        assert cascade.fast_model(full) is fast
+        
+        probabilities, served_by = cascade.predict(fast, full, np.zeros((3, 8, 8, 3), dtype=np.float32))
+        assert [h.version for h in served_by] == ["fast@1", "full@1", "fast@1"]
+        assert probabilities[1].tolist() == [0.0, 1.0]
+        assert cascade.snapshot()["escalation_rate"] == round(1 / 3, 4)
+        
+        print("✅ Confident rows answered by the fast model, others escalated")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Cascade error: {e}\n")
+        return False
+
+def test_tiling():
+    """Test tiled inference over a large image"""
+    print("🧩 Testing tiled inference...")
+    
+    try:
+        import numpy as np
+        from tiling import tile_origins, predict_tiled
+        
+        assert tile_origins(500, 224, 168) == [0, 168, 276]
+        assert tile_origins(100, 224, 168) == [0]
+        
+        batch_sizes = []
+        def fake_predict(batch):
+            batch_sizes.append(len(batch))
+            return [{"disease": "Healthy", "confidence": 0.9, "all_predictions": {"Healthy": 0.9}}] * len(batch)
+        
+        image = np.zeros((500, 700, 3), dtype=np.uint8)
+        result = predict_tiled(image, fake_predict, tile=224, overlap=0.25, chunk_size=4)
+        assert result["grid"] == {"rows": 3, "cols": 4}
+        assert len(result["tiles"]) == 12 and max(batch_sizes) == 4
+        assert result["verdict"]["disease"] == "Healthy"
+        
+        print(f"✅ {len(result['tiles'])} tiles scored in {len(batch_sizes)} batches")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Tiling error: {e}\n")
+        return False
+
+def test_preprocessing():
+    """Test reduced-resolution decoding and fused preprocessing"""
+    print("🖼️  Testing preprocessing engine...")
+    
+    try:
+        import cv2
+        import numpy as np
+        from preprocessing import Preprocessor, jpeg_size, reduced_decode_flag
+        
+        image = np.full((1000, 1200, 3), (10, 120, 240), dtype=np.uint8)
+        data = cv2.imencode(".jpg", image)[1].tobytes()
+        assert jpeg_size(data) == (1200, 1000)
+        assert reduced_decode_flag(1200, 1000, 224) == cv2.IMREAD_REDUCED_COLOR_4
+        
+        engine = Preprocessor(224)
+        assert engine.decode(data).shape[:2] == (250, 300)
+        processed = engine.preprocess_bytes(data)
+        assert processed.shape == (1, 224, 224, 3) and processed.dtype == np.float32
+        assert abs(processed[0, 0, 0, 0] - 240 / 255) < 0.02  # RGB order
+        
+        print("✅ JPEG decoded at 1/4 size and normalized to RGB float32")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Preprocessing error: {e}\n")
+        return False
+
+def test_cam():
+    """Test gradient-free CAM and explanation mode selection"""
+    print("🔥 Testing CAM explanations...")
+    
+    try:
+        import numpy as np
+        from gradcam import class_activation_maps, explanation_mode
+        
+        features = np.zeros((1, 7, 7, 2), dtype=np.float32)
+        features[0, 1, 2, 0] = 3.0    # Channel 0 fires top-left
+        features[0, 5, 5, 1] = 2.0    # Channel 1 fires bottom-right
+        weights = np.array([[1.0, -1.0], [-1.0, 1.0]], dtype=np.float32)
+        
+        heatmap = class_activation_maps(features, weights, [1])[0]
+        assert heatmap.shape == (7, 7)
+        assert heatmap[5, 5] == 1.0 and heatmap[1, 2] == 0.0
+        
+        class _Backend:
+            framework = "onnx"
+            cam_weights = weights
+        
+        assert explanation_mode(_Backend(), "auto") == "cam"
+        assert explanation_mode(_Backend(), "none") == "none"
+        _Backend.cam_weights = None
+        assert explanation_mode(_Backend(), "cam") == "none"
+        assert explanation_mode(_Backend(), "auto") == "none"
+        assert explanation_mode(None, "auto") == "gradcam"
+        
+        # Unexplainable models get no heatmap; simulated grids are for mock mode only
+        import asyncio
+        from gradcam import heatmap_grids
+        from fastapi import BackgroundTasks
+        from model_registry import ModelHandle
+        import main
+        
+        image = np.zeros((1, 224, 224, 3), dtype=np.float32)
+        assert heatmap_grids([np.zeros((224, 224, 3), dtype=np.uint8)], image, _Backend(), mode="auto") is None
+        
+        class _Plain(_Backend):
+            def predict(self, images):
+                return np.tile(np.eye(8, dtype=np.float32)[0], (len(images), 1))
+        
+        handle = ModelHandle("plain-test", "v1", _Plain())
+        result = asyncio.run(main._run_prediction("leaf.jpg", _leaf_jpeg(), BackgroundTasks(), handle, defer=True))
+        assert result["heatmap"] is None and result["heatmap_job"] is None and result["heatmap_id"] is None
+        
+        print("✅ CAM highlights the predicted class and modes resolve correctly")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ CAM error: {e}\n")
+        return False
+
+def test_heatmap_store():
+    """Test compact heatmap grids and on-demand rendering"""
+    print("🗺️  Testing heatmap storage...")
+    
+    try:
+        import cv2
+        import numpy as np
+        from heatmap_store import compact_grid, encode_preview, render_overlay, negotiate_format
+        
+        grid = compact_grid(np.linspace(0, 1, 28 * 28, dtype=np.float32).reshape(28, 28), 14)
+        assert grid.shape == (14, 14) and grid.dtype == np.uint8
+        
+        preview = encode_preview(np.full((600, 800, 3), 128, dtype=np.uint8), 400)
+        data = render_overlay(preview, grid, 200, "png")
+        assert cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR).shape == (150, 200, 3)
+        
+        assert negotiate_format(None, "image/avif,image/webp,*/*") == "webp"
+        assert negotiate_format(None, "*/*") == "jpeg"
+        assert negotiate_format("jpg") == "jpeg"
+        
+        # Renders have their own pool: busy heatmap jobs do not block them, and
+        # a full render pool answers 503 with Retry-After
+        import asyncio
+        import threading
+        from fastapi import HTTPException
+        from starlette.requests import Request
+        from workers import WorkerPool
+        import main
+        
+        request = Request({"type": "http", "headers": [(b"accept", b"image/webp")]})
+        release = threading.Event()
+        busy = WorkerPool("busy-test", "thread", max_workers=1, max_queue=0)
+        busy.submit(release.wait, 5)
+        saved = main.heatmap_pool, main.render_pool
+        try:
+            main.heatmap_pool = busy
+            try:
+                asyncio.run(main.get_heatmap("unknown", request))
+                raise AssertionError("unknown heatmap rendered")
+            except HTTPException as e:
+                assert e.status_code == 404, e.status_code
+            
+            main.render_pool = busy
+            try:
+                asyncio.run(main.get_heatmap("unknown", request))
+                raise AssertionError("render accepted by a saturated pool")
+            except HTTPException as e:
+                assert e.status_code == 503 and e.headers == {"Retry-After": "1"}
+                response = asyncio.run(main.http_exception_handler(request, e))
+                assert response.headers["retry-after"] == "1"
+        finally:
+            main.heatmap_pool, main.render_pool = saved
+            release.set()
+            busy.shutdown()
+        
+        print(f"✅ Heatmap stored as {grid.nbytes}-byte grid + {len(preview)}-byte preview")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Heatmap storage error: {e}\n")
+        return False
+
+def test_storage():
+    """Test sharded paths and quota pruning"""
+    print("🧹 Testing storage retention...")
+    
+    try:
+        import os
+        import tempfile
+        import time
+        from pathlib import Path
+        from storage import sharded_path, prune_folder, UploadStore
+        
+        with tempfile.TemporaryDirectory() as folder:
+            now = time.time()
+            for i in range(6):
+                path = sharded_path(folder, f"heatmap_{i}.png")
+                path.write_bytes(b"x" * 100)
+                age = 40 * 86400 if i == 0 else i
+                os.utime(path, (now - age, now - age))
+            assert len(sharded_path(folder, "heatmap_1.png").parent.name) == 2
+            
+            # Oldest file is expired, then the count quota keeps the 3 newest
+            removed, reclaimed, kept, _ = prune_folder(folder, max_age_days=30, max_files=3, now=now)
+            assert (removed, reclaimed, kept) == (3, 300, 3)
+            assert sharded_path(folder, "heatmap_1.png").exists()
+            assert not sharded_path(folder, "heatmap_4.png").exists()
+            
+            # Uploads are named by content, not by the client's file name
+            store = UploadStore(folder)
+            sha256 = store.digest(b"leaf")
+            assert store.path_for(sha256, "IMG_0001.JPG") == Path(folder) / sha256[:2] / f"{sha256}.jpg"
+        
+        # A file removed by a janitor between the dedup check and the new
+        # reference is written again, so the reference never dangles
+        import database
+        import storage
+        from config import PROJECT_ROOT
+        
+        with tempfile.TemporaryDirectory(dir=PROJECT_ROOT) as folder:
+            database.init_pool(Path(folder) / "uploads.db")
+            reference = storage.add_upload_reference
+            try:
+                database.init_db()
+                store = UploadStore(Path(folder) / "sha256")
+                sha256 = store.save(b"leaf", "leaf.jpg")
+                path = store.path_for(sha256, "leaf.jpg")
+                
+                def pruned_meanwhile(*args):
+                    path.unlink()
+                    reference(*args)
+                
+                storage.add_upload_reference = pruned_meanwhile
+                assert store.save(b"leaf", "leaf.jpg") == sha256
+                assert path.read_bytes() == b"leaf"
+            finally:
+                storage.add_upload_reference = reference
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        print("✅ Expired and over-quota files pruned oldest first")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Storage error: {e}\n")
+        return False
+
+def test_database_pool():
+    """Test pooled connections under concurrent writers"""
+    print("🗄️  Testing database connection pool...")
+    
+    try:
+        import tempfile
+        import threading
+        from pathlib import Path
+        import database
+        
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "pool.db"
+            pool = database.ConnectionPool(path, size=2)
+            
+            conn = pool.acquire()
+            mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+            assert mode.lower() == database.DB_JOURNAL_MODE.lower()
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.commit()
+            pool.release(conn)
+            
+            def insert(start):
+                for x in range(start, start + 50):
+                    conn = pool.acquire()
+                    try:
+                        conn.execute('INSERT INTO t VALUES (?)', (x,))
+                        conn.commit()
+                    finally:
+                        pool.release(conn)
+            
+            threads = [threading.Thread(target=insert, args=(i * 50,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            
+            conn = pool.acquire()
+            assert conn.execute('SELECT COUNT(DISTINCT x) FROM t').fetchone()[0] == 400
+            pool.release(conn)
+            assert pool._created <= 2
+            pool.close()
+        
+        print("✅ 8 threads shared 2 connections without lost writes")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Database pool error: {e}\n")
+        return False
+
+def test_write_behind():
+    """Test batched write-behind of prediction records"""
+    print("📝 Testing write-behind buffer...")
+    
+    try:
+        import threading
+        from write_behind import WriteBehindBuffer
+        
+        batches = []
+        buffer = WriteBehindBuffer(batches.append, max_rows=4, max_wait_ms=1000, queue_size=16)
+        for i in range(10):
+            assert buffer.submit(("leaf.jpg", "Healthy", 0.9, "v1", None, str(i)))
+        assert buffer.flush()
+        assert [len(batch) for batch in batches[:2]] == [4, 4]
+        assert sum(len(batch) for batch in batches) == 10
+        buffer.stop()
+        
+        # A full buffer refuses records so the caller can write them itself
+        release = threading.Event()
+        blocked = WriteBehindBuffer(lambda batch: release.wait(5), max_rows=1, max_wait_ms=0, queue_size=2)
+        accepted = [blocked.submit(i) for i in range(10)]
+        assert not all(accepted)
+        release.set()
+        blocked.stop()
+        
+        # Dropped records are logged by label, without their vector blobs
+        import logging
+        from database import describe_prediction
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        logger = logging.getLogger("write_behind")
+        logger.addHandler(handler)
+        
+        def failing(batch):
+            raise ValueError("disk full")
+        
+        try:
+            dropping = WriteBehindBuffer(failing, max_rows=1, max_wait_ms=0, describe_fn=describe_prediction)
+            dropping._write([("leaf.jpg", "Healthy", 0.9, "v1", "h1", "sha", b"\x01" * 16, b"\x02" * 64)])
+        finally:
+            logger.removeHandler(handler)
+        dropped = [m for m in messages if m.startswith("Dropped record")]
+        assert dropped == ["Dropped record image=leaf.jpg disease=Healthy heatmap_id=h1: disk full"], dropped
+        
+        print("✅ Records written in batches; full buffer falls back to caller")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Write-behind error: {e}\n")
+        return False
+
+def test_recommendation_cache():
+    """Test in-memory recommendations and cross-process invalidation"""
+    print("🌱 Testing recommendation cache...")
+    
+    try:
+        import sqlite3
+        import tempfile
+        from pathlib import Path
+        import database
+        
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "recommendations.db"
+            database.init_pool(path)
+            try:
+                database.init_db()
+                cache = database.recommendation_cache
+                version = cache.version
+                
+                database.update_recommendation("Healthy", "c", "Local update", "f", "p")
+                assert cache.version > version
+                assert database.get_recommendations("Healthy")["pesticide"] == "Local update"
+                
+                # A write from another process is picked up after the check interval
+                other = sqlite3.connect(path)
+                other.execute("UPDATE recommendations SET pesticide = 'Remote' WHERE disease_name = 'Healthy'")
+                other.commit()
+                other.close()
+                cache._next_check = 0
+                assert database.get_recommendations("Healthy")["pesticide"] == "Remote"
+            finally:
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        print("✅ Updates from this and other processes invalidate the cache")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Recommendation cache error: {e}\n")
+        return False
+
+def test_statistics():
+    """Test rollup-backed statistics, with and without a time range"""
+    print("📈 Testing prediction statistics...")
+    
+    try:
+        import tempfile
+        from datetime import datetime
+        from pathlib import Path
+        import database
+        
+        with tempfile.TemporaryDirectory() as folder:
+            database.init_pool(Path(folder) / "statistics.db")
+            try:
+                database.init_db()
+                with database.connection() as conn:
+                    conn.executemany(
+                        'INSERT INTO predictions (image_name, disease, confidence, timestamp) VALUES (?, ?, ?, ?)',
+                        [
+                            ("a.jpg", "Healthy", 0.9, "2026-03-01 08:15:00"),
+                            ("b.jpg", "Healthy", 0.7, "2026-03-02 23:59:00"),
+                            ("c.jpg", "Maize Blight", 0.6, "2026-03-04 10:00:00"),
+                        ]
+                    )
+                    conn.execute("DELETE FROM predictions WHERE image_name = 'c.jpg'")
+                
+                stats = database.get_statistics()
+                assert stats["total_predictions"] == 2
+                assert abs(stats["avg_confidence"]["Healthy"] - 0.8) < 1e-9
+                
+                # Partial hours/days at the edges come from the hourly rollup
+                stats = database.get_statistics(datetime(2026, 3, 1, 9), datetime(2026, 3, 3))
+                assert stats["disease_distribution"] == {"Healthy": 1}
+                stats = database.get_statistics(datetime(2026, 3, 1, 8, 30), None)
+                assert stats["total_predictions"] == 2
+            finally:
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        # A saturated I/O pool turns /api/statistics into 503, not 500
+        import asyncio
+        import threading
+        from fastapi import HTTPException
+        from workers import WorkerPool
+        import main
+        
+        release = threading.Event()
+        pool = WorkerPool("statistics-test", "thread", max_workers=1, max_queue=0)
+        pool.submit(release.wait, 5)
+        saved, main.io_pool = main.io_pool, pool
+        try:
+            asyncio.run(main.prediction_statistics())
+            raise AssertionError("statistics served by a saturated pool")
+        except HTTPException as e:
+            assert e.status_code == 503, e.status_code
+        finally:
+            main.io_pool = saved
+            release.set()
+            pool.shutdown()
+        
+        print("✅ Statistics served from hourly, daily and total rollups")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Statistics error: {e}\n")
+        return False
+
+def test_history():
+    """Test keyset pagination of the prediction history"""
+    print("📜 Testing prediction history...")
+    
+    try:
+        import tempfile
+        from pathlib import Path
+        import database
+        
+        with tempfile.TemporaryDirectory() as folder:
+            database.init_pool(Path(folder) / "history.db")
+            try:
+                database.init_db()
+                with database.connection() as conn:
+                    conn.executemany(
+                        'INSERT INTO predictions (image_name, disease, confidence, timestamp) VALUES (?, ?, ?, ?)',
+                        [(f"{i}.jpg", "Healthy" if i % 2 else "Maize Blight", i / 10, "2026-03-01 08:00:00")
+                         for i in range(10)]
+                    )
+                
+                # Rows sharing a timestamp are split across pages by id
+                pages = []
+                after = None
+                while True:
+                    page = database.get_prediction_history(3, after, disease="Healthy", min_confidence=0.2)
+                    if not page:
+                        break
+                    pages.append([p["id"] for p in page])
+                    last = page[-1]
+                    after = database.decode_cursor(database.encode_cursor(last["timestamp"], last["id"]))
+                assert pages == [[10, 8, 6], [4]]
+                assert database.estimate_prediction_count("Healthy") == 5
+            finally:
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        print("✅ History pages follow (timestamp, id) cursors")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ History error: {e}\n")
+        return False
+
+def test_prediction_vectors():
+    """Test float16 probability/embedding BLOBs and the matrix reader"""
+    print("🧮 Testing stored prediction vectors...")
+    
+    try:
+        import tempfile
+        from pathlib import Path
+        import numpy as np
+        import database
+        from config import DISEASE_CLASSES
+        
+        with tempfile.TemporaryDirectory() as folder:
+            database.init_pool(Path(folder) / "vectors.db")
+            try:
+                database.init_db()
+                probabilities = {name: 1.0 / len(DISEASE_CLASSES) for name in DISEASE_CLASSES}
+                database.save_predictions([
+                    ("a.jpg", DISEASE_CLASSES[0], 0.9, "v1", None, None,
+                     database.pack_probabilities(probabilities), database.pack_embedding([0.5, 1.5, 2.5])),
+                    ("b.jpg", DISEASE_CLASSES[1], 0.8, "v1", None, None,
+                     database.pack_probabilities(probabilities), None),
+                    ("legacy.jpg", DISEASE_CLASSES[1], 0.7, "v0"),
+                ])
+                
+                vectors = database.load_prediction_vectors(embeddings=True)
+                assert vectors["probabilities"].shape == (2, len(DISEASE_CLASSES))
+                assert np.allclose(vectors["probabilities"].sum(axis=1), 1.0, atol=1e-2)
+                assert vectors["embeddings"].shape == (2, 3)
+                assert np.allclose(vectors["embeddings"][0], [0.5, 1.5, 2.5])
+                assert np.isnan(vectors["embeddings"][1]).all()
+            finally:
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        print("✅ Probability vectors and embeddings load as NumPy matrices")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Prediction vectors error: {e}\n")
+        return False
+
+def test_export():
+    """Test streamed CSV/NDJSON exports and resuming after an id"""
+    print("📤 Testing prediction export...")
+    
+    try:
+        import csv
+        import io
+        import json
+        import tempfile
+        from pathlib import Path
+        import database
+        import export
+        from config import DISEASE_CLASSES
+        
+        with tempfile.TemporaryDirectory() as folder:
+            database.init_pool(Path(folder) / "export.db")
+            try:
+                database.init_db()
+                probabilities = {name: 1.0 / len(DISEASE_CLASSES) for name in DISEASE_CLASSES}
+                database.save_predictions([
+                    (f"leaf_{i}.jpg", DISEASE_CLASSES[i % len(DISEASE_CLASSES)], 0.5, "v1", None, None,
+                     database.pack_probabilities(probabilities) if i % 2 else None, None)
+                    for i in range(25)
+                ])
+                
+                text = b"".join(export.stream_export("csv", chunk_size=7)).decode("utf-8")
+                rows = list(csv.reader(io.StringIO(text)))
+                assert rows[0][:len(export.COLUMNS)] == export.COLUMNS
+                assert len(rows) == 26
+                assert [int(row[0]) for row in rows[1:]] == list(range(1, 26))
+                assert rows[1][-1] == "" and float(rows[2][-1]) > 0
+                
+                lines = b"".join(export.stream_export("ndjson", after_id=20, chunk_size=3)).decode("utf-8").splitlines()
+                records = [json.loads(line) for line in lines]
+                assert [record["id"] for record in records] == [21, 22, 23, 24, 25]
+                assert records[0]["probabilities"] is None
+                assert set(records[1]["probabilities"]) == set(DISEASE_CLASSES)
+                
+                # Time windows start reading at the first id in range
+                from datetime import datetime
+                with database.connection() as conn:
+                    conn.execute("UPDATE predictions SET timestamp = datetime('2026-03-01', '+' || id || ' hours')")
+                    conn.commit()
+                assert database.first_prediction_id(datetime(2026, 3, 1, 9, 30)) == 10
+                assert database.first_prediction_id(datetime(2026, 4, 1)) is None
+                reads = []
+                read = export.read_prediction_rows
+                export.read_prediction_rows = lambda *args: reads.append(args[0]) or read(*args)
+                try:
+                    chunks = list(export.iter_chunks(
+                        datetime(2026, 3, 1, 9, 30), datetime(2026, 3, 1, 15), chunk_size=4
+                    ))
+                finally:
+                    export.read_prediction_rows = read
+                assert [row[0] for rows, _ in chunks for row in rows] == [10, 11, 12, 13, 14]
+                assert reads[0] == 9
+                
+                try:
+                    export.check_format("xml")
+                    raise AssertionError("unknown format accepted")
+                except ValueError:
+                    pass
+            finally:
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        print("✅ Exports stream in id order and resume after the last id")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Export error: {e}\n")
+        return False
+
+def _upload(data: bytes, filename: str = "leaf.jpg", content_type: str = "image/jpeg"):
+    """UploadFile for calling endpoint functions directly"""
+    import io
+    from fastapi import UploadFile
+    from starlette.datastructures import Headers
+    return UploadFile(io.BytesIO(data), filename=filename, headers=Headers({"content-type": content_type}))
+
+def _leaf_jpeg(size: int = 300) -> bytes:
+    """Encoded test image"""
+    import cv2
+    import numpy as np
+    image = np.zeros((size, size, 3), dtype=np.uint8)
+    image[:, :, 1] = np.linspace(60, 200, size, dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+def test_worker_pools():
+    """Test bounded worker pools and the 503 on saturation"""
+    print("🧵 Testing worker pools...")
+    
+    try:
+        import asyncio
+        import threading
+        from fastapi import BackgroundTasks, HTTPException
+        from workers import WorkerPool, WorkerPoolFull
+        import main
+        import model_loader
+        
+        release = threading.Event()
+        pool = WorkerPool("test", "thread", max_workers=1, max_queue=1)
+        running = [pool.submit(release.wait, 5) for _ in range(2)]
+        try:
+            pool.submit(release.wait, 5)
+            raise AssertionError("third task accepted by a 1+1 pool")
+        except WorkerPoolFull:
+            pass
+        
+        # A saturated CPU pool turns /api/predict into 503, not 500
+        model_loader.load_model()
+        saved, main.cpu_pool = main.cpu_pool, pool
+        try:
+            asyncio.run(main.predict(BackgroundTasks(), _upload(_leaf_jpeg())))
+            raise AssertionError("prediction accepted by a saturated pool")
+        except HTTPException as e:
+            assert e.status_code == 503, e.status_code
+        finally:
+            main.cpu_pool = saved
+            release.set()
+        
+        assert all(future.result(timeout=5) for future in running)
+        pool.shutdown()
+        
+        print("✅ Full pool rejects work and /api/predict answers 503")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Worker pool error: {e}\n")
+        return False
+
+def test_bulk_prediction():
+    """Test the NDJSON stream of /api/predict/batch for a ZIP archive"""
+    print("📚 Testing bulk prediction...")
+    
+    try:
+        import asyncio
+        import io
+        import json
+        import tempfile
+        import zipfile
+        from pathlib import Path
+        from fastapi import HTTPException
+        import database
+        import main
+        import model_loader
+        
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as bundle:
+            for i in range(3):
+                bundle.writestr(f"field/leaf_{i}.jpg", _leaf_jpeg())
+            bundle.writestr("field/broken.jpg", b"not an image")
+            bundle.writestr("field/notes.txt", b"skipped")
+        
+        async def _lines():
+            response = await main.predict_bulk([_upload(archive.getvalue(), "field.zip", "application/zip")])
+            assert response.media_type == "application/x-ndjson"
+            return [json.loads(chunk) async for chunk in response.body_iterator]
+        
+        with tempfile.TemporaryDirectory() as folder:
+            database.init_pool(Path(folder) / "bulk.db")
+            try:
+                database.init_db()
+                model_loader.load_model()
+                lines = asyncio.run(_lines())
+                assert database.get_statistics()["total_predictions"] == 3
+            finally:
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        assert [line["index"] for line in lines[:-1]] == [0, 1, 2, 3]
+        assert [line["success"] for line in lines[:-1]] == [True, True, True, False]
+        assert lines[-1] == {"done": True, "total": 4, "succeeded": 3, "failed": 1}
+        
+        # Images and a ZIP cannot be mixed
+        try:
+            main._expand_bulk_uploads([("a.jpg", "image/jpeg", b""), ("b.zip", "application/zip", b"")])
+            raise AssertionError("mixed upload accepted")
+        except HTTPException as e:
+            assert e.status_code == 400
+        
+        print(f"✅ {len(lines) - 1} NDJSON lines streamed plus a summary line")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Bulk prediction error: {e}\n")
+        return False
+
+def test_in_memory_decode():
+    """Test decoding uploads in memory and reusing the frame for the heatmap"""
+    print("🧠 Testing in-memory decode...")
+    
+    try:
+        import tempfile
+        from pathlib import Path
+        import cv2
+        import numpy as np
+        from model_loader import decode_and_preprocess
+        from gradcam import save_heatmap
+        
+        image = np.full((120, 160, 3), (10, 120, 240), dtype=np.uint8)   # BGR
+        data = cv2.imencode(".png", image)[1].tobytes()
+        
+        def _no_disk(*args, **kwargs):
+            raise AssertionError("image read from disk")
+        
+        imread, cv2.imread = cv2.imread, _no_disk
+        try:
+            original, processed = decode_and_preprocess(data)
+            assert original.shape == (120, 160, 3) and original[0, 0].tolist() == [240, 120, 10]
+            assert processed.shape == (1, 224, 224, 3) and processed.dtype == np.float32
+            
+            with tempfile.TemporaryDirectory() as folder:
+                output = Path(folder) / "heatmap.png"
+                save_heatmap(original, output, None, processed)
+                assert output.exists()
+        finally:
+            cv2.imread = imread
+        
+        try:
+            decode_and_preprocess(b"not an image")
+            raise AssertionError("undecodable upload accepted")
+        except ValueError:
+            pass
+        
+        print("✅ Upload decoded once in memory; heatmap reused the decoded frame")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ In-memory decode error: {e}\n")
+        return False
+
+def test_tflite_backend():
+    """Test that TFLite batches of changing size do not reallocate tensors"""
+    print("📱 Testing TFLite backend...")
+    
+    try:
+        import numpy as np
+        import inference_backends
+        
+        class FakeInterpreter:
+            allocations = 0
+            
+            def __init__(self, model_path, **kwargs):
+                self.shape = [1, 8, 8, 3]
+            def get_input_details(self):
+                return [{"index": 0, "shape": np.array(self.shape), "dtype": np.float32, "quantization": (0.0, 0)}]
+            def get_output_details(self):
+                return [{"index": 1, "shape": np.array([self.shape[0], 2]), "dtype": np.float32, "quantization": (0.0, 0)}]
+            def resize_tensor_input(self, index, shape):
+                self.shape = list(shape)
+            def allocate_tensors(self):
+                FakeInterpreter.allocations += 1
+            def set_tensor(self, index, value):
+                assert value.shape[0] == self.shape[0], "batch does not match allocated shape"
+            def invoke(self):
+                pass
+            def get_tensor(self, index):
+                return np.tile(np.float32([0.25, 0.75]), (self.shape[0], 1))
+        
+        original = inference_backends._import_tflite_interpreter
+        inference_backends._import_tflite_interpreter = lambda: FakeInterpreter
+        try:
+            backend = inference_backends.TFLiteBackend("model.tflite")
+            for batch_size in [3, 5, 3, 1, 5, 3, 5]:
+                output = backend.predict(np.zeros((batch_size, 8, 8, 3), dtype=np.float32))
+                assert output.shape == (batch_size, 2)
+        finally:
+            inference_backends._import_tflite_interpreter = original
+        
+        # Model's own size 1 at load, then one allocation each for 3 and 5
+        assert FakeInterpreter.allocations == 3, FakeInterpreter.allocations
+        
+        print(f"✅ 7 batches of 3 sizes needed {FakeInterpreter.allocations} tensor allocations")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ TFLite backend error: {e}\n")
+        return False
+
+def test_readiness():
+    """Test liveness/readiness reporting while the model loads"""
+    print("🚦 Testing readiness checks...")
+    
+    try:
+        import asyncio
+        import json
+        from fastapi import BackgroundTasks, HTTPException
+        import main
+        import model_loader
+        
+        model_loader._set_status(state="loading")
+        try:
+            health = asyncio.run(main.health_check())
+            assert health["live"] and not health["ready"]
+            assert asyncio.run(main.liveness_check()) == {"live": True}
+            response = asyncio.run(main.readiness_check())
+            assert response.status_code == 503 and json.loads(response.body)["ready"] is False
+            
+            # Predictions are refused with 503 rather than served by a half-loaded model
+            try:
+                asyncio.run(main.predict(BackgroundTasks(), _upload(_leaf_jpeg())))
+                raise AssertionError("prediction accepted while loading")
+            except HTTPException as e:
+                assert e.status_code == 503
+        finally:
+            model_loader.start_background_load()
+            assert model_loader.wait_until_ready(60)
+        
+        assert asyncio.run(main.readiness_check())["ready"] is True
+        assert asyncio.run(main.health_check())["model"]["state"] in ("ready", "mock")
+        
+        print("✅ Live while loading, ready (200) only once the model is up")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Readiness error: {e}\n")
+        return False
+
+def test_model_registry():
+    """Test hot swap, canary and shadow routing in the model registry"""
+    print("🔀 Testing model registry...")
+    
+    try:
+        import threading
+        import time
+        from pathlib import Path
+        import numpy as np
+        import metrics
+        import model_loader
+        from model_registry import ModelRegistry, ModelHandle
+        
+        class FixedBackend:
+            framework = "test"
+            def __init__(self, row):
+                self.row = np.array(row, dtype=np.float32)
+            def predict(self, images):
+                return np.tile(self.row, (len(images), 1))
+        
+        registry = ModelRegistry(8)
+        for version in ("v1", "v2", "v3"):
+            registry.register(ModelHandle("leaf", version, FixedBackend([0.9, 0.1])))
+        
+        # Hot swap: new requests go to v2, a request routed earlier keeps v1
+        registry.activate("leaf", "v1")
+        in_flight = registry.route("leaf")
+        registry.activate("leaf", "v2")
+        assert registry.route("leaf").version == "v2" and in_flight.version == "v1"
+        
+        # Canary: roughly percent of requests, and activating it clears the canary
+        registry.set_canary("leaf", "v3", 30)
+        share = sum(registry.route("leaf").version == "v3" for _ in range(2000)) / 2000
+        assert 0.2 < share < 0.4, share
+        registry.activate("leaf", "v3")
+        assert registry.describe()["models"]["leaf"]["canary"] is None
+        
+        # Listeners observe concurrent activations in the order they took effect
+        seen = []
+        def listener(handle):
+            time.sleep(0.001)
+            seen.append(handle.version)
+        registry.add_listener(listener)
+        threads = [
+            threading.Thread(target=lambda v=v: [registry.activate("leaf", v) for _ in range(20)])
+            for v in ("v1", "v2", "v3")
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert seen[-1] == registry.active("leaf").version
+        
+        # Failed loads are listed, then expire
+        try:
+            registry.load("leaf", Path("missing.bin"), version="broken")
+        except ValueError:
+            pass
+        assert [job["state"] for job in registry.describe()["loading"]] == ["failed"]
+        registry.failed_job_ttl = 0
+        assert registry.describe()["loading"] == []
+        
+        # Shadow: every batch is also scored on the shadow version
+        primary = ModelHandle("shadow-test", "p1", FixedBackend([0.9, 0.1]))
+        shadow = ModelHandle("shadow-test", "s1", FixedBackend([0.2, 0.8]))
+        model_loader.registry.register(primary)
+        model_loader.registry.register(shadow)
+        model_loader.registry.set_shadow("shadow-test", "s1")
+        disagree = metrics.counter("shadow.disagree").value
+        try:
+            results = model_loader.predict_batch(np.zeros((3, 8, 8, 3), dtype=np.float32), primary)
+            assert [r["model_version"] for r in results] == ["p1"] * 3
+            model_loader._shadow_executor.submit(lambda: None).result(timeout=5)
+            assert metrics.counter("shadow.disagree").value == disagree + 3
+        finally:
+            model_loader.registry.set_shadow("shadow-test", None)
+            model_loader.registry.unload("shadow-test", "s1")
+            model_loader.registry.unload("shadow-test", "p1")
+        
+        print("✅ Hot swap, canary share, shadow scoring and failed loads behave")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Model registry error: {e}\n")
+        return False
+
+def test_tiled_decode():
+    """Test that oversize tiling uploads are checked before they are decoded"""
+    print("🛰️  Testing tiled decode limits...")
+    
+    try:
+        import cv2
+        import numpy as np
+        import tiling
+        from tiling import decode_for_tiling, ImageTooLarge
+        
+        image = np.zeros((2000, 3000, 3), dtype=np.uint8)
+        image[:, :, 2] = 200   # Red in BGR
+        png = cv2.imencode(".png", image)[1].tobytes()
+        jpeg = cv2.imencode(".jpg", image)[1].tobytes()
+        
+        decoded = []
+        imdecode = tiling.cv2.imdecode
+        def _counting_imdecode(*args):
+            decoded.append(args[1])
+            return imdecode(*args)
+        
+        tiling.cv2.imdecode = _counting_imdecode
+        try:
+            try:
+                decode_for_tiling(png, 1_000_000)
+                raise AssertionError("oversize PNG decoded")
+            except ImageTooLarge:
+                pass
+            assert decoded == [], "PNG decoded before the size check"
+            
+            # JPEG above the cap: decoded at the mildest DCT reduction that fits
+            reduced = decode_for_tiling(jpeg, 1_000_000)
+            assert reduced.shape == (500, 750, 3)
+            assert reduced[0, 0, 0] > 150   # RGB order
+            assert decode_for_tiling(jpeg, 10_000_000).shape == (2000, 3000, 3)
+        finally:
+            tiling.cv2.imdecode = imdecode
+        
+        try:
+            decode_for_tiling(b"GIF89a...", 1_000_000)
+            raise AssertionError("unknown format accepted")
+        except ImageTooLarge:
+            raise AssertionError("unknown format reported as too large")
+        except ValueError:
+            pass
+        
+        print("✅ Oversize PNG rejected from its header; large JPEG decoded at 1/4")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Tiled decode error: {e}\n")
+        return False
+
+def test_gradcam_engine_cache():
+    """Test that the Grad-CAM gradient model is built once per model and layer"""
+    print("♻️  Testing Grad-CAM engine cache...")
+    
+    try:
+        import gc
+        import weakref
+        import gradcam
+        
+        built = []
+        class StubEngine:
+            def __init__(self, keras_model, layer_name=None):
+                built.append((keras_model, layer_name))
+        
+        class StubModel:
+            pass
+        
+        original = gradcam.GradCamEngine
+        gradcam.GradCamEngine = StubEngine
+        try:
+            model = StubModel()
+            engine = gradcam.get_gradcam_engine(model)
+            assert gradcam.get_gradcam_engine(model) is engine
+            assert gradcam.get_gradcam_engine(model, "block5_conv3") is not engine
+            
+            # A hot-swapped model gets its own engine; the old one goes with its model
+            swapped = StubModel()
+            assert gradcam.get_gradcam_engine(swapped) is not engine
+            assert len(built) == 3
+            released = weakref.ref(model)
+            del model, engine
+            built.clear()
+            gc.collect()
+            assert released() is None and swapped in gradcam._engines
+        finally:
+            gradcam.GradCamEngine = original
+        
+        print("✅ One engine per model and layer, released with the model")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Grad-CAM engine cache error: {e}\n")
+        return False
+
+def test_cascade_explain():
+    """Test that explained predictions keep the cascade"""
+    print("🪜 Testing cascade with explanations...")
+    
+    try:
+        import asyncio
+        import tempfile
+        from pathlib import Path
+        import numpy as np
+        from fastapi import BackgroundTasks
+        import database
+        import model_loader
+        import main
+        from config import DISEASE_CLASSES
+        from model_registry import ModelHandle
+        
+        confident = np.eye(len(DISEASE_CLASSES), dtype=np.float32)[0]
+        unsure = np.full(len(DISEASE_CLASSES), 1 / len(DISEASE_CLASSES), dtype=np.float32)
+        
+        class FastBackend:
+            framework = "test"
+            cam_weights = None
+            def predict(self, images):
+                # Confident on images with any signal, unsure on blank ones
+                return np.array([confident if image.any() else unsure for image in images])
+        
+        class CamBackend:
+            framework = "test"
+            cam_weights = np.ones((4, len(DISEASE_CLASSES)), dtype=np.float32)
+            def __init__(self):
+                self.explained = []
+            def predict(self, images):
+                return np.tile(confident[::-1], (len(images), 1))
+            def predict_with_features(self, images):
+                self.explained.append(len(images))
+                return self.predict(images), np.ones((len(images), 7, 7, 4), dtype=np.float32)
+        
+        backend = CamBackend()
+        full = ModelHandle("cascade-test", "full@1", backend)
+        model_loader.registry.register(ModelHandle(model_loader.CASCADE_MODEL, "fast@1", FastBackend()))
+        model_loader.registry.activate(model_loader.CASCADE_MODEL, "fast@1")
+        try:
+            images = np.zeros((3, 8, 8, 3), dtype=np.float32)
+            images[[0, 2]] = 1.0
+            results = model_loader.predict_batch(images, full, explain=True)
+            assert [r["cascade_stage"] for r in results] == ["fast", "full", "fast"]
+            assert backend.explained == [1]
+            assert "heatmap_grid" in results[1] and "heatmap_grid" not in results[0]
+            
+            # The default predict path answers from the fast model
+            before = model_loader.cascade.snapshot()
+            with tempfile.TemporaryDirectory() as folder:
+                database.init_pool(Path(folder) / "cascade.db")
+                try:
+                    database.init_db()
+                    
+                    async def _predict():
+                        result = await main._run_prediction(
+                            "leaf.jpg", _leaf_jpeg(), BackgroundTasks(), full, main.HEATMAP_DEFERRED
+                        )
+                        if result["heatmap_job"]:
+                            await main.heatmap_jobs.wait(result["heatmap_job"]["id"], 5)
+                        return result
+                    
+                    result = asyncio.run(_predict())
+                finally:
+                    database.close_pool()
+                    database.init_pool(database.DATABASE_PATH)
+            after = model_loader.cascade.snapshot()
+            assert result["model_version"] == "fast@1"
+            assert after["fast_hit_rate"] > 0 and after["images"] > before["images"]
+        finally:
+            model_loader.registry._active.pop(model_loader.CASCADE_MODEL, None)
+        
+        print("✅ Only escalated images are explained by the full model")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Cascade explain error: {e}\n")
+        return False
+
+def test_heatmap_jobs():
+    """Test deferred heatmap jobs and their poll/SSE endpoints"""
+    print("⏳ Testing heatmap jobs...")
+    
+    try:
+        import asyncio
+        import tempfile
+        import threading
+        from pathlib import Path
+        import numpy as np
+        from fastapi import BackgroundTasks, HTTPException
+        import database
+        import main
+        from config import DISEASE_CLASSES
+        from heatmap_jobs import HeatmapJobs
+        from model_registry import ModelHandle
+        from workers import WorkerPool, WorkerPoolFull
+        
+        release = threading.Event()
+        
+        # Bounded depth and per-job timeout
+        pool = WorkerPool("jobs-test", "thread", max_workers=1, max_queue=1)
+        jobs = HeatmapJobs(pool, timeout_seconds=0.05)
+        
+        async def _bounded():
+            running = jobs.submit("running.png", release.wait, 5)
+            queued = jobs.submit("queued.png", release.wait, 5)
+            try:
+                jobs.submit("heatmap.png", release.wait, 5)
+                raise AssertionError("third job accepted by a 1+1 pool")
+            except WorkerPoolFull:
+                pass
+            running = await jobs.wait(running["id"], 5)
+            queued = await jobs.wait(queued["id"], 5)
+            assert running["status"] == queued["status"] == "timeout"
+            
+            # The timed-out queued job was cancelled, freeing its slot; the
+            # running one reports its heatmap once it finishes after all
+            jobs.submit("next.png", lambda: None)
+            release.set()
+            for _ in range(100):
+                if jobs.get(running["id"])["status"] == "done":
+                    break
+                await asyncio.sleep(0.01)
+            return jobs.get(running["id"]), jobs.get(queued["id"])
+        
+        try:
+            running, queued = asyncio.run(_bounded())
+            assert running["status"] == "done" and running["heatmap"] == "running.png", running
+            assert queued["status"] == "timeout" and queued["heatmap"] is None
+        finally:
+            release.set()
+            pool.shutdown()
+        
+        class CamBackend:
+            framework = "test"
+            cam_weights = np.ones((4, len(DISEASE_CLASSES)), dtype=np.float32)
+            def predict(self, images):
+                return np.tile(np.eye(len(DISEASE_CLASSES), dtype=np.float32)[0], (len(images), 1))
+            def predict_with_features(self, images):
+                # The explanation pass waits until the test has seen the response
+                explain_release.wait(5)
+                return self.predict(images), np.ones((len(images), 7, 7, 4), dtype=np.float32)
+        
+        explain_release = threading.Event()
+        handle = ModelHandle("deferred-test", "v1", CamBackend())
+        
+        async def _deferred():
+            result = await asyncio.wait_for(
+                main._run_prediction("leaf.jpg", _leaf_jpeg(), BackgroundTasks(), handle, defer=True), 2
+            )
+            job_id = result["heatmap_job"]["id"]
+            polled = (await main.get_heatmap_job(job_id))["job"]
+            assert polled["status"] in ("queued", "running"), polled["status"]
+            
+            events = []
+            response = await main.stream_heatmap_job(job_id)
+            async for chunk in response.body_iterator:
+                if chunk.startswith("event:"):
+                    events.append(chunk.split("\n")[0][len("event: "):])
+                    explain_release.set()
+            return events, (await main.get_heatmap_job(job_id))["job"]
+        
+        with tempfile.TemporaryDirectory() as folder:
+            database.init_pool(Path(folder) / "jobs.db")
+            try:
+                database.init_db()
+                events, job = asyncio.run(_deferred())
+            finally:
+                explain_release.set()
+                database.close_pool()
+                database.init_pool(database.DATABASE_PATH)
+        
+        assert events[-1] == "done" and job["status"] == "done", (events, job)
+        assert job["heatmap"].startswith("api/heatmap/")
+        try:
+            asyncio.run(main.get_heatmap_job("unknown"))
+            raise AssertionError("unknown job found")
+        except HTTPException as e:
+            assert e.status_code == 404
+        
+        print(f"✅ Deferred predict returned before the explanation pass; events: {', '.join(events)}")
+        print()
+        return True
+    
+    except Exception as e:
+        print(f"❌ Heatmap jobs error: {e}\n")
+        return False
+
 def run_all_tests():
     """Run all tests"""
     print("=" * 60)
@@ -172,6 +1596,31 @@ def run_all_tests():
         "Configuration": test_config(),
         "Database": test_database(),
         "Model Loader": test_model_loader(),
+        "Batching": test_batching(),
+        "Worker Pools": test_worker_pools(),
+        "Bulk Prediction": test_bulk_prediction(),
+        "In-memory Decode": test_in_memory_decode(),
+        "TFLite Backend": test_tflite_backend(),
+        "Readiness": test_readiness(),
+        "Model Registry": test_model_registry(),
+        "Tiled Decode": test_tiled_decode(),
+        "Grad-CAM Engine Cache": test_gradcam_engine_cache(),
+        "Cascade Explain": test_cascade_explain(),
+        "Heatmap Jobs": test_heatmap_jobs(),
+        "Prediction Cache": test_prediction_cache(),
+        "Cascade": test_cascade(),
+        "Tiling": test_tiling(),
+        "Preprocessing": test_preprocessing(),
+        "CAM": test_cam(),
+        "Heatmap Storage": test_heatmap_store(),
+        "Storage Retention": test_storage(),
+        "Database Pool": test_database_pool(),
+        "Write-behind": test_write_behind(),
+        "Recommendation Cache": test_recommendation_cache(),
+        "Statistics": test_statistics(),
+        "History": test_history(),
+        "Prediction Vectors": test_prediction_vectors(),
+        "Export": test_export(),
     }
     
     print("=" * 60)